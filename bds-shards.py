@@ -0,0 +1,36 @@
+# Convert a bds dataset between the directory-per-view layout and the packed shard layout
+# Shard layout described in bds/shards.py
+
+import sys, shutil
+import logging
+from absl import app, flags
+
+from bds.camera import split_names, load_camera_set
+from bds.shards import pack_split, unpack_split, is_packed, shard_dir
+
+flags.DEFINE_string('output_dir', '', 'root directory of the bds dataset')
+flags.DEFINE_string('mode', 'pack', 'pack view directories into shards or unpack shards into view directories(pack, unpack)')
+flags.DEFINE_integer('shard_size_mb', 1024, 'maximum size of a shard file in MiB')
+flags.DEFINE_bool('remove', False, 'remove the source files after converting')
+
+FLAGS = flags.FLAGS
+
+def main(_):
+    assert FLAGS.mode in ['pack', 'unpack']
+    for split in split_names(FLAGS.output_dir):
+        camera_set = load_camera_set(FLAGS.output_dir, split)
+        if FLAGS.mode == 'pack':
+            num_outputs = pack_split(FLAGS.output_dir, split, camera_set, FLAGS.shard_size_mb * 2 ** 20, FLAGS.remove)
+            logging.info(f'Split "{split}": {num_outputs} outputs packed.')
+        elif is_packed(FLAGS.output_dir, split):
+            num_outputs = unpack_split(FLAGS.output_dir, split, camera_set)
+            logging.info(f'Split "{split}": {num_outputs} outputs unpacked.')
+            if FLAGS.remove:
+                shutil.rmtree(shard_dir(FLAGS.output_dir, split))
+        else:
+            logging.warning(f'Split "{split}" is not packed.')
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
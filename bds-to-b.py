@@ -5,14 +5,20 @@ import os, sys, glob
 import logging
 from absl import app, flags
 import shutil
-import numpy as np
-import json
-from PIL import Image
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from tqdm import tqdm
 
+from bds.camera import split_names, camera_json_path, camera_sidecar_path
+from bds.nerf import convert_view
+
 FLAGS = flags.FLAGS
 
 flags.DEFINE_string('output_dir', '', 'root directory of the source blender-ds dataset')
+flags.DEFINE_integer('num_workers', os.cpu_count() or 1, 'number of conversion processes')
+flags.DEFINE_bool('link', True, 'hardlink or reflink unchanged files instead of copying them when possible')
+flags.DEFINE_bool('incremental', False, 'keep the result directory and skip outputs newer than their inputs')
 
 def main(_):
     # get output directory name
@@ -20,44 +26,34 @@ def main(_):
     output_root = os.path.dirname(FLAGS.output_dir)
     result_name = output_name + '_blender'
     result_dir = os.path.join(output_root, result_name)
-    if os.path.exists(result_dir):
+    if os.path.exists(result_dir) and not FLAGS.incremental:
         logging.warning('Result directory already exists, removing...')
         shutil.rmtree(result_dir)
-    os.mkdir(result_dir)
+    os.makedirs(result_dir, exist_ok=True)
 
-    # iteratively process all splits
-    for split in glob.glob(pathname='transforms_*.json', root_dir=FLAGS.output_dir):
-        # get split name
-        split_name = split[len('transforms_'):-len('.json')]
-        logging.info(f'Processing split {split_name}...')
-        # create split directory
-        os.mkdir(os.path.join(result_dir, split_name))
-        # process all views
-        pbar = tqdm(glob.glob(pathname='*', root_dir=os.path.join(FLAGS.output_dir, split_name)), f'Processing split {split_name}...')
-        for view in pbar:
-            color_exist = os.path.exists(os.path.join(FLAGS.output_dir, split_name, view, 'color.png'))
-            normal_exist = os.path.exists(os.path.join(FLAGS.output_dir, split_name, view, 'normal.png'))
-            depth_exist = os.path.exists(os.path.join(FLAGS.output_dir, split_name, view, 'depth.png'))
-            alpha_exist = os.path.exists(os.path.join(FLAGS.output_dir, split_name, view, 'alpha.png'))
-            if color_exist:
-                if alpha_exist:
-                    # read color and alpha and add alpha channel to color
-                    color = np.array(Image.open(os.path.join(FLAGS.output_dir, split_name, view, 'color.png')))
-                    if color.shape[2] == 4:
-                        color = color[:, :, :3]
-                    alpha = np.array(Image.open(os.path.join(FLAGS.output_dir, split_name, view, 'alpha.png')))[:, :, -1:]
-                    color = np.concatenate([color, alpha], axis=2)
-                    # save color file
-                    Image.fromarray(color).save(os.path.join(result_dir, split_name, view + '.png'))
-                else:
-                    shutil.copy(os.path.join(FLAGS.output_dir, split_name, view, 'color.png'), os.path.join(result_dir, split_name, view + '.png'))
-            if normal_exist:
-                shutil.copy(os.path.join(FLAGS.output_dir, split_name, view, 'normal.png'), os.path.join(result_dir, split_name, view + '_normal.png'))
-            if depth_exist:
-                shutil.copy(os.path.join(FLAGS.output_dir, split_name, view, 'depth.png'), os.path.join(result_dir, split_name, view + '_depth.png'))
-            if alpha_exist:
-                shutil.copy(os.path.join(FLAGS.output_dir, split_name, view, 'alpha.png'), os.path.join(result_dir, split_name, view + '_alpha.png'))
-        shutil.copy(os.path.join(FLAGS.output_dir, split), os.path.join(result_dir, split))
+    start = time.perf_counter()
+    num_views = 0
+    with ProcessPoolExecutor(max_workers=FLAGS.num_workers) as executor:
+        # iteratively process all splits
+        for split_name in split_names(FLAGS.output_dir):
+            logging.info(f'Processing split {split_name}...')
+            # create split directory
+            os.makedirs(os.path.join(result_dir, split_name), exist_ok=True)
+            # process all views in parallel
+            views = glob.glob(pathname='*', root_dir=os.path.join(FLAGS.output_dir, split_name))
+            convert = partial(convert_view, os.path.join(FLAGS.output_dir, split_name),
+                              os.path.join(result_dir, split_name), link=FLAGS.link)
+            chunksize = max(1, min(256, len(views) // (4 * FLAGS.num_workers)))
+            written = sum(tqdm(executor.map(convert, views, chunksize=chunksize), f'Processing split {split_name}...',
+                               total=len(views)))
+            logging.info(f'{written} file{"s" if written != 1 else ""} written for {len(views)} views.')
+            num_views += len(views)
+            # camera JSON and its binary sidecar
+            for path in [camera_json_path(FLAGS.output_dir, split_name), camera_sidecar_path(FLAGS.output_dir, split_name)]:
+                if os.path.exists(path):
+                    shutil.copy2(path, result_dir)
+    seconds = time.perf_counter() - start
+    logging.info(f'Converted {num_views} views in {seconds:.2f}s ({num_views / max(seconds, 1e-9):.0f} views/s).')
 
 
 if __name__ == '__main__':
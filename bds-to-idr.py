@@ -1,22 +1,50 @@
 # Transform blender-ds dataset to the dataset format used in IDR [https://github.com/lioryariv/idr/blob/main/DATA_CONVENTION.md]
 # Detailed dataset format in IDR.md
 
-import os, sys, glob
+import os, sys
 import logging
-import bpy
 from absl import app, flags
 import shutil
 import numpy as np
-import json
-from tqdm import tqdm
+
+from bds.bounds import scene_sphere
+from bds.camera import split_names, load_camera_set
+from bds.idr import intrinsic_matrix, world_matrices, scale_matrix, save_cameras, export_images
+from bds.scene_meta import load_scene_meta, meta_sphere
 
 flags.DEFINE_string('output_dir', '', 'root directory of the source blender-ds dataset')
-flags.DEFINE_string('scene_path', '', 'path to the Blender scene')
-flags.DEFINE_integer('resx', 800, 'width of output images')
-flags.DEFINE_integer('resy', 800, 'height of output images')
+flags.DEFINE_string('scene_path', '', 'path to the Blender scene, only loaded if the dataset has no up to date '
+                                      'scene.json with the requested bounding sphere')
+flags.DEFINE_integer('resx', 800, 'width of output images, defaults to the resolution in scene.json')
+flags.DEFINE_integer('resy', 800, 'height of output images, defaults to the resolution in scene.json')
+flags.DEFINE_bool('exact_sphere', False, 'use the minimum enclosing sphere of the scene vertices instead of '
+                                         'the sphere around their bounding box')
+flags.DEFINE_float('sphere_margin', 1.01, 'radius scale of the exact bounding sphere')
+flags.DEFINE_bool('compact_npz', False, 'compress the camera npz and also store the stacked world_mats '
+                                        'and scale_mat arrays next to the per-index keys')
+flags.DEFINE_integer('num_workers', 16, 'number of threads exporting images and masks')
+flags.DEFINE_bool('link', True, 'hardlink or reflink images instead of copying them when possible')
 
 FLAGS = flags.FLAGS
 
+def load_bounds(meta):
+    # bounding sphere from scene.json, the scene is only loaded without it
+    if meta is not None:
+        stale = FLAGS.scene_path and os.path.exists(FLAGS.scene_path) and \
+            os.path.getmtime(FLAGS.scene_path) > meta['scene_mtime']
+        bounds = None if stale else meta_sphere(meta, FLAGS.exact_sphere, FLAGS.sphere_margin)
+        if bounds is not None:
+            logging.info('Bounding sphere read from scene.json.')
+            return bounds
+        logging.info('scene.json is older than the scene or has another bounding sphere, loading the scene.')
+    if not FLAGS.scene_path:
+        raise ValueError('The dataset has no usable scene.json, --scene_path is required.')
+    # blender is only needed to compute the bounds
+    import bpy
+    bpy.ops.wm.open_mainfile(filepath=FLAGS.scene_path)
+    return scene_sphere(bpy.context.scene, bpy.context.evaluated_depsgraph_get(), FLAGS.exact_sphere,
+                        FLAGS.sphere_margin)
+
 def main(_):
     # get output directory name
     output_name = os.path.basename(FLAGS.output_dir)
@@ -36,89 +64,55 @@ def main(_):
     logging.info('Result directory created.')
 
     # calculate the bounding sphere of the scene
-    # load blender scene
-    bpy.ops.wm.open_mainfile(filepath=FLAGS.scene_path)
-    # points of all meshes
-    points_co_global = []
-    # all objects
-    objs = bpy.context.scene.objects
-    # get all mesh vertices
-    with_bounding_sphere = False
-    bounding_sphere = None
-    for obj in objs:
-        if obj.name == 'bounding_sphere':
-            with_bounding_sphere = True
-            bounding_sphere = obj
-            break
-        if obj.type == 'MESH':
-            points_co_global.extend([obj.matrix_world @ vertex.co for vertex in obj.data.vertices])
-    if with_bounding_sphere:
-        sphere_center = np.array(obj.location)
-        sphere_radius = obj.scale[0]
-    else:
-        # get the bounding box first
-        pts = np.array(points_co_global)
-        aabb0, aabb1 = np.min(pts, axis=0), np.max(pts, axis=0)
-        sphere_center = 0.5 * (aabb0 + aabb1)
-        sphere_radius = 0.5 * np.linalg.norm(aabb1 - aabb0) * 1.01  # slightly larger
-    
-    scale_mat = np.diag([sphere_radius, sphere_radius, sphere_radius])
-    scale_mat = np.concatenate([scale_mat, sphere_center[:, None]], axis=1)
-    scale_mat = np.concatenate([scale_mat, np.zeros([1, 4])], axis=0)
-    scale_mat[3, 3] = 1.
-    scale_mat = scale_mat.astype(np.float32)
+    meta = load_scene_meta(FLAGS.output_dir)
+    sphere_center, sphere_radius, aabb = load_bounds(meta)
+    scale_mat = scale_matrix(sphere_center, sphere_radius)
 
-    if with_bounding_sphere:
+    if aabb is None:
         logging.info(f'Bounding sphere c={sphere_center}, r={sphere_radius}')
     else:
-        logging.info(f'Scene bounding box: {aabb0}, {aabb1}, bounding sphere c={sphere_center}, r={sphere_radius}')
+        logging.info(f'Scene bounding box: {aabb[0]}, {aabb[1]}, bounding sphere c={sphere_center}, r={sphere_radius}')
+
+    # resolution of the render unless given
+    resx, resy = FLAGS.resx, FLAGS.resy
+    if meta is not None:
+        resx = resx if FLAGS['resx'].present else meta['resolution'][0]
+        resy = resy if FLAGS['resy'].present else meta['resolution'][1]
 
     # current image index
     image_idx = 0
 
-    npz_file = {}
+    world_mats = []
+    # (source, destination) of every image and mask
+    export_jobs = []
 
     # iteratively process all splits
-    for split in glob.glob(pathname='transforms_*.json', root_dir=FLAGS.output_dir):
-        # get split name
-        split_name = split[len('transforms_'):-len('.json')]
+    for split_name in split_names(FLAGS.output_dir):
         logging.info(f'Processing split {split_name}, starting from index {image_idx}')
 
-        # reading camera information
-        split_json = json.load(open(os.path.join(FLAGS.output_dir, split)))
-
-        fovX = split_json['camera_angle_x']
-        resx = FLAGS.resx
-        resy = FLAGS.resy
-        # K matrix (see IDR.md)
-        focal = 0.5 * resx / np.tan(0.5 * fovX)
-        cx = 0.5 * (resx - 1)
-        cy = 0.5 * (resy - 1)
-        K = np.array([[focal, 0, cx, 0],
-                      [0, focal, cy, 0],
-                      [0, 0, 1, 0],
-                      [0, 0, 0, 1]], dtype=np.float32)
-        
-        # flip the y and z axes to transform the camera coordinates
-        camera_left_right = np.diag([1., -1., -1., 1.]).astype(np.float32)
-        
-        # process all frames
-        pbar = tqdm(split_json['frames'], f'Processing split {split_name}')
-        for frame in pbar:
-            RtInv = np.array(frame['transform_matrix'], dtype=np.float32)
-            Rt = np.linalg.inv(RtInv)
-            world_mat = K @ camera_left_right @ Rt
-            npz_file[f'world_mat_{image_idx}'] = world_mat
-            npz_file[f'scale_mat_{image_idx}'] = scale_mat
-            shutil.copy(os.path.join(FLAGS.output_dir, frame['file_path'], 'color.png'), os.path.join(result_dir, 'image', f'{image_idx}.png'))
-            shutil.copy(os.path.join(FLAGS.output_dir, frame['file_path'], 'alpha.png'), os.path.join(result_dir, 'mask', f'{image_idx}.png'))
+        # reading camera information from the JSON or its binary sidecar
+        camera_set = load_camera_set(FLAGS.output_dir, split_name)
+
+        K = intrinsic_matrix(camera_set.camera_angle_x, resx, resy)
+        # all frames of the split in one batched inversion and product
+        world_mats.append(world_matrices(camera_set.transforms, K))
+
+        for file_path in camera_set.file_paths:
+            export_jobs.append((os.path.join(FLAGS.output_dir, file_path, 'color.png'),
+                                os.path.join(result_dir, 'image', f'{image_idx}.png')))
+            export_jobs.append((os.path.join(FLAGS.output_dir, file_path, 'alpha.png'),
+                                os.path.join(result_dir, 'mask', f'{image_idx}.png')))
             image_idx += 1
-    
+
     # save npz file
-    np.savez(os.path.join(result_dir, 'cameras_sphere.npz'), **npz_file)
+    world_mats = np.concatenate(world_mats, axis=0) if world_mats else np.zeros([0, 4, 4], dtype=np.float32)
+    save_cameras(os.path.join(result_dir, 'cameras_sphere.npz'), world_mats, scale_mat, compact=FLAGS.compact_npz)
+    logging.info(f'Cameras of {image_idx} images saved.')
+
+    # export images and masks
+    export_images(export_jobs, FLAGS.num_workers, link=FLAGS.link, desc='Exporting images')
 
 
 if __name__ == '__main__':
     argv = sys.argv
     app.run(main=main, argv=argv)
-
@@ -0,0 +1 @@
+# Shared helpers of the blender-ds scripts
@@ -0,0 +1,132 @@
+# Scene bounds for the IDR scale_mat: bulk vertex extraction through the
+# evaluated depsgraph and bounding spheres computed on the vertex array
+
+import numpy as np
+
+# object types that evaluate to a mesh
+GEOMETRY_TYPES = {'MESH', 'CURVE', 'SURFACE', 'FONT', 'META'}
+
+def scene_points(depsgraph):
+    # world-space vertices of all evaluated geometry as one [N, 3] float32
+    # array, modifiers and instances included
+    chunks = []
+    for instance in depsgraph.object_instances:
+        obj = instance.object
+        if obj.type not in GEOMETRY_TYPES:
+            continue
+        # instance data is only valid during the iteration
+        matrix = np.array(instance.matrix_world, dtype=np.float32)
+        mesh = obj.data if obj.type == 'MESH' else obj.to_mesh()
+        try:
+            co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+            mesh.vertices.foreach_get('co', co)
+        finally:
+            if obj.type != 'MESH':
+                obj.to_mesh_clear()
+        if len(co) == 0:
+            continue
+        # one matrix multiply per object instead of one per vertex
+        chunks.append(co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3])
+    if not chunks:
+        return np.zeros([0, 3], dtype=np.float32)
+    return np.concatenate(chunks, axis=0)
+
+def aabb_sphere(points, margin=1.01):
+    # sphere around the axis aligned bounding box, slightly larger
+    if len(points) == 0:
+        raise ValueError('The scene has no geometry, its bounding sphere is undefined.')
+    aabb0, aabb1 = np.min(points, axis=0), np.max(points, axis=0)
+    center = 0.5 * (aabb0 + aabb1)
+    radius = 0.5 * np.linalg.norm(aabb1 - aabb0) * margin
+    return center.astype(np.float64), float(radius), (aabb0, aabb1)
+
+def _ball2(a, b):
+    return 0.5 * (a + b), 0.5 * np.linalg.norm(a - b)
+
+def _ball3(a, b, c):
+    # circumscribed circle of a triangle
+    ab, ac = b - a, c - a
+    n = np.cross(ab, ac)
+    nn = np.dot(n, n)
+    if nn < 1e-20:
+        # collinear, the farthest pair spans the ball
+        return max((_ball2(p, q) for p, q in [(a, b), (a, c), (b, c)]), key=lambda ball: ball[1])
+    center = a + (np.dot(ac, ac) * np.cross(n, ab) + np.dot(ab, ab) * np.cross(ac, n)) / (2. * nn)
+    return center, np.linalg.norm(center - a)
+
+def _ball4(a, b, c, d):
+    # circumscribed sphere of a tetrahedron
+    m = 2. * np.array([b - a, c - a, d - a])
+    rhs = np.array([np.dot(b, b) - np.dot(a, a), np.dot(c, c) - np.dot(a, a), np.dot(d, d) - np.dot(a, a)])
+    if abs(np.linalg.det(m)) < 1e-20:
+        # coplanar, the smallest circle through three of the points containing the fourth
+        balls = [_ball3(a, b, c), _ball3(a, b, d), _ball3(a, c, d), _ball3(b, c, d)]
+        pts = [a, b, c, d]
+        balls = [ball for ball in balls if all(np.linalg.norm(p - ball[0]) <= ball[1] * (1 + 1e-9) for p in pts)]
+        return min(balls, key=lambda ball: ball[1]) if balls else _ball3(a, b, c)
+    center = np.linalg.solve(m, rhs)
+    return center, np.linalg.norm(center - a)
+
+def _welzl(points):
+    # minimum enclosing sphere of a small point set (randomized incremental
+    # Welzl), the expected time is linear in the number of points
+    def outside(p, ball):
+        return np.linalg.norm(p - ball[0]) > ball[1] * (1 + 1e-10) + 1e-12
+    ball = (points[0], 0.)
+    for i in range(1, len(points)):
+        if not outside(points[i], ball):
+            continue
+        ball = (points[i], 0.)
+        for j in range(i):
+            if not outside(points[j], ball):
+                continue
+            ball = _ball2(points[i], points[j])
+            for k in range(j):
+                if not outside(points[k], ball):
+                    continue
+                ball = _ball3(points[i], points[j], points[k])
+                for l in range(k):
+                    if outside(points[l], ball):
+                        ball = _ball4(points[i], points[j], points[k], points[l])
+    return ball
+
+def _distances(points, center, chunk=1 << 20):
+    center = center.astype(points.dtype)
+    return np.concatenate([np.linalg.norm(points[i:i + chunk] - center, axis=1)
+                           for i in range(0, len(points), chunk)])
+
+def min_enclosing_sphere(points, tol=1e-6, batch=32, seed=0):
+    # Exact minimum enclosing sphere of a large point array. Welzl runs on a
+    # small support set which grows by the farthest points outside the
+    # current sphere until no point is outside, the distance test over all
+    # points is a vectorized pass.
+    rng = np.random.default_rng(seed)
+    # start from the axis extremes and a random sample
+    initial = np.concatenate([np.argmin(points, axis=0), np.argmax(points, axis=0),
+                              rng.integers(0, len(points), min(batch, len(points)))])
+    support = np.unique(initial)
+    while True:
+        subset = points[support].astype(np.float64)
+        center, radius = _welzl(subset[rng.permutation(len(subset))])
+        dist = _distances(points, center)
+        outside = np.flatnonzero(dist > radius * (1 + tol))
+        if len(outside) == 0:
+            # never smaller than the farthest point
+            return center, float(max(radius, dist.max()))
+        farthest = outside[np.argsort(dist[outside])[-batch:]]
+        support = np.union1d(support, farthest)
+
+def scene_sphere(scene, depsgraph, exact=False, margin=1.01):
+    # bounding sphere of a blender scene as (center, radius, aabb), a sphere
+    # object named "bounding_sphere" overrides the computed sphere and has no aabb
+    bounding_sphere = scene.objects.get('bounding_sphere')
+    if bounding_sphere is not None:
+        return np.array(bounding_sphere.location), bounding_sphere.scale[0], None
+    # world-space vertices of the evaluated scene, modifiers and instances included
+    pts = scene_points(depsgraph)
+    # get the bounding box first
+    center, radius, aabb = aabb_sphere(pts)
+    if exact:
+        center, radius = min_enclosing_sphere(pts)
+        radius *= margin
+    return center, radius, aabb
@@ -0,0 +1,42 @@
+# Image file access through Blender, which reads 16-bit PNGs and EXRs losslessly
+
+import os
+import numpy as np
+import bpy
+
+def load_image(path):
+    # float pixels as an [H, W, C] array with the top row first
+    image = bpy.data.images.load(path, check_existing=False)
+    try:
+        # values as stored in the file, no color management
+        image.colorspace_settings.name = 'Non-Color'
+        width, height = image.size
+        channels = image.channels
+        pixels = np.empty(width * height * channels, dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(image)
+    return pixels.reshape(height, width, channels)[::-1]
+
+def save_image(path, pixels, image_format):
+    # write [H, W, C] float pixels with the top row first, image_format holds
+    # the image settings of the file, e.g. those of the file output nodes of
+    # render.py; values are stored without color management
+    height, width, channels = pixels.shape
+    rgba = np.ones([height, width, 4], dtype=np.float32)
+    rgba[..., :3] = pixels[..., :3] if channels >= 3 else pixels[..., :1]
+    if channels in [2, 4]:
+        rgba[..., 3] = pixels[..., -1]
+        if image_format['file_format'] == 'PNG':
+            # float buffers hold premultiplied alpha, png stores straight alpha
+            rgba[..., :3] *= rgba[..., 3:]
+    image = bpy.data.images.new(os.path.basename(path), width, height, alpha=channels in [2, 4], float_buffer=True)
+    try:
+        image.colorspace_settings.name = 'Non-Color'
+        image.pixels.foreach_set(rgba[::-1].ravel())
+        settings = bpy.context.scene.render.image_settings
+        for k, v in image_format.items():
+            setattr(settings, k, v)
+        image.save_render(path)
+    finally:
+        bpy.data.images.remove(image)
@@ -0,0 +1,122 @@
+# Camera sets of the bds splits, loaded from transforms_<split>.json or from
+# its binary sidecar transforms_<split>.npz
+
+import os
+import json
+import zipfile
+import numpy as np
+
+def split_names(cam_dir):
+    # splits with a camera JSON or a binary sidecar
+    splits = set()
+    for file in os.listdir(cam_dir):
+        if file.startswith('transforms_') and (file.endswith('.json') or file.endswith('.npz')):
+            splits.add(os.path.splitext(file)[0][len('transforms_'):])
+    return sorted(splits)
+
+def camera_json_path(cam_dir, split):
+    return os.path.join(cam_dir, f'transforms_{split}.json')
+
+def camera_sidecar_path(cam_dir, split):
+    return os.path.join(cam_dir, f'transforms_{split}.npz')
+
+class PathTable:
+    # file paths stored as one UTF-8 byte string array, decoded on access
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    @classmethod
+    def from_strings(cls, strings):
+        return cls(np.array([s.encode('utf-8') for s in strings], dtype=np.bytes_))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        return self.paths[idx].decode('utf-8')
+
+    def __iter__(self):
+        for path in self.paths:
+            yield path.decode('utf-8')
+
+class CameraSet:
+    # all cameras of one split: the horizontal fov, an [N, 4, 4] array of
+    # camera to world matrices and the output directory of each view
+
+    def __init__(self, camera_angle_x, transforms, file_paths):
+        self.camera_angle_x = float(camera_angle_x)
+        self.transforms = transforms
+        self.file_paths = file_paths
+
+    def __len__(self):
+        return len(self.transforms)
+
+def load_camera_json(path):
+    with open(path, 'r') as f:
+        obj = json.load(f)
+    frames = obj['frames']
+    # one contiguous array instead of an array per frame
+    transforms = np.array([frame['transform_matrix'] for frame in frames], dtype=np.float32).reshape(-1, 4, 4)
+    file_paths = PathTable.from_strings([frame['file_path'] for frame in frames])
+    return CameraSet(obj['camera_angle_x'], transforms, file_paths)
+
+def _mmap_npz(path):
+    # members of an uncompressed .npz are plain .npy files inside the zip,
+    # map their data directly instead of reading them into memory
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(archive.open(info))
+                continue
+            # skip the local file header, its extra field may differ from the central directory
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject or len(shape) == 0 or 0 in shape:
+                arrays[name] = np.load(archive.open(info))
+                continue
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                     order='F' if fortran_order else 'C')
+    return arrays
+
+def load_camera_sidecar(path, mmap=True):
+    arrays = _mmap_npz(path) if mmap else dict(np.load(path))
+    return CameraSet(arrays['camera_angle_x'], arrays['transform_matrix'], PathTable(arrays['file_path']))
+
+def load_camera_set(cam_dir, split, mmap=True):
+    # the sidecar is used unless the JSON was changed after writing it
+    json_file, sidecar_file = camera_json_path(cam_dir, split), camera_sidecar_path(cam_dir, split)
+    if os.path.exists(sidecar_file) and \
+            (not os.path.exists(json_file) or os.path.getmtime(sidecar_file) >= os.path.getmtime(json_file)):
+        return load_camera_sidecar(sidecar_file, mmap)
+    return load_camera_json(json_file)
+
+def write_camera_sidecar(path, camera_set):
+    # stored uncompressed so that it can be memory-mapped
+    np.savez(path,
+             camera_angle_x=np.float64(camera_set.camera_angle_x),
+             transform_matrix=np.ascontiguousarray(camera_set.transforms, dtype=np.float32),
+             file_path=camera_set.file_paths.paths)
+
+def annotate_camera_json(path, values):
+    # add per-frame values, keyed by file_path, to the frames of a camera
+    # JSON, its modification time is kept as the cameras do not change and
+    # an existing sidecar stays up to date
+    stat = os.stat(path)
+    with open(path, 'r') as f:
+        obj = json.load(f)
+    for frame in obj['frames']:
+        frame.update(values.get(frame['file_path'], {}))
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=4)
+    os.replace(tmp_path, path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
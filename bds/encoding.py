@@ -0,0 +1,21 @@
+# Pixel encodings of the bds outputs written by render.py
+
+def decode_depth(pixels, fmt, depth_min, depth_max):
+    # png depth maps store (depth - depth_min) / (depth_max - depth_min),
+    # single channel maps may come as [H, W]
+    depth = pixels[..., 0] if pixels.ndim == 3 else pixels
+    if fmt == 'png':
+        depth = depth * (depth_max - depth_min) + depth_min
+    return depth
+
+def decode_normal(pixels, fmt):
+    # png normal maps store 0.5 * normal + 0.5
+    normal = pixels[..., :3]
+    if fmt == 'png':
+        normal = normal * 2. - 1.
+    return normal
+
+def encode_normal(normal, fmt):
+    if fmt == 'png':
+        return normal * 0.5 + 0.5
+    return normal
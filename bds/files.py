@@ -0,0 +1,45 @@
+# File helpers shared by the converters
+
+import os
+import shutil
+import errno
+
+# ioctl request cloning a whole file on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+        try:
+            fcntl.ioctl(f_dst.fileno(), FICLONE, f_src.fileno())
+        except OSError:
+            f_dst.close()
+            os.remove(dst)
+            raise
+
+def link_or_copy(src, dst, link=True):
+    # share the bytes of src when the filesystem allows it: hardlink, then
+    # reflink, then a plain copy
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if link:
+        try:
+            os.link(src, dst)
+            return 'link'
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EACCES):
+                raise
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except (OSError, ImportError):
+            pass
+    shutil.copy2(src, dst)
+    return 'copy'
+
+def is_up_to_date(dst, srcs):
+    # dst exists and is not older than any of its sources
+    if not os.path.exists(dst):
+        return False
+    dst_mtime = os.path.getmtime(dst)
+    return all(os.path.getmtime(src) <= dst_mtime for src in srcs)
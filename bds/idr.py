@@ -0,0 +1,54 @@
+# Camera and image export of bds datasets in the IDR/NeuS layout (see IDR.md)
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+from bds.files import link_or_copy
+
+def intrinsic_matrix(camera_angle_x, resx, resy):
+    # K matrix (see IDR.md)
+    focal = 0.5 * resx / np.tan(0.5 * camera_angle_x)
+    cx = 0.5 * (resx - 1)
+    cy = 0.5 * (resy - 1)
+    return np.array([[focal, 0, cx, 0],
+                     [0, focal, cy, 0],
+                     [0, 0, 1, 0],
+                     [0, 0, 0, 1]], dtype=np.float32)
+
+def world_matrices(transforms, K):
+    # K @ flip @ inv(c2w) for all [N, 4, 4] camera to world matrices at once
+    # flip the y and z axes to transform the camera coordinates
+    camera_left_right = np.diag([1., -1., -1., 1.]).astype(np.float32)
+    Rt = np.linalg.inv(np.asarray(transforms, dtype=np.float32))
+    return (K @ camera_left_right) @ Rt
+
+def scale_matrix(sphere_center, sphere_radius):
+    scale_mat = np.diag([sphere_radius, sphere_radius, sphere_radius])
+    scale_mat = np.concatenate([scale_mat, np.asarray(sphere_center, dtype=np.float64)[:, None]], axis=1)
+    scale_mat = np.concatenate([scale_mat, np.zeros([1, 4])], axis=0)
+    scale_mat[3, 3] = 1.
+    return scale_mat.astype(np.float32)
+
+def save_cameras(path, world_mats, scale_mat, compact=False):
+    # per-index world_mat_i/scale_mat_i keys as read by IDR and NeuS, the
+    # compact variant is compressed and also stores the stacked arrays
+    npz_file = {}
+    for idx, world_mat in enumerate(world_mats):
+        npz_file[f'world_mat_{idx}'] = world_mat
+        npz_file[f'scale_mat_{idx}'] = scale_mat
+    if compact:
+        npz_file['world_mats'] = np.asarray(world_mats, dtype=np.float32)
+        npz_file['scale_mat'] = scale_mat
+        np.savez_compressed(path, **npz_file)
+    else:
+        np.savez(path, **npz_file)
+
+def export_images(jobs, num_workers, link=True, desc=None):
+    # (src, dst) pairs, linked when the filesystem allows it; the work is
+    # file system calls so threads run it in parallel. executor.map submits
+    # all jobs at once, the progress bar follows the finished ones
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        results = executor.map(lambda job: link_or_copy(job[0], job[1], link), jobs)
+        for _ in tqdm(results, desc, total=len(jobs), disable=desc is None):
+            pass
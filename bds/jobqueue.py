@@ -0,0 +1,176 @@
+# Lease based render job queue in one SQLite file, shared by a coordinator
+# and render workers on any number of nodes without another service:
+#
+#   chunks   consecutive views of one split. A worker leases a chunk for a
+#            limited time and renews the lease while rendering and after
+#            every view, chunks whose lease expired are leased again by the
+#            next worker asking, up to a maximum number of attempts
+#   commits  one row per view whose files were renamed into place, written
+#            by the lessee and read by the coordinator which alone writes
+#            the manifest. A new lessee skips the committed views of a chunk.
+#   workers  views, busy seconds and lost leases of every worker
+#
+# SQLite needs working file locks, on network filesystems the database has
+# to be on one providing them. Lease times use the wall clock of each node.
+
+import os
+import json
+import time
+import socket
+import sqlite3
+from contextlib import contextmanager
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY AUTOINCREMENT, split TEXT, views TEXT, state TEXT,
+                                   worker TEXT, expires REAL, attempts INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS commits (id INTEGER PRIMARY KEY AUTOINCREMENT, chunk INTEGER, split TEXT, idx INTEGER,
+                                    names TEXT, seconds REAL, stats TEXT, worker TEXT);
+CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, started REAL, heartbeat REAL, chunks INTEGER DEFAULT 0,
+                                    views INTEGER DEFAULT 0, seconds REAL DEFAULT 0, lost INTEGER DEFAULT 0);
+'''
+# chunk states
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+
+def worker_name(pid=None):
+    return f'{socket.gethostname()}-{pid or os.getpid()}'
+
+class JobQueue:
+
+    def __init__(self, path, timeout=60.):
+        self.path = path
+        # transactions are started explicitly
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        # takes the write lock up front, concurrent writers wait for it
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        self.db.execute('COMMIT')
+
+    def _meta(self, key, default=None):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else json.loads(row['value'])
+
+    def create(self, chunks, lease_seconds, max_attempts):
+        # replaces the chunks of an earlier run, ids are never reused so
+        # workers still holding an old chunk can not commit into the new run
+        with self.transaction() as db:
+            for table in ['chunks', 'commits', 'workers']:
+                db.execute(f'DELETE FROM {table}')
+            db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                           [(key, json.dumps(value)) for key, value in
+                            [('open', True), ('lease_seconds', lease_seconds), ('max_attempts', max_attempts)]])
+            db.executemany('INSERT INTO chunks (split, views, state) VALUES (?, ?, ?)',
+                           [(split, json.dumps(views), PENDING) for split, views in chunks])
+
+    def is_open(self):
+        # None until a coordinator created the queue
+        return self._meta('open')
+
+    def finish(self):
+        # workers waiting for a lease exit
+        with self.transaction() as db:
+            db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('open', json.dumps(False)))
+
+    def _expire(self, db, now):
+        # expired chunks without attempts left are given up
+        db.execute('UPDATE chunks SET state = ? WHERE state = ? AND expires < ? AND attempts >= ?',
+                   (FAILED, LEASED, now, self._meta('max_attempts')))
+
+    def expire(self):
+        with self.transaction() as db:
+            self._expire(db, time.time())
+
+    def release(self, worker):
+        # leases of a worker known to be dead expire now instead of at
+        # their timeout, returns their number
+        with self.transaction() as db:
+            return db.execute('UPDATE chunks SET expires = 0 WHERE worker = ? AND state = ?', (worker, LEASED)).rowcount
+
+    def lease(self, worker):
+        # (chunk id, split, views to render, previous lessee) or None if no
+        # chunk is available right now
+        now = time.time()
+        with self.transaction() as db:
+            db.execute('INSERT OR IGNORE INTO workers (worker, started, heartbeat) VALUES (?, ?, ?)', (worker, now, now))
+            self._expire(db, now)
+            row = db.execute('SELECT * FROM chunks WHERE state = ? OR (state = ? AND expires < ?) ORDER BY id LIMIT 1',
+                             (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE chunks SET state = ?, worker = ?, expires = ?, attempts = attempts + 1 WHERE id = ?',
+                       (LEASED, worker, now + self._meta('lease_seconds'), row['id']))
+            views = self._uncommitted(row)
+        return row['id'], row['split'], views, row['worker']
+
+    def _uncommitted(self, row):
+        # views of a chunk without a commit
+        committed = {r['idx'] for r in self.db.execute('SELECT idx FROM commits WHERE chunk = ?', (row['id'],))}
+        return [(idx, names) for idx, names in json.loads(row['views']) if idx not in committed]
+
+    def _renew(self, db, worker, chunk_id):
+        # extends the lease if the worker still holds it
+        now = time.time()
+        renewed = db.execute('UPDATE chunks SET expires = ? WHERE id = ? AND worker = ? AND state = ?',
+                             (now + self._meta('lease_seconds'), chunk_id, worker, LEASED)).rowcount == 1
+        db.execute('UPDATE workers SET heartbeat = ?, lost = lost + ? WHERE worker = ?',
+                   (now, 0 if renewed else 1, worker))
+        return renewed
+
+    def heartbeat(self, worker, chunk_id):
+        with self.transaction() as db:
+            return self._renew(db, worker, chunk_id)
+
+    def commit_view(self, worker, chunk_id, split, idx, names, seconds, stats=None):
+        # False if the lease was lost, the chunk belongs to another worker then
+        with self.transaction() as db:
+            if not self._renew(db, worker, chunk_id):
+                return False
+            db.execute('INSERT INTO commits (chunk, split, idx, names, seconds, stats, worker) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (chunk_id, split, idx, json.dumps(sorted(names)), seconds, json.dumps(stats), worker))
+            db.execute('UPDATE workers SET views = views + 1, seconds = seconds + ? WHERE worker = ?', (seconds, worker))
+            return True
+
+    def complete(self, worker, chunk_id):
+        with self.transaction() as db:
+            done = db.execute('UPDATE chunks SET state = ?, expires = NULL WHERE id = ? AND worker = ? AND state = ?',
+                              (DONE, chunk_id, worker, LEASED)).rowcount == 1
+            db.execute('UPDATE workers SET chunks = chunks + ?, lost = lost + ? WHERE worker = ?',
+                       (1 if done else 0, 0 if done else 1, worker))
+            return done
+
+    def commits(self, after=0):
+        # committed views with a commit id above after, in commit order
+        return [{'id': r['id'], 'split': r['split'], 'idx': r['idx'], 'names': json.loads(r['names']),
+                 'seconds': r['seconds'], 'stats': json.loads(r['stats']), 'worker': r['worker']}
+                for r in self.db.execute('SELECT * FROM commits WHERE id > ? ORDER BY id', (after,))]
+
+    def counts(self):
+        # number of chunks in each state, expired leases count as leased until
+        # they are leased again or expire() gives them up
+        return {r['state']: r['count'] for r in self.db.execute('SELECT state, COUNT(*) AS count FROM chunks '
+                                                                'GROUP BY state')}
+
+    def failed(self):
+        # given up chunks with their views that were never committed
+        return [(r['id'], r['split'], self._uncommitted(r))
+                for r in self.db.execute('SELECT * FROM chunks WHERE state = ?', (FAILED,)).fetchall()]
+
+    def reassigned(self):
+        # leases beyond the first of every chunk
+        return self.db.execute('SELECT COALESCE(SUM(attempts - 1), 0) FROM chunks WHERE attempts > 1').fetchone()[0]
+
+    def worker_stats(self):
+        return [dict(r) for r in self.db.execute('SELECT * FROM workers ORDER BY started')]
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,85 @@
+# Per-output completion manifest of a bds render
+
+import os
+import json
+import hashlib
+import numpy as np
+
+MANIFEST_NAME = 'manifest.jsonl'
+
+def output_key(split, file_path, name):
+    return f'{split}:{file_path}:{name}'
+
+def output_digest(c2w, cam_intrinsic, resolution, settings):
+    # everything that changes the pixels of one output file
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(c2w, dtype=np.float64).tobytes())
+    h.update(json.dumps([cam_intrinsic, list(resolution), settings], sort_keys=True).encode())
+    return h.hexdigest()
+
+class Manifest:
+    # The manifest is an append-only JSONL log of {"key": ..., "digest": ...}
+    # records, optionally with an "info" dict such as the achieved samples of
+    # the render. One line is appended and flushed for every finished output
+    # so a crash loses at most a partially written last line, which is ignored
+    # on loading. compact() atomically replaces the log with the latest records.
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        self.info = {}
+        self.log = None
+        damaged = False
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # interrupted write
+                        damaged = True
+                        continue
+                    self.entries[record['key']] = record['digest']
+                    if 'info' in record:
+                        self.info[record['key']] = record['info']
+                    else:
+                        self.info.pop(record['key'], None)
+        # new records must not be appended to a torn line
+        if damaged:
+            self.compact()
+
+    def is_done(self, key, digest):
+        return self.entries.get(key) == digest
+
+    def record(self, key, digest, info=None):
+        if self.log is None:
+            self.log = open(self.path, 'a')
+        self.entries[key] = digest
+        if info is not None:
+            self.info[key] = info
+        else:
+            self.info.pop(key, None)
+        self.log.write(json.dumps(self._record(key)) + '\n')
+        self.log.flush()
+        os.fsync(self.log.fileno())
+
+    def compact(self):
+        self.close()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for key in self.entries:
+                f.write(json.dumps(self._record(key)) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _record(self, key):
+        record = {'key': key, 'digest': self.entries[key]}
+        if key in self.info:
+            record['info'] = self.info[key]
+        return record
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
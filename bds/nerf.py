@@ -0,0 +1,55 @@
+# Conversion of bds views into the NeRF blender synthetic layout
+
+import os
+import numpy as np
+from PIL import Image
+
+from bds.files import link_or_copy, is_up_to_date
+
+MAP_NAMES = ['normal', 'depth', 'alpha']
+
+def read_alpha(path):
+    # [H, W, 1] 8-bit alpha of an RGBA or a single channel 8/16-bit alpha map
+    image = Image.open(path)
+    alpha = np.array(image)
+    if alpha.ndim == 3:
+        return alpha[:, :, -1:]
+    if alpha.dtype != np.uint8:
+        # 16-bit grayscale
+        alpha = np.round(alpha.astype(np.float32) / 257.).astype(np.uint8)
+    return alpha[:, :, None]
+
+def merge_color_alpha(color_path, alpha_path, dst):
+    # read color and alpha and add alpha channel to color
+    color = np.array(Image.open(color_path))
+    if color.shape[2] == 4:
+        color = color[:, :, :3]
+    alpha = read_alpha(alpha_path)
+    color = np.concatenate([color, alpha], axis=2)
+    # dst may be a link to the source color of an earlier conversion without
+    # alpha, a new file is renamed over it instead of writing into the link
+    tmp_path = dst + '.tmp.png'
+    Image.fromarray(color).save(tmp_path)
+    os.replace(tmp_path, dst)
+
+def convert_view(src_split_dir, dst_split_dir, view, link=True):
+    # <view>/color.png (+alpha.png) -> <view>.png, <view>/<map>.png -> <view>_<map>.png,
+    # outputs newer than their inputs are kept, returns the number of written files
+    src = {name: os.path.join(src_split_dir, view, f'{name}.png') for name in ['color'] + MAP_NAMES}
+    exist = {name: os.path.exists(path) for name, path in src.items()}
+    written = 0
+    color_dst = os.path.join(dst_split_dir, view + '.png')
+    if exist['color']:
+        if exist['alpha']:
+            if not is_up_to_date(color_dst, [src['color'], src['alpha']]):
+                merge_color_alpha(src['color'], src['alpha'], color_dst)
+                written += 1
+        elif not is_up_to_date(color_dst, [src['color']]):
+            link_or_copy(src['color'], color_dst, link)
+            written += 1
+    for name in MAP_NAMES:
+        dst = os.path.join(dst_split_dir, f'{view}_{name}.png')
+        if exist[name] and not is_up_to_date(dst, [src[name]]):
+            link_or_copy(src[name], dst, link)
+            written += 1
+    return written
@@ -0,0 +1,150 @@
+# Streaming conversion of finished views while the next ones render. The
+# render loop submits each view once all of its outputs are written, consumer
+# processes export it into the layouts of bds-to-b.py and bds-to-idr.py:
+#
+#   <output_dir>_blender   NeRF blender synthetic layout, color merged with alpha
+#   <output_dir>_idr       IDR image and mask folders, the cameras are written
+#                          by the coordinator once all views are done
+#
+# The consumers are `python -m bds.pipeline` processes which import neither
+# bpy nor render.py. Blender keeps the GIL while it renders, so tasks and
+# results are JSON lines written to and read from the consumers' pipes
+# directly by the render loop, without threads, and the number of views
+# waiting for export is bounded.
+
+import os, sys
+import json
+import logging
+import select
+import subprocess
+
+from bds.files import link_or_copy
+from bds.nerf import convert_view
+
+STREAM_TARGETS = ['nerf', 'idr']
+
+def nerf_dir(root):
+    return os.path.normpath(root) + '_blender'
+
+def idr_dir(root):
+    return os.path.normpath(root) + '_idr'
+
+def export_view(root, targets, file_dir, image_idx, link=True):
+    # returns the number of written files
+    src_view_dir = os.path.normpath(os.path.join(root, file_dir))
+    written = 0
+    if 'nerf' in targets:
+        rel_dir = os.path.relpath(src_view_dir, root)
+        dst_split_dir = os.path.join(nerf_dir(root), os.path.dirname(rel_dir))
+        os.makedirs(dst_split_dir, exist_ok=True)
+        written += convert_view(os.path.dirname(src_view_dir), dst_split_dir, os.path.basename(rel_dir), link)
+    if 'idr' in targets:
+        for name, folder in [('color', 'image'), ('alpha', 'mask')]:
+            src = os.path.join(src_view_dir, f'{name}.png')
+            if os.path.exists(src):
+                link_or_copy(src, os.path.join(idr_dir(root), folder, f'{image_idx}.png'), link)
+                written += 1
+    return written
+
+def consume(root, targets, link):
+    # one task per stdin line until it is closed, one result per stdout line
+    for line in sys.stdin:
+        split, file_dir, image_idx = json.loads(line)
+        try:
+            result = [split, file_dir, export_view(root, targets, file_dir, image_idx, link), None]
+        except Exception as e:
+            result = [split, file_dir, 0, repr(e)]
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+class Pipeline:
+    # views are submitted by done() once all of their pending outputs are
+    # recorded, num_views gives the view count of each split in split order
+    # which decides the IDR image indices
+
+    def __init__(self, root, targets, pending, num_views, num_consumers, queue_size, link=True):
+        self.root = os.path.normpath(root)
+        self.targets = targets
+        self.remaining = {(split, idx): set(names) for split in pending
+                          for idx, names in enumerate(pending[split]) if names}
+        self.offsets, offset = {}, 0
+        for split, count in num_views.items():
+            self.offsets[split] = offset
+            offset += count
+        if 'nerf' in targets:
+            os.makedirs(nerf_dir(self.root), exist_ok=True)
+        if 'idr' in targets:
+            os.makedirs(os.path.join(idr_dir(self.root), 'image'), exist_ok=True)
+            os.makedirs(os.path.join(idr_dir(self.root), 'mask'), exist_ok=True)
+
+        # the repository root for -m bds.pipeline
+        env = dict(os.environ)
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join([repo_root] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+        self.consumers = [subprocess.Popen([sys.executable, '-m', 'bds.pipeline', self.root, ','.join(targets),
+                                            str(int(link))], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+                          for _ in range(num_consumers)]
+        # tasks in flight and unfinished result line of every consumer
+        self.outstanding = [0] * num_consumers
+        self.buffers = [b''] * num_consumers
+        self.queue_size = queue_size
+        self.submitted, self.finished, self.written, self.errors = 0, 0, 0, 0
+
+    def submit(self, split, idx, file_dir):
+        # blocks while the queue is full
+        while sum(self.outstanding) >= self.queue_size:
+            self.collect(timeout=0.05)
+        i = min(range(len(self.consumers)), key=lambda i: self.outstanding[i])
+        self.consumers[i].stdin.write((json.dumps([split, file_dir, self.offsets[split] + idx]) + '\n').encode())
+        self.consumers[i].stdin.flush()
+        self.outstanding[i] += 1
+        self.submitted += 1
+        self.collect()
+
+    def done(self, split, idx, file_dir, names):
+        remaining = self.remaining.get((split, idx))
+        if remaining is None:
+            return
+        remaining -= set(names)
+        if not remaining:
+            del self.remaining[(split, idx)]
+            self.submit(split, idx, file_dir)
+
+    def collect(self, timeout=0.):
+        # results of the exported views, waits at most timeout seconds
+        busy = [consumer.stdout for i, consumer in enumerate(self.consumers) if self.outstanding[i] > 0]
+        if not busy:
+            return
+        readable, _, _ = select.select(busy, [], [], timeout)
+        for i, consumer in enumerate(self.consumers):
+            if consumer.stdout not in readable:
+                continue
+            data = os.read(consumer.stdout.fileno(), 1 << 16)
+            if not data and consumer.poll() is not None:
+                raise RuntimeError(f'Stream consumer exited with code {consumer.returncode} before exporting '
+                                   f'{self.outstanding[i]} view{"s" if self.outstanding[i] != 1 else ""}.')
+            lines = (self.buffers[i] + data).split(b'\n')
+            self.buffers[i] = lines.pop()
+            for line in lines:
+                split, file_dir, written, error = json.loads(line)
+                self.outstanding[i] -= 1
+                self.finished += 1
+                self.written += written
+                if error is not None:
+                    self.errors += 1
+                    logging.error(f'Exporting {file_dir} of split "{split}" failed: {error}')
+
+    def close(self):
+        for consumer in self.consumers:
+            consumer.stdin.close()
+        while self.finished < self.submitted:
+            self.collect(timeout=0.05)
+        for consumer in self.consumers:
+            consumer.wait()
+        logging.info(f'Streamed {self.finished} view{"s" if self.finished != 1 else ""} to {", ".join(self.targets)}: '
+                     f'{self.written} file{"s" if self.written != 1 else ""} written, {self.errors} failed.')
+
+
+if __name__ == '__main__':
+    # consumer process: root, comma separated targets, link
+    consume(sys.argv[1], sys.argv[2].split(','), bool(int(sys.argv[3])))
@@ -0,0 +1,115 @@
+# Per-frame render profiling. The phases of a frame are delimited by marks,
+# set by the render loop and by the blender render handlers:
+#
+#   setup         camera and output paths, until the render starts
+#   sync          render_pre until the first sample, scene and BVH updates
+#   path_tracing  stats lines reporting samples
+#   post          denoising, compositing and file output nodes until render_post
+#   finalize      renaming the outputs and the manifest records
+#
+# Every frame is appended to <dir>/<name>.jsonl and as complete events to the
+# Chrome trace <dir>/<name>.trace.json (chrome://tracing, Perfetto).
+
+import os
+import re
+import json
+import logging
+import time
+import numpy as np
+
+PHASES = ['setup', 'sync', 'path_tracing', 'post', 'finalize']
+SAMPLE_PATTERN = re.compile(r'Sample (\d+)/(\d+)')
+# e.g. "Mem:245.32M, Peak:512.10M"
+PEAK_PATTERN = re.compile(r'Peak:\s*([\d.]+)([KMG])')
+UNITS = {'K': 2 ** -10, 'M': 1., 'G': 2 ** 10}
+
+class Profiler:
+
+    def __init__(self, profile_dir, name='render', pid=0):
+        os.makedirs(profile_dir, exist_ok=True)
+        self.log = open(os.path.join(profile_dir, f'{name}.jsonl'), 'a')
+        # the JSON array format may be left unterminated, a crashed run
+        # still gives a readable trace
+        self.trace = open(os.path.join(profile_dir, f'{name}.trace.json'), 'w')
+        self.trace.write('[\n')
+        self.num_events = 0
+        self.pid = pid
+        self.origin = time.perf_counter()
+        self.frame = None
+        self.frames = {}
+
+    def begin_frame(self, split, idx, render_pass):
+        self.frame = {'split': split, 'view': int(idx), 'pass': render_pass, 'samples': 0, 'peak_memory_mb': None,
+                      'marks': [('setup', time.perf_counter())]}
+
+    def mark(self, phase):
+        # marks outside of a frame, or repeating the current phase, are ignored
+        if self.frame is not None and self.frame['marks'][-1][0] != phase:
+            self.frame['marks'].append((phase, time.perf_counter()))
+
+    def stats(self, line):
+        if self.frame is None:
+            return
+        match = SAMPLE_PATTERN.search(line)
+        if match:
+            self.frame['samples'] = int(match.group(1))
+            self.mark('path_tracing')
+        elif self.frame['marks'][-1][0] == 'path_tracing':
+            self.mark('post')
+        match = PEAK_PATTERN.search(line)
+        if match:
+            peak = float(match.group(1)) * UNITS[match.group(2)]
+            self.frame['peak_memory_mb'] = max(peak, self.frame['peak_memory_mb'] or 0.)
+
+    def end_frame(self):
+        if self.frame is None:
+            return
+        frame, self.frame = self.frame, None
+        marks = frame.pop('marks') + [(None, time.perf_counter())]
+        phases = {}
+        for (phase, start), (_, end) in zip(marks[:-1], marks[1:]):
+            phases[phase] = phases.get(phase, 0.) + end - start
+            self._event(phase, start, end, {})
+        frame['start'] = marks[0][1] - self.origin
+        frame['total'] = marks[-1][1] - marks[0][1]
+        frame['phases'] = phases
+        self._event(f'{frame["split"]}/{frame["view"]} {frame["pass"]}', marks[0][1], marks[-1][1],
+                    {'samples': frame['samples'], 'peak_memory_mb': frame['peak_memory_mb']}, tid=1)
+        self.log.write(json.dumps(frame) + '\n')
+        self.log.flush()
+        self.frames.setdefault((frame['split'], frame['pass']), []).append(frame)
+
+    def _event(self, name, start, end, args, tid=0):
+        event = {'name': name, 'ph': 'X', 'pid': self.pid, 'tid': tid, 'ts': (start - self.origin) * 1e6,
+                 'dur': (end - start) * 1e6, 'args': args}
+        self.trace.write((',\n' if self.num_events > 0 else '') + json.dumps(event))
+        self.num_events += 1
+
+    def summarize(self, split, render_pass, wall_time=None):
+        # p50/p95 of each phase, the frame rate is taken from the wall time of
+        # the render loop if given, otherwise from the frame times alone
+        frames = self.frames.get((split, render_pass), [])
+        if not frames:
+            return
+        totals = np.array([frame['total'] for frame in frames])
+        wall_time = wall_time or totals.sum()
+        lines = [f'Profile of split "{split}", {render_pass} pass: {len(frames)} frame{"s" if len(frames) != 1 else ""}, '
+                 f'{len(frames) / wall_time * 3600:.1f} frames/hour',
+                 f'{"phase":<14} {"p50":>9} {"p95":>9} {"mean":>9} {"share":>7}']
+        for phase in PHASES + ['total']:
+            times = totals if phase == 'total' else np.array([frame['phases'].get(phase, 0.) for frame in frames])
+            lines.append(f'{phase:<14} {np.percentile(times, 50):>9.4f} {np.percentile(times, 95):>9.4f} '
+                         f'{times.mean():>9.4f} {times.sum() / max(totals.sum(), 1e-12):>7.1%}')
+        peaks = [frame['peak_memory_mb'] for frame in frames if frame['peak_memory_mb'] is not None]
+        if peaks:
+            lines.append(f'peak memory {max(peaks):.1f} MiB')
+        logging.info('\n'.join(lines))
+
+    def summarize_all(self):
+        for split, render_pass in list(self.frames):
+            self.summarize(split, render_pass)
+
+    def close(self):
+        self.log.close()
+        self.trace.write('\n]\n')
+        self.trace.close()
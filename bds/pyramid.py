@@ -0,0 +1,120 @@
+# Lower resolution levels of the bds outputs. Level k halves the resolution k
+# times and is a complete bds root of its own:
+#
+#   output---level_1---transforms_train.json   intrinsics of the level
+#          |         \-train---r_0---color.png
+#          |-level_2--...
+#          |-train---r_0---color.png          full resolution
+#         ...
+#
+# Every level is reduced from the previous one over 2x2 blocks: colors are
+# averaged with premultiplied alpha, alpha is the covered area, depth keeps
+# the nearest surface and normals are averaged and renormalized.
+
+import os
+import json
+import math
+import numpy as np
+
+from bds.encoding import decode_normal, encode_normal
+
+def level_dir(root, level):
+    return os.path.join(root, f'level_{level}')
+
+def mean_2x2(x):
+    height, width = x.shape[:2]
+    return x.reshape(height // 2, 2, width // 2, 2, *x.shape[2:]).mean(axis=(1, 3))
+
+def min_2x2(x):
+    height, width = x.shape[:2]
+    return x.reshape(height // 2, 2, width // 2, 2, *x.shape[2:]).min(axis=(1, 3))
+
+def _unpremultiply(premul):
+    alpha = premul[..., 3:]
+    color = np.where(alpha > 0, premul[..., :3] / np.maximum(alpha, 1e-12), 0.)
+    return np.concatenate([color, alpha], axis=-1)
+
+def color_pyramid(pixels, levels, premultiplied=False):
+    # opaque colors are plainly averaged, RGBA colors are averaged after
+    # premultiplication so that transparent pixels do not bleed into edges
+    levels_out = []
+    if pixels.shape[-1] != 4:
+        for _ in range(levels):
+            pixels = mean_2x2(pixels)
+            levels_out.append(pixels)
+        return levels_out
+    if not premultiplied:
+        pixels = np.concatenate([pixels[..., :3] * pixels[..., 3:], pixels[..., 3:]], axis=-1)
+    for _ in range(levels):
+        pixels = mean_2x2(pixels)
+        levels_out.append(pixels if premultiplied else _unpremultiply(pixels))
+    return levels_out
+
+def alpha_pyramid(pixels, levels):
+    levels_out = []
+    for _ in range(levels):
+        pixels = mean_2x2(pixels)
+        levels_out.append(pixels)
+    return levels_out
+
+def depth_pyramid(pixels, levels):
+    # the nearest depth of a block, a foreground surface is never averaged
+    # with the background; a trailing alpha channel is averaged
+    levels_out = []
+    has_alpha = pixels.ndim == 3 and pixels.shape[-1] in [2, 4]
+    for _ in range(levels):
+        if has_alpha:
+            pixels = np.concatenate([min_2x2(pixels[..., :-1]), mean_2x2(pixels[..., -1:])], axis=-1)
+        else:
+            pixels = min_2x2(pixels)
+        levels_out.append(pixels)
+    return levels_out
+
+def normal_pyramid(pixels, fmt, levels):
+    # alpha weighted average of the decoded normals, renormalized on each level
+    alpha = pixels[..., 3:] if pixels.shape[-1] == 4 else np.ones_like(pixels[..., :1])
+    weighted = np.concatenate([decode_normal(pixels, fmt) * alpha, alpha], axis=-1)
+    levels_out = []
+    for _ in range(levels):
+        weighted = mean_2x2(weighted)
+        normal = weighted[..., :3]
+        norm = np.linalg.norm(normal, axis=-1, keepdims=True)
+        normal = np.where(norm > 0, normal / np.maximum(norm, 1e-12), 0.)
+        level = encode_normal(normal, fmt)
+        if pixels.shape[-1] == 4:
+            level = np.concatenate([level, weighted[..., 3:]], axis=-1)
+        levels_out.append(level.astype(pixels.dtype))
+    return levels_out
+
+def build_pyramid(name, pixels, fmt, levels):
+    # levels 1..levels of one output, pixels are [H, W, C] as stored in the file
+    if name == 'color':
+        # exr stores premultiplied alpha, png straight alpha
+        return color_pyramid(pixels, levels, premultiplied=fmt == 'exr')
+    if name == 'alpha':
+        return alpha_pyramid(pixels, levels)
+    if name == 'depth':
+        return depth_pyramid(pixels, levels)
+    if name == 'normal':
+        return normal_pyramid(pixels, fmt, levels)
+    raise ValueError(f'Unknown output "{name}".')
+
+def level_intrinsics(camera_angle_x, resx, resy, level):
+    # the field of view is kept, the focal length scales with the resolution
+    width, height = resx >> level, resy >> level
+    focal = 0.5 * width / math.tan(0.5 * camera_angle_x)
+    return {'w': width, 'h': height, 'fl_x': focal, 'fl_y': focal, 'cx': 0.5 * width, 'cy': 0.5 * height}
+
+def write_level_cameras(path, camera_set, resx, resy, level, frames=None):
+    # camera JSON of a level, frames of the full resolution JSON are kept
+    # with their extra values if given
+    if frames is None:
+        frames = [{'file_path': file_path, 'transform_matrix': c2w.tolist()}
+                  for file_path, c2w in zip(camera_set.file_paths, np.asarray(camera_set.transforms))]
+    obj = {'camera_angle_x': camera_set.camera_angle_x,
+           **level_intrinsics(camera_set.camera_angle_x, resx, resy, level), 'frames': frames}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=4)
+    os.replace(tmp_path, path)
@@ -0,0 +1,279 @@
+# Random access reader of bds datasets. Outputs are decoded lazily per view
+# and output name, kept in a byte-bounded LRU cache and can be prefetched by
+# a thread pool. The encodings of render.py are undone: depth is returned in
+# scene units and normals in [-1, 1].
+#
+#   dataset = BdsDataset('outputs/lego', 'train')
+#   depth = dataset[0]['depth']              # [H, W] float32
+#   for idx, view in dataset.iterate(shuffle=True):
+#       color = view['color']                # [H, W, 3|4] float32 in [0, 1]
+#   c2w = dataset.cameras[indices]           # [B, 4, 4]
+#
+# PNGs are decoded with OpenCV if it is installed, otherwise with PIL which
+# reads 16-bit RGB(A) PNGs with 8 bits only; EXRs need OpenEXR or OpenCV.
+
+import os
+import io
+import math
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+from bds.camera import load_camera_set
+from bds.encoding import decode_depth, decode_normal
+from bds.shards import ShardReader, is_packed, OUTPUT_EXTS
+from bds.scene_meta import load_scene_meta, depth_range
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+try:
+    import OpenEXR
+except ImportError:
+    OpenEXR = None
+
+_warned = set()
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        logging.warning(message)
+
+def _normalize(pixels):
+    # integer pixels to float32 in [0, 1]
+    if pixels.dtype == np.uint8:
+        return pixels.astype(np.float32) / 255.
+    if pixels.dtype in [np.uint16, np.int32]:
+        return pixels.astype(np.float32) / 65535.
+    return pixels.astype(np.float32)
+
+def _decode_png(data):
+    if cv2 is not None:
+        pixels = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if pixels.ndim == 3:
+            # BGR(A) to RGB(A)
+            pixels = pixels[..., [2, 1, 0, 3][:pixels.shape[-1]]]
+        return _normalize(pixels)
+    image = Image.open(io.BytesIO(data))
+    # the raw mode of the file is only known before loading
+    if image.tile and str(image.tile[0].args).startswith(('RGB;16', 'RGBA;16')):
+        _warn_once('PIL decodes 16-bit RGB(A) PNGs with 8 bits, install OpenCV for full precision.')
+    return _normalize(np.array(image))
+
+def _decode_exr(data):
+    if OpenEXR is not None:
+        # OpenEXR reads files only
+        with tempfile.NamedTemporaryFile(suffix='.exr') as f:
+            f.write(data)
+            f.flush()
+            # one [H, W] array per channel instead of a merged RGB(A) entry
+            channels = OpenEXR.File(f.name, separate_channels=True).channels()
+        # RGBA order, single channel files have one Y or V channel
+        names = [name for name in ['R', 'G', 'B', 'A'] if name in channels] or list(channels)
+        return np.stack([np.asarray(channels[name].pixels, dtype=np.float32) for name in names], axis=-1)
+    if cv2 is not None:
+        pixels = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        if pixels is None:
+            raise RuntimeError('OpenCV could not decode the EXR, set OPENCV_IO_ENABLE_OPENEXR=1.')
+        if pixels.ndim == 3:
+            pixels = pixels[..., [2, 1, 0, 3][:pixels.shape[-1]]]
+        return pixels.astype(np.float32)
+    raise ImportError('Reading EXR outputs requires OpenEXR or OpenCV.')
+
+def decode_image(data, ext):
+    # [H, W, C] float32 pixels of an encoded output, C is 1 for single channel files
+    pixels = _decode_png(data) if ext == 'png' else _decode_exr(data)
+    return pixels[..., None] if pixels.ndim == 2 else pixels
+
+def decode_output(name, pixels, ext, depth_min, depth_max):
+    # values of an output as written by render.py
+    if name == 'alpha':
+        return pixels[..., -1]
+    if name == 'depth':
+        return decode_depth(pixels, ext, depth_min, depth_max)
+    if name == 'normal':
+        return decode_normal(pixels, ext)
+    return pixels
+
+class ArrayCache:
+    # LRU cache of arrays bounded by their total size in bytes
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key).nbytes
+            self.entries[key] = value
+            self.bytes += value.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+class View:
+    # outputs of one view, decoded on first access
+
+    def __init__(self, dataset, idx):
+        self.dataset = dataset
+        self.idx = idx
+
+    def __getitem__(self, name):
+        return self.dataset.load(self.idx, name)
+
+    def __contains__(self, name):
+        return self.dataset.has(self.idx, name)
+
+    @property
+    def c2w(self):
+        return self.dataset.cameras[self.idx]
+
+class BdsDataset:
+    # one split of a bds dataset, loose files or shards
+
+    def __init__(self, root, split, names=('color', 'alpha', 'depth', 'normal'), depth_min=None, depth_max=None,
+                 cache_bytes=2 ** 30, num_threads=8):
+        self.root = root
+        self.split = split
+        self.names = list(names)
+        # the depth range of png depth maps is read from scene.json unless given
+        self.meta = load_scene_meta(root)
+        meta_min, meta_max = depth_range(self.meta)
+        self.depth_min = meta_min if depth_min is None else depth_min
+        self.depth_max = meta_max if depth_max is None else depth_max
+        camera_set = load_camera_set(root, split)
+        self.camera_angle_x = camera_set.camera_angle_x
+        self.file_paths = camera_set.file_paths
+        # [N, 4, 4] camera to world matrices
+        self.cameras = np.asarray(camera_set.transforms)
+        self.shards = ShardReader(root, split) if is_packed(root, split) else None
+        self.cache = ArrayCache(cache_bytes)
+        self.executor = ThreadPoolExecutor(max_workers=num_threads)
+        self.num_threads = num_threads
+        # futures of outputs being decoded, shared by load() and prefetch()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def __getitem__(self, idx):
+        if not -len(self) <= idx < len(self):
+            raise IndexError(f'View {idx} out of range for {len(self)} views.')
+        return View(self, idx % len(self))
+
+    def focal_length(self, width):
+        return 0.5 * width / math.tan(0.5 * self.camera_angle_x)
+
+    def _find(self, idx, name):
+        # (encoded bytes reader, extension) of an output, None if missing
+        if self.shards is not None:
+            if not self.shards.has(idx, name):
+                return None
+            return (lambda: self.shards.read(idx, name)), self.shards.ext(idx, name)
+        view_dir = os.path.join(self.root, self.file_paths[idx])
+        for ext in OUTPUT_EXTS:
+            path = os.path.join(view_dir, f'{name}.{ext}')
+            if os.path.exists(path):
+                def read(path=path):
+                    with open(path, 'rb') as f:
+                        return f.read()
+                return read, ext
+        return None
+
+    def has(self, idx, name):
+        return self._find(idx, name) is not None
+
+    def _decode(self, idx, name):
+        found = self._find(idx, name)
+        if found is None:
+            raise KeyError(f'View {idx} of split "{self.split}" has no {name} output.')
+        read, ext = found
+        value = decode_output(name, decode_image(read(), ext), ext, self.depth_min, self.depth_max)
+        self.cache.put((idx, name), value)
+        return value
+
+    def _submit(self, idx, name):
+        # future of an output, a running decode is shared
+        with self.lock:
+            future = self.inflight.get((idx, name))
+            if future is not None:
+                return future
+            future = self.executor.submit(self._decode, idx, name)
+            self.inflight[(idx, name)] = future
+        # a finished future runs the callback at once, it takes the lock itself
+        future.add_done_callback(lambda _, key=(idx, name): self._done(key))
+        return future
+
+    def _done(self, key):
+        with self.lock:
+            self.inflight.pop(key, None)
+
+    def load(self, idx, name):
+        value = self.cache.get((idx, name))
+        if value is not None:
+            return value
+        with self.lock:
+            future = self.inflight.get((idx, name))
+        if future is not None:
+            return future.result()
+        return self._decode(idx, name)
+
+    def prefetch(self, indices, names=None):
+        # decode outputs in the background, skipping cached ones
+        futures = []
+        for idx in indices:
+            for name in names or self.names:
+                if (idx, name) not in self.cache:
+                    futures.append(self._submit(idx, name))
+        return futures
+
+    def batch(self, indices, name):
+        # [B, ...] array of one output of several views, decoded in parallel
+        self.prefetch(indices, [name])
+        return np.stack([self.load(idx, name) for idx in indices])
+
+    def iterate(self, indices=None, shuffle=False, seed=0, lookahead=None):
+        # (idx, view) pairs with the outputs of the next views prefetched
+        order = np.arange(len(self)) if indices is None else np.asarray(indices)
+        if shuffle:
+            order = np.random.default_rng(seed).permutation(order)
+        lookahead = lookahead or 2 * self.num_threads
+        # outputs of the first view decide what is prefetched
+        names = [name for name in self.names if self.has(int(order[0]), name)] if len(order) else []
+        self.prefetch(order[:lookahead].tolist(), names)
+        for i, idx in enumerate(order):
+            # keep the window of the next views decoding
+            if i + lookahead < len(order):
+                self.prefetch([int(order[i + lookahead])], names)
+            yield int(idx), self[int(idx)]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        if self.shards is not None:
+            self.shards.close()
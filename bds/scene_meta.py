@@ -0,0 +1,61 @@
+# Scene metadata sidecar <output_dir>/scene.json, written by render.py so
+# that the converters and readers need neither bpy nor the .blend:
+#
+#   scene_path   the rendered scene and its modification time
+#   resolution   [width, height] of the outputs
+#   aabb         world axis aligned bounding box of the evaluated geometry,
+#                null if the scene has a "bounding_sphere" object
+#   sphere       center, radius and source of the bounding sphere: "object"
+#                for a "bounding_sphere" object, "aabb" for the sphere around
+#                the box, "exact" for the minimum enclosing sphere. aabb and
+#                sphere are null if the scene has no geometry
+#   intrinsics   pinhole intrinsics of each split
+#   outputs      format and encoding of each output, png depth maps with
+#                their depth range
+
+import os
+import json
+import numpy as np
+
+SCENE_META_NAME = 'scene.json'
+
+def scene_meta_path(root):
+    return os.path.join(root, SCENE_META_NAME)
+
+def load_scene_meta(root):
+    # None if the dataset has no sidecar
+    path = scene_meta_path(root)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_scene_meta(root, meta):
+    path = scene_meta_path(root)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=4)
+    os.replace(tmp_path, path)
+
+def sphere_meta(center, radius, aabb, source, margin=None):
+    sphere = {'center': np.asarray(center, dtype=np.float64).tolist(), 'radius': float(radius), 'source': source}
+    if margin is not None:
+        sphere['margin'] = margin
+    return {'aabb': None if aabb is None else [np.asarray(aabb[0]).tolist(), np.asarray(aabb[1]).tolist()],
+            'sphere': sphere}
+
+def meta_sphere(meta, exact=False, margin=1.01):
+    # (center, radius, aabb) as returned by bounds.scene_sphere, None if the
+    # stored sphere is not the requested kind. An object sphere is always used.
+    sphere = meta.get('sphere')
+    if sphere is None or sphere['source'] not in ['object', 'exact' if exact else 'aabb']:
+        return None
+    if sphere['source'] == 'exact' and sphere.get('margin') != margin:
+        return None
+    aabb = meta.get('aabb')
+    return np.array(sphere['center']), sphere['radius'], None if aabb is None else (np.array(aabb[0]), np.array(aabb[1]))
+
+def depth_range(meta, default=(2., 6.)):
+    # (depth_min, depth_max) of png depth maps
+    depth = (meta or {}).get('outputs', {}).get('depth', {})
+    return depth.get('depth_min', default[0]), depth.get('depth_max', default[1])
@@ -0,0 +1,225 @@
+# Packed output layout: the encoded images of a split are concatenated into
+# fixed-size shard files, an index gives the location of every output
+#
+#   output---shards---train---meta.json      passes, shard range
+#          |                |-index.npy      [N, passes] (shard, offset, length, ext)
+#          |                |-cameras.npy    [N, 4, 4] camera to world matrices
+#          |                |-shard_00000.bin
+#          |                \-...
+#          |-transforms_train.json
+#         ...
+#
+# Shards are numbered from meta['first_shard'] to meta['num_shards'] - 1.
+# Outputs added again supersede their old copies, the live outputs are then
+# rewritten into fresh shards and the old ones removed.
+
+import os
+import json
+import logging
+import numpy as np
+
+SHARD_DIR = 'shards'
+# ext is the position in OUTPUT_EXTS
+INDEX_DTYPE = np.dtype([('shard', '<u4'), ('offset', '<u8'), ('length', '<u8'), ('ext', 'u1')])
+# outputs written by render.py
+OUTPUT_NAMES = ['color', 'alpha', 'depth', 'normal']
+OUTPUT_EXTS = ['png', 'exr']
+
+def shard_dir(root, split):
+    return os.path.join(root, SHARD_DIR, split)
+
+def is_packed(root, split):
+    return os.path.exists(os.path.join(shard_dir(root, split), 'meta.json'))
+
+def shard_path(dir, shard):
+    return os.path.join(dir, f'shard_{shard:05d}.bin')
+
+def _replace_atomic(path, write):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class ShardWriter:
+    # Appends outputs to the shards of a split. Outputs of an existing shard
+    # set are kept, re-added outputs point to their new copy, the index and
+    # meta data are replaced atomically on close(). If outputs were
+    # superseded, close() first copies the live outputs into fresh shards.
+
+    def __init__(self, root, split, transforms, shard_size):
+        self.dir = shard_dir(root, split)
+        self.transforms = transforms
+        self.shard_size = shard_size
+        os.makedirs(self.dir, exist_ok=True)
+        self.passes, self.first_shard, self.num_shards = [], 0, 0
+        self.index = np.zeros([len(transforms), 0], dtype=INDEX_DTYPE)
+        self.superseded = 0
+        if is_packed(root, split):
+            meta = json.load(open(os.path.join(self.dir, 'meta.json'), 'r'))
+            if meta['num_views'] == len(transforms):
+                self.passes, self.num_shards = meta['passes'], meta['num_shards']
+                self.first_shard = meta['first_shard']
+                self.index = np.load(os.path.join(self.dir, 'index.npy'))
+                # shards left behind by an interrupted compaction
+                for shard in range(self.first_shard):
+                    if os.path.exists(shard_path(self.dir, shard)):
+                        os.remove(shard_path(self.dir, shard))
+            else:
+                logging.warning(f'Shards of split "{split}" hold {meta["num_views"]} views instead of '
+                                f'{len(transforms)}, starting a new shard set.')
+                for file in os.listdir(self.dir):
+                    os.remove(os.path.join(self.dir, file))
+        self.file = None
+        self.file_size = 0
+
+    def _next_shard(self):
+        self._close_shard()
+        self.file = open(shard_path(self.dir, self.num_shards), 'wb')
+        self.file_size = 0
+        self.num_shards += 1
+
+    def _close_shard(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+    def add(self, idx, name, ext, data):
+        if name not in self.passes:
+            # new column for a pass added later
+            self.passes.append(name)
+            self.index = np.concatenate([self.index, np.zeros([len(self.index), 1], dtype=INDEX_DTYPE)], axis=1)
+        col = self.passes.index(name)
+        if self.index[idx, col]['length'] > 0:
+            self.superseded += 1
+        self._write(idx, col, OUTPUT_EXTS.index(ext), data)
+
+    def _write(self, idx, col, ext, data):
+        if self.file is None or (self.file_size > 0 and self.file_size + len(data) > self.shard_size):
+            self._next_shard()
+        self.index[idx, col] = (self.num_shards - 1, self.file_size, len(data), ext)
+        self.file.write(data)
+        self.file_size += len(data)
+
+    def _compact(self):
+        # copy the live outputs in view order into shards after the current
+        # ones, returns the shards that are no longer referenced
+        self._close_shard()
+        old_index, old_shards = self.index, range(self.first_shard, self.num_shards)
+        self.index = np.zeros_like(old_index)
+        self.first_shard = self.num_shards
+        fds = {}
+        try:
+            for idx in range(len(old_index)):
+                for col in range(len(self.passes)):
+                    entry = old_index[idx, col]
+                    if entry['length'] == 0:
+                        continue
+                    shard = int(entry['shard'])
+                    if shard not in fds:
+                        fds[shard] = os.open(shard_path(self.dir, shard), os.O_RDONLY)
+                    self._write(idx, col, int(entry['ext']),
+                                os.pread(fds[shard], int(entry['length']), int(entry['offset'])))
+        finally:
+            for fd in fds.values():
+                os.close(fd)
+        self._close_shard()
+        return old_shards
+
+    def close(self):
+        self._close_shard()
+        unused = self._compact() if self.superseded > 0 else []
+        _replace_atomic(os.path.join(self.dir, 'cameras.npy'),
+                        lambda f: np.save(f, np.ascontiguousarray(self.transforms, dtype=np.float32)))
+        _replace_atomic(os.path.join(self.dir, 'index.npy'), lambda f: np.save(f, self.index))
+        meta = {'passes': self.passes, 'first_shard': self.first_shard, 'num_shards': self.num_shards,
+                'num_views': len(self.index), 'shard_size': self.shard_size}
+        _replace_atomic(os.path.join(self.dir, 'meta.json'), lambda f: f.write(json.dumps(meta, indent=4).encode()))
+        # only removed once the new index is in place
+        for shard in unused:
+            os.remove(shard_path(self.dir, shard))
+        if unused:
+            logging.info(f'{self.superseded} superseded output{"s" if self.superseded != 1 else ""} dropped, '
+                         f'{len(unused)} shard{"s" if len(unused) != 1 else ""} rewritten.')
+
+class ShardReader:
+    # random access to the outputs of a packed split, one pread per output
+
+    def __init__(self, root, split):
+        self.dir = shard_dir(root, split)
+        meta = json.load(open(os.path.join(self.dir, 'meta.json'), 'r'))
+        self.passes = meta['passes']
+        self.index = np.load(os.path.join(self.dir, 'index.npy'), mmap_mode='r')
+        self.cameras = np.load(os.path.join(self.dir, 'cameras.npy'), mmap_mode='r')
+        self.fds = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def has(self, idx, name):
+        return name in self.passes and self.index[idx, self.passes.index(name)]['length'] > 0
+
+    def ext(self, idx, name):
+        return OUTPUT_EXTS[int(self.index[idx, self.passes.index(name)]['ext'])]
+
+    def read(self, idx, name):
+        entry = self.index[idx, self.passes.index(name)]
+        if entry['length'] == 0:
+            raise KeyError(f'View {idx} has no {name} output.')
+        shard = int(entry['shard'])
+        fd = self.fds.get(shard)
+        if fd is None:
+            # safe for concurrent readers, a descriptor opened twice is closed again
+            fd = os.open(shard_path(self.dir, shard), os.O_RDONLY)
+            existing = self.fds.setdefault(shard, fd)
+            if existing != fd:
+                os.close(fd)
+                fd = existing
+        return os.pread(fd, int(entry['length']), int(entry['offset']))
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
+
+def pack_split(root, split, camera_set, shard_size, remove=False):
+    # move the loose output files of a split into its shards
+    writer = ShardWriter(root, split, camera_set.transforms, shard_size)
+    packed = []
+    for idx, file_path in enumerate(camera_set.file_paths):
+        view_dir = os.path.join(root, file_path)
+        for name in OUTPUT_NAMES:
+            for ext in OUTPUT_EXTS:
+                path = os.path.join(view_dir, f'{name}.{ext}')
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        writer.add(idx, name, ext, f.read())
+                    packed.append(path)
+    writer.close()
+    # only remove files once the index pointing at their copies is written
+    if remove:
+        for path in packed:
+            os.remove(path)
+        for file_path in camera_set.file_paths:
+            view_dir = os.path.join(root, file_path)
+            if os.path.isdir(view_dir) and not os.listdir(view_dir):
+                os.rmdir(view_dir)
+    return len(packed)
+
+def unpack_split(root, split, camera_set):
+    # write the outputs of a packed split back into view directories
+    reader = ShardReader(root, split)
+    unpacked = 0
+    for idx, file_path in enumerate(camera_set.file_paths):
+        view_dir = os.path.join(root, file_path)
+        for name in reader.passes:
+            if reader.has(idx, name):
+                os.makedirs(view_dir, exist_ok=True)
+                with open(os.path.join(view_dir, f'{name}.{reader.ext(idx, name)}'), 'wb') as f:
+                    f.write(reader.read(idx, name))
+                unpacked += 1
+    reader.close()
+    return unpacked
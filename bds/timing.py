@@ -0,0 +1,34 @@
+# Per-view render times, summarized per split and render pass and optionally
+# appended to a JSONL log, one line per rendered view
+
+import json
+import logging
+import numpy as np
+
+class FrameTimes:
+
+    def __init__(self, path='', **settings):
+        # settings are stored with every line, e.g. the device of the run
+        self.settings = settings
+        self.file = open(path, 'a') if path else None
+        self.times = {}
+
+    def record(self, split, idx, render_pass, seconds):
+        self.times.setdefault((split, render_pass), []).append(seconds)
+        if self.file is not None:
+            self.file.write(json.dumps({'split': split, 'view': int(idx), 'pass': render_pass,
+                                        'seconds': seconds, **self.settings}) + '\n')
+            self.file.flush()
+
+    def summarize(self):
+        # the first view of a split also pays for the scene synchronization
+        for (split, render_pass), times in self.times.items():
+            rest = np.array(times[1:] if len(times) > 1 else times)
+            logging.info(f'Split "{split}", {render_pass} pass: {len(times)} view{"s" if len(times) != 1 else ""}, '
+                         f'first {times[0]:.3f}s, then {rest.mean():.3f}s/view mean, '
+                         f'{np.median(rest):.3f}s/view median.')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,76 @@
+# Conversion time of bds-to-b.py on a synthetic dataset: serial copies as the
+# script used to work, parallel linking, and an incremental rerun
+
+import os, sys
+import json
+import subprocess
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+from absl import app, flags
+
+from common import REPO_ROOT, save_results
+
+flags.DEFINE_integer('num_views', 50000, 'number of synthetic views')
+flags.DEFINE_integer('resolution', 64, 'width and height of the synthetic images')
+flags.DEFINE_integer('num_workers', os.cpu_count() or 1, 'number of conversion processes of the parallel runs')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def write_dataset(root):
+    rng = np.random.default_rng(0)
+    res = FLAGS.resolution
+    os.makedirs(root)
+    frames = []
+    # a few distinct images reused by all views keep the generation fast
+    images = {'color': Image.fromarray(rng.integers(0, 256, [res, res, 3], dtype=np.uint8)),
+              'alpha': Image.fromarray(rng.integers(0, 256, [res, res, 4], dtype=np.uint8)),
+              'depth': Image.fromarray(rng.integers(0, 256, [res, res, 4], dtype=np.uint8)),
+              'normal': Image.fromarray(rng.integers(0, 256, [res, res, 4], dtype=np.uint8))}
+    encoded = {}
+    for name, image in images.items():
+        path = os.path.join(root, f'{name}.png')
+        image.save(path)
+        encoded[name] = open(path, 'rb').read()
+        os.remove(path)
+    for i in range(FLAGS.num_views):
+        view_dir = os.path.join(root, 'train', f'r_{i}')
+        os.makedirs(view_dir)
+        for name, data in encoded.items():
+            with open(os.path.join(view_dir, f'{name}.png'), 'wb') as f:
+                f.write(data)
+        frames.append({'file_path': f'./train/r_{i}', 'transform_matrix': np.eye(4).tolist()})
+    with open(os.path.join(root, 'transforms_train.json'), 'w') as f:
+        json.dump({'camera_angle_x': 0.69, 'frames': frames}, f)
+
+def run_converter(output_dir, args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(REPO_ROOT, 'bds-to-b.py'), f'--output_dir={output_dir}'] + args,
+                   check=True, cwd=REPO_ROOT, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+def main(_):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_dir = os.path.join(tmp_dir, 'synthetic')
+        write_dataset(output_dir)
+        runs = [('serial copy', ['--num_workers=1', '--nolink', '--noincremental']),
+                (f'{FLAGS.num_workers} workers, link', [f'--num_workers={FLAGS.num_workers}', '--noincremental']),
+                ('incremental rerun', [f'--num_workers={FLAGS.num_workers}', '--incremental'])]
+        for name, args in runs:
+            seconds = run_converter(output_dir, args)
+            results.append({'run': name, 'views': FLAGS.num_views, 'seconds': seconds,
+                            'views_per_second': FLAGS.num_views / seconds})
+
+    print(f'{"run":<22} {"seconds":>9} {"views/s":>9}')
+    for r in results:
+        print(f'{r["run"]:<22} {r["seconds"]:>9.2f} {r["views_per_second"]:>9.0f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,93 @@
+# Camera conversion and image export of bds-to-idr.py at a large frame count:
+# the per-frame loop the script used to run against the batched conversion,
+# both camera npz variants, and serial copies against the parallel export
+
+import os, sys
+import tempfile
+import shutil
+import time
+import numpy as np
+from absl import app, flags
+
+from common import save_results
+from bds.idr import intrinsic_matrix, world_matrices, scale_matrix, save_cameras, export_images
+
+flags.DEFINE_integer('num_frames', 100000, 'number of synthetic frames')
+flags.DEFINE_integer('image_kb', 16, 'size of each synthetic image in KiB')
+flags.DEFINE_integer('num_workers', 16, 'number of export threads')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def random_c2w(rng, n):
+    # random rotations and translations
+    q = rng.normal(size=[n, 4])
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    c2w = np.tile(np.eye(4, dtype=np.float32), [n, 1, 1])
+    c2w[:, :3, :3] = np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+                               2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+                               2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=1).reshape(n, 3, 3)
+    c2w[:, :3, 3] = rng.normal(size=[n, 3]) * 4
+    return c2w
+
+def timed(results, name, fn):
+    start = time.perf_counter()
+    value = fn()
+    results.append({'step': name, 'seconds': time.perf_counter() - start})
+    return value
+
+def main(_):
+    rng = np.random.default_rng(0)
+    n = FLAGS.num_frames
+    c2w = random_c2w(rng, n)
+    K = intrinsic_matrix(0.69, 800, 800)
+    scale_mat = scale_matrix(np.zeros(3), 1.5)
+    camera_left_right = np.diag([1., -1., -1., 1.]).astype(np.float32)
+    results = []
+
+    def legacy_loop():
+        npz_file = {}
+        for idx in range(n):
+            Rt = np.linalg.inv(np.array(c2w[idx], dtype=np.float32))
+            npz_file[f'world_mat_{idx}'] = K @ camera_left_right @ Rt
+            npz_file[f'scale_mat_{idx}'] = scale_mat
+        return npz_file
+    legacy = timed(results, 'cameras: per-frame loop', legacy_loop)
+    batched = timed(results, 'cameras: batched', lambda: world_matrices(c2w, K))
+    assert np.allclose(np.stack([legacy[f'world_mat_{i}'] for i in range(n)]), batched, rtol=1e-4, atol=1e-3)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for compact in [False, True]:
+            path = os.path.join(tmp_dir, f'cameras_{compact}.npz')
+            timed(results, f'npz: {"compact" if compact else "legacy"}', lambda: save_cameras(path, batched, scale_mat, compact))
+            results[-1]['bytes'] = os.path.getsize(path)
+
+        # synthetic images and masks
+        src_dir = os.path.join(tmp_dir, 'src')
+        os.makedirs(src_dir)
+        payload = rng.bytes(FLAGS.image_kb * 1024)
+        jobs = []
+        for idx in range(n):
+            src = os.path.join(src_dir, f'{idx}.png')
+            with open(src, 'wb') as f:
+                f.write(payload)
+            jobs.append(src)
+        for name, run in [('export: serial copy', lambda dst: [shutil.copy(src, os.path.join(dst, os.path.basename(src))) for src in jobs]),
+                          ('export: threads, link', lambda dst: export_images([(src, os.path.join(dst, os.path.basename(src))) for src in jobs],
+                                                                              FLAGS.num_workers))]:
+            dst_dir = os.path.join(tmp_dir, name.replace(' ', '_').replace(':', '').replace(',', ''))
+            os.makedirs(dst_dir)
+            timed(results, name, lambda: run(dst_dir))
+
+    print(f'{"step":<26} {"seconds":>9} {"MiB":>8}')
+    for r in results:
+        size = f'{r["bytes"] / 2 ** 20:>8.1f}' if 'bytes' in r else ''
+        print(f'{r["step"]:<26} {r["seconds"]:>9.3f} {size}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,96 @@
+# Load time and memory of camera sets: per-frame JSON parsing as render.py used
+# to do it, the contiguous JSON loader and the memory-mapped .npz sidecar
+
+import os, sys
+import json
+import math
+import multiprocessing
+import tempfile
+import time
+import numpy as np
+from absl import app, flags
+
+from common import save_results
+from bds.camera import load_camera_json, load_camera_sidecar, write_camera_sidecar
+
+flags.DEFINE_list('sizes', ['1000', '100000', '1000000'], 'number of frames of the synthetic camera sets')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def write_synthetic_json(path, num_frames):
+    # cameras on a sphere looking at the origin, written like the NeRF synthetic JSONs
+    rng = np.random.default_rng(0)
+    with open(path, 'w') as f:
+        f.write('{"camera_angle_x": 0.6911112070083618, "frames": [')
+        for i in range(num_frames):
+            theta, phi = rng.uniform(0, 2 * math.pi), rng.uniform(0.1, 0.5 * math.pi)
+            t = 4. * np.array([math.cos(theta) * math.cos(phi), math.sin(theta) * math.cos(phi), math.sin(phi)])
+            z = t / np.linalg.norm(t)
+            x = np.cross([0., 0., 1.], z)
+            x /= np.linalg.norm(x)
+            y = np.cross(z, x)
+            c2w = np.eye(4)
+            c2w[:3, 0], c2w[:3, 1], c2w[:3, 2], c2w[:3, 3] = x, y, z, t
+            frame = {'file_path': f'./train/r_{i}', 'rotation': 0.0, 'transform_matrix': c2w.tolist()}
+            f.write((',' if i else '') + json.dumps(frame))
+        f.write(']}')
+
+def load_legacy(path):
+    # the per-frame loading render.py used before the camera sets
+    obj = json.load(open(path, 'r'))
+    file_paths, c2ws = [], []
+    for frame in obj['frames']:
+        file_paths.append(frame['file_path'])
+        c2ws.append(np.array(frame['transform_matrix']))
+    return file_paths, c2ws
+
+def peak_rss_kb():
+    # high water mark of this process' memory, ru_maxrss would survive exec
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+def measure(method, path):
+    # runs in a fresh process so that the peak RSS belongs to this load only
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    if method == 'legacy':
+        result = load_legacy(path)
+    elif method == 'json':
+        result = load_camera_json(path)
+    else:
+        result = load_camera_sidecar(path)
+        # touch all matrices once
+        float(np.asarray(result.transforms).sum())
+    seconds = time.perf_counter() - start
+    rss_after = peak_rss_kb()
+    return seconds, (rss_after - rss_before) / 1024.
+
+def main(_):
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in map(int, FLAGS.sizes):
+            json_file = os.path.join(tmp_dir, f'transforms_{size}.json')
+            sidecar_file = os.path.join(tmp_dir, f'transforms_{size}.npz')
+            write_synthetic_json(json_file, size)
+            write_camera_sidecar(sidecar_file, load_camera_json(json_file))
+            for method, path in [('legacy', json_file), ('json', json_file), ('npz', sidecar_file)]:
+                with ctx.Pool(1) as pool:
+                    seconds, rss_mb = pool.apply(measure, (method, path))
+                results.append({'frames': size, 'method': method, 'seconds': seconds, 'peak_rss_mb': rss_mb,
+                                'file_mb': os.path.getsize(path) / 2 ** 20})
+
+    print(f'{"frames":>8} {"method":<7} {"seconds":>9} {"RSS MB":>8} {"file MB":>8}')
+    for r in results:
+        print(f'{r["frames"]:>8} {r["method"]:<7} {r["seconds"]:>9.3f} {r["peak_rss_mb"]:>8.1f} {r["file_mb"]:>8.1f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,52 @@
+# Helpers shared by the benchmark scripts
+
+import os, sys
+import json
+import subprocess
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the benchmarks use the bds package of the repository
+sys.path.insert(0, REPO_ROOT)
+RENDER_SCRIPT = os.path.join(REPO_ROOT, 'render.py')
+
+def subset_cameras(cam_dir, dst_dir, num_frames):
+    # copy camera JSONs keeping only the first num_frames frames of each split
+    os.makedirs(dst_dir, exist_ok=True)
+    total = 0
+    for split_json in sorted(os.listdir(cam_dir)):
+        if split_json.startswith('transforms_') and split_json.endswith('.json'):
+            with open(os.path.join(cam_dir, split_json), 'r') as f:
+                obj = json.load(f)
+            obj['frames'] = obj['frames'][:num_frames]
+            total += len(obj['frames'])
+            with open(os.path.join(dst_dir, split_json), 'w') as f:
+                json.dump(obj, f, indent=4)
+    return total
+
+def run_render(args):
+    # run render.py in a fresh interpreter, returns wall-clock seconds
+    start = time.perf_counter()
+    subprocess.run([sys.executable, RENDER_SCRIPT] + args, check=True, cwd=REPO_ROOT)
+    return time.perf_counter() - start
+
+def run_render_measured(args):
+    # run render.py and collect the resource usage of that child alone,
+    # returns wall-clock seconds and its rusage. ru_maxrss also covers the
+    # memory of the caller at exec time, the caller should not load bpy.
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, RENDER_SCRIPT] + args, cwd=REPO_ROOT)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, proc.args)
+    return seconds, rusage
+
+def dir_size(path):
+    # bytes of all files below path
+    return sum(os.path.getsize(os.path.join(root, file)) for root, _, files in os.walk(path) for file in files)
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
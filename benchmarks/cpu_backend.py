@@ -0,0 +1,53 @@
+# Per-view render times of the CPU backend of render.py with and without
+# persistent data, read from the frame logs of the runs
+
+import os, sys
+import json
+import logging
+import tempfile
+import numpy as np
+from absl import app, flags
+
+from common import REPO_ROOT, subset_cameras, run_render, save_results
+
+flags.DEFINE_string('config', os.path.join(REPO_ROOT, 'configs', 'lego.txt'), 'render.py flagfile to benchmark')
+flags.DEFINE_string('cam_dir', os.path.join(REPO_ROOT, 'cameras'), 'directory containing camera JSON files')
+flags.DEFINE_integer('num_frames', 10, 'number of frames rendered from each split')
+flags.DEFINE_integer('cpu_threads', 0, 'number of CPU render threads, 0 uses all cores')
+flags.DEFINE_integer('autotune_frames', 0, 'also run with --autotune_frames if greater than 0')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def main(_):
+    runs = [('default', []), ('persistent', ['--persistent_data'])]
+    if FLAGS.autotune_frames > 0:
+        runs.append(('persistent+autotune', ['--persistent_data', f'--autotune_frames={FLAGS.autotune_frames}']))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cam_dir = os.path.join(tmp_dir, 'cameras')
+        num_views = subset_cameras(FLAGS.cam_dir, cam_dir, FLAGS.num_frames)
+        for name, extra_args in runs:
+            output_dir = os.path.join(tmp_dir, name)
+            frame_log = os.path.join(tmp_dir, f'{name}.jsonl')
+            seconds = run_render([f'--flagfile={FLAGS.config}', f'--cam_dir={cam_dir}', f'--output_dir={output_dir}',
+                                  '--device=cpu', f'--cpu_threads={FLAGS.cpu_threads}',
+                                  f'--frame_log={frame_log}'] + extra_args)
+            with open(frame_log, 'r') as f:
+                times = np.array([json.loads(line)['seconds'] for line in f])
+            results.append({'mode': name, 'views': num_views, 'seconds': seconds,
+                            'first_view': float(times[0]), 'mean_view': float(times.mean()),
+                            'median_view': float(np.median(times))})
+            logging.info(f'{name}: {seconds:.2f}s, {times.mean():.3f}s/view')
+
+    print(f'{"mode":<20} {"views":>6} {"seconds":>10} {"first":>8} {"mean":>8} {"median":>8}')
+    for r in results:
+        print(f'{r["mode"]:<20} {r["views"]:>6} {r["seconds"]:>10.2f} {r["first_view"]:>8.3f} '
+              f'{r["mean_view"]:>8.3f} {r["median_view"]:>8.3f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
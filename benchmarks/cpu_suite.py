@@ -0,0 +1,117 @@
+# CPU rendering benchmark suite: builds the procedural scene of
+# procedural_scene.py and renders it with a set of render.py configurations,
+# reporting seconds per view, bytes written, the time spent compositing and
+# writing the outputs (the post phase of --profile) and the peak RSS of each
+# run.
+# Results are saved as JSON together with the machine and the git revision
+# so that runs of different versions can be compared.
+
+import os, sys
+import json
+import logging
+import platform
+import shutil
+import subprocess
+import tempfile
+from absl import app, flags
+
+from common import REPO_ROOT, run_render_measured, dir_size, save_results
+
+flags.DEFINE_integer('num_views', 8, 'number of views rendered by each configuration')
+flags.DEFINE_list('configs', [], 'names of the configurations to run, all if empty')
+flags.DEFINE_integer('cpu_threads', 0, 'number of CPU render threads, 0 uses all cores')
+flags.DEFINE_string('scene_path', '', 'use this scene and camera directory(--cam_dir) instead of building '
+                                      'the procedural scene')
+flags.DEFINE_string('cam_dir', '', 'camera directory of --scene_path')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+SCENE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'procedural_scene.py')
+RGB = ['--rgb_format=png']
+ALL_PNG = ['--rgb_format=png', '--alpha_format=png', '--depth_format=png', '--normal_format=png']
+ALL_EXR = ['--rgb_format=exr', '--alpha_format=exr', '--depth_format=exr', '--normal_format=exr']
+# name, resolution, samples and output flags of each configuration
+CONFIGS = [
+    ('rgb-256-s16', 256, 16, RGB),
+    ('rgb-512-s16', 512, 16, RGB),
+    ('rgb-512-s64', 512, 64, RGB),
+    ('rgb-exr-512-s16', 512, 16, ['--rgb_format=exr']),
+    ('geometry-png-512', 512, 16, ['--rgb_format=nil', '--alpha_format=png', '--depth_format=png',
+                                   '--normal_format=png']),
+    ('all-png-512-s16', 512, 16, ALL_PNG),
+    ('all-exr-512-s16', 512, 16, ALL_EXR),
+    ('all-png-512-s16-single', 512, 16, ALL_PNG + ['--single_pass']),
+    ('all-png-512-s16-fast', 512, 16, ALL_PNG + ['--fast_geometry']),
+    # output profiles
+    ('all-png-512-compact', 512, 16, ALL_PNG + ['--output_profile=compact']),
+    ('all-png-512-compact16', 512, 16, ALL_PNG + ['--output_profile=compact16']),
+    ('all-png-512-compact-c0', 512, 16, ALL_PNG + ['--output_profile=compact', '--png_compression=0']),
+    ('all-exr-512-half-zip', 512, 16, ALL_EXR + ['--output_profile=compact', '--exr_codec=ZIP']),
+    ('all-exr-512-half-piz', 512, 16, ALL_EXR + ['--output_profile=compact', '--exr_codec=PIZ']),
+    ('all-exr-512-half-dwaa', 512, 16, ALL_EXR + ['--output_profile=compact', '--exr_codec=DWAA']),
+]
+
+def write_seconds(profile_dir):
+    # mean time per view from the end of path tracing until render_post:
+    # denoising, compositing and the file output nodes
+    seconds = {}
+    with open(os.path.join(profile_dir, 'render.jsonl'), 'r') as f:
+        for line in f:
+            frame = json.loads(line)
+            key = (frame['split'], frame['view'])
+            seconds[key] = seconds.get(key, 0.) + frame['phases'].get('post', 0.)
+    return sum(seconds.values()) / max(len(seconds), 1)
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(_):
+    configs = [config for config in CONFIGS if not FLAGS.configs or config[0] in FLAGS.configs]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scene_path, cam_dir = FLAGS.scene_path, FLAGS.cam_dir
+        if not scene_path:
+            scene_path, cam_dir = os.path.join(tmp_dir, 'scene.blend'), os.path.join(tmp_dir, 'cameras')
+            subprocess.run([sys.executable, SCENE_SCRIPT, f'--scene_path={scene_path}', f'--cam_dir={cam_dir}',
+                            f'--num_views={FLAGS.num_views}'], check=True)
+        for name, resolution, samples, output_args in configs:
+            output_dir = os.path.join(tmp_dir, name)
+            profile_dir = os.path.join(tmp_dir, f'{name}_profile')
+            seconds, rusage = run_render_measured([
+                f'--scene_path={scene_path}', f'--cam_dir={cam_dir}', f'--output_dir={output_dir}',
+                f'--resx={resolution}', f'--resy={resolution}', f'--max_samples={samples}', '--device=cpu',
+                f'--cpu_threads={FLAGS.cpu_threads}', '--depth_min=2', '--depth_max=6',
+                f'--profile={profile_dir}'] + output_args)
+            # rendered outputs only, not the camera JSON and the manifest
+            num_bytes = sum(dir_size(os.path.join(output_dir, entry)) for entry in os.listdir(output_dir)
+                            if os.path.isdir(os.path.join(output_dir, entry)))
+            results.append({'config': name, 'resolution': resolution, 'samples': samples, 'args': output_args,
+                            'views': FLAGS.num_views, 'seconds': seconds, 'seconds_per_view': seconds / FLAGS.num_views,
+                            'bytes_written': num_bytes, 'bytes_per_view': num_bytes / FLAGS.num_views,
+                            'write_seconds_per_view': write_seconds(profile_dir),
+                            # kilobytes on linux
+                            'peak_rss_mb': rusage.ru_maxrss / 1024,
+                            'cpu_seconds': rusage.ru_utime + rusage.ru_stime})
+            logging.info(f'{name}: {seconds / FLAGS.num_views:.3f}s/view, {num_bytes / FLAGS.num_views / 2 ** 20:.2f} '
+                         f'MiB/view, peak RSS {rusage.ru_maxrss / 1024:.0f} MiB')
+            # outputs are only measured, free the space for the next run
+            shutil.rmtree(output_dir)
+
+    print(f'{"config":<24} {"s/view":>8} {"write s":>8} {"MiB/view":>9} {"peak RSS":>9} {"CPU s":>8}')
+    for r in results:
+        print(f'{r["config"]:<24} {r["seconds_per_view"]:>8.3f} {r["write_seconds_per_view"]:>8.3f} '
+              f'{r["bytes_per_view"] / 2 ** 20:>9.2f} {r["peak_rss_mb"]:>9.0f} {r["cpu_seconds"]:>8.1f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, {'revision': git_revision(), 'machine': platform.machine(),
+                                     'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+                                     'python': platform.python_version(), 'results': results})
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,64 @@
+# The job queue of render.py --job_queue with local workers of which some
+# crash before committing a view (--job_crash_rate), for a few chunk sizes.
+# The coordinator restarts crashed workers, afterwards the queue is read to
+# check that every view was committed once and to report per-worker
+# throughput and the reassigned leases.
+
+import os, sys
+import logging
+import tempfile
+from absl import app, flags
+
+from common import REPO_ROOT, subset_cameras, run_render, save_results
+from bds.jobqueue import JobQueue
+
+flags.DEFINE_string('config', os.path.join(REPO_ROOT, 'configs', 'lego.txt'), 'render.py flagfile to benchmark')
+flags.DEFINE_string('cam_dir', os.path.join(REPO_ROOT, 'cameras'), 'directory containing camera JSON files')
+flags.DEFINE_integer('num_frames', 16, 'number of frames rendered from each split')
+flags.DEFINE_integer('num_workers', 4, 'number of local worker processes')
+flags.DEFINE_list('chunk_sizes', ['1', '4', '16'], 'chunk sizes to compare')
+flags.DEFINE_float('crash_rate', 0.05, 'probability of a worker crash before committing a view')
+flags.DEFINE_integer('max_attempts', 100, 'number of leases of a chunk before it is given up')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def main(_):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cam_dir = os.path.join(tmp_dir, 'cameras')
+        num_views = subset_cameras(FLAGS.cam_dir, cam_dir, FLAGS.num_frames)
+        for chunk_size in map(int, FLAGS.chunk_sizes):
+            output_dir = os.path.join(tmp_dir, f'chunk_{chunk_size}')
+            db_path = os.path.join(tmp_dir, f'queue_{chunk_size}.db')
+            seconds = run_render([f'--flagfile={FLAGS.config}', f'--cam_dir={cam_dir}', f'--output_dir={output_dir}',
+                                  f'--job_queue={db_path}', f'--job_chunk_size={chunk_size}',
+                                  f'--job_local_workers={FLAGS.num_workers}', f'--job_crash_rate={FLAGS.crash_rate}',
+                                  f'--job_max_attempts={FLAGS.max_attempts}'])
+            # the queue keeps the commits and worker stats of the run
+            job_queue = JobQueue(db_path)
+            commits = [(commit['split'], commit['idx']) for commit in job_queue.commits()]
+            assert len(commits) == len(set(commits)) == num_views, 'views missing or committed twice'
+            stats = job_queue.worker_stats()
+            results.append({'chunk_size': chunk_size, 'views': num_views, 'seconds': seconds,
+                            'views_per_second': num_views / seconds, 'workers': len(stats),
+                            'reassigned': job_queue.reassigned(), 'lost_leases': sum(stat['lost'] for stat in stats),
+                            'worker_stats': [{'worker': stat['worker'], 'views': stat['views'],
+                                              'chunks': stat['chunks'],
+                                              'views_per_second': stat['views'] / max(stat['seconds'], 1e-9)}
+                                             for stat in stats]})
+            job_queue.close()
+            logging.info(f'Chunk size {chunk_size}: {num_views / seconds:.3f} views/s')
+
+    # every restarted worker shows up as a worker of its own
+    print(f'{"chunk":>5} {"views":>6} {"seconds":>9} {"views/s":>8} {"workers":>7} {"reassigned":>10} {"lost":>5}')
+    for r in results:
+        print(f'{r["chunk_size"]:>5} {r["views"]:>6} {r["seconds"]:>9.2f} {r["views_per_second"]:>8.3f} '
+              f'{r["workers"]:>7} {r["reassigned"]:>10} {r["lost_leases"]:>5}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,106 @@
+# Build the procedural benchmark scene: a ground plane, a few meshes with a
+# procedural and an image textured material, an area light and a camera.
+# The camera set is written in the transforms_<split>.json format.
+
+import os, sys
+import json
+import math
+import numpy as np
+import bpy
+from absl import app, flags
+
+flags.DEFINE_string('scene_path', '', 'path of the .blend file to write')
+flags.DEFINE_string('cam_dir', '', 'directory receiving transforms_<split>.json')
+flags.DEFINE_integer('num_views', 8, 'number of views of the camera set')
+flags.DEFINE_float('camera_radius', 4., 'distance of the cameras from the scene center')
+flags.DEFINE_integer('subdivision_levels', 2, 'subdivision levels of the spheres, controls the triangle count')
+
+FLAGS = flags.FLAGS
+
+def textured_material(name):
+    # noise driven base color mixed with a generated image texture
+    material = bpy.data.materials.new(name)
+    material.use_nodes = True
+    nodes, links = material.node_tree.nodes, material.node_tree.links
+    bsdf = nodes['Principled BSDF']
+    noise = nodes.new('ShaderNodeTexNoise')
+    noise.inputs['Scale'].default_value = 8.
+    image = nodes.new('ShaderNodeTexImage')
+    image.image = bpy.data.images.new(f'{name}_grid', 1024, 1024)
+    image.image.generated_type = 'COLOR_GRID'
+    mix = nodes.new('ShaderNodeMixRGB')
+    mix.inputs['Fac'].default_value = 0.5
+    links.new(noise.outputs['Color'], mix.inputs['Color1'])
+    links.new(image.outputs['Color'], mix.inputs['Color2'])
+    links.new(mix.outputs['Color'], bsdf.inputs['Base Color'])
+    bsdf.inputs['Roughness'].default_value = 0.4
+    return material
+
+def build_scene():
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    scene.render.engine = 'CYCLES'
+
+    material = textured_material('bds_textured')
+    bpy.ops.mesh.primitive_plane_add(size=6., location=(0., 0., -1.))
+    bpy.context.active_object.data.materials.append(material)
+    for idx, location in enumerate([(-0.8, -0.6, 0.), (0.8, -0.6, 0.), (0., 0.8, 0.)]):
+        bpy.ops.mesh.primitive_uv_sphere_add(radius=0.5, location=location)
+        obj = bpy.context.active_object
+        subdivision = obj.modifiers.new('subdivision', 'SUBSURF')
+        subdivision.levels = subdivision.render_levels = FLAGS.subdivision_levels
+        obj.data.materials.append(material)
+        bpy.ops.object.shade_smooth()
+    bpy.ops.mesh.primitive_torus_add(location=(0., 0., 0.6), major_radius=0.6, minor_radius=0.15)
+    bpy.context.active_object.data.materials.append(material)
+    bpy.ops.mesh.primitive_cube_add(size=0.5, location=(0., -0.2, -0.5))
+    bpy.context.active_object.data.materials.append(material)
+
+    bpy.ops.object.light_add(type='AREA', location=(2., -2., 4.))
+    light = bpy.context.active_object
+    light.data.energy = 800.
+    light.data.size = 2.
+    light.rotation_euler = (math.radians(30.), math.radians(20.), 0.)
+
+    world = bpy.data.worlds.new('bds_world')
+    world.use_nodes = True
+    world.node_tree.nodes['Background'].inputs['Color'].default_value = (0.05, 0.05, 0.08, 1.)
+    world.node_tree.nodes['Background'].inputs['Strength'].default_value = 1.
+    scene.world = world
+
+    bpy.ops.object.camera_add()
+    scene.camera = bpy.context.active_object
+    bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(FLAGS.scene_path))
+
+def look_at(eye, target=np.zeros(3), up=np.array([0., 0., 1.])):
+    # camera to world matrix, the camera looks along -z with +y up
+    z = eye - target
+    z /= np.linalg.norm(z)
+    x = np.cross(up, z)
+    x /= np.linalg.norm(x)
+    y = np.cross(z, x)
+    c2w = np.eye(4)
+    c2w[:3, 0], c2w[:3, 1], c2w[:3, 2], c2w[:3, 3] = x, y, z, eye
+    return c2w
+
+def write_cameras(split='test'):
+    # views on a spiral over the upper hemisphere
+    frames = []
+    for idx in range(FLAGS.num_views):
+        t = (idx + 0.5) / FLAGS.num_views
+        azimuth, elevation = 2. * math.pi * 3. * t, math.radians(15. + 50. * t)
+        eye = FLAGS.camera_radius * np.array([math.cos(elevation) * math.cos(azimuth),
+                                              math.cos(elevation) * math.sin(azimuth), math.sin(elevation)])
+        frames.append({'file_path': f'./{split}/r_{idx}', 'transform_matrix': look_at(eye).tolist()})
+    os.makedirs(FLAGS.cam_dir, exist_ok=True)
+    with open(os.path.join(FLAGS.cam_dir, f'transforms_{split}.json'), 'w') as f:
+        json.dump({'camera_angle_x': 0.6911112070083618, 'frames': frames}, f, indent=4)
+
+def main(_):
+    build_scene()
+    write_cameras()
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
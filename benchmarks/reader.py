@@ -0,0 +1,99 @@
+# Views per second of the BdsDataset reader against loading every view with
+# PIL in a loop, for a sequential and a shuffled epoch, cold and cached
+
+import os, sys
+import json
+import tempfile
+import time
+import numpy as np
+from absl import app, flags
+from PIL import Image
+
+from common import save_results
+from bds.reader import BdsDataset
+from bds.encoding import decode_depth
+
+flags.DEFINE_integer('num_views', 400, 'number of synthetic views')
+flags.DEFINE_integer('resolution', 800, 'width and height of the synthetic views')
+flags.DEFINE_integer('num_threads', 8, 'number of reader threads')
+flags.DEFINE_integer('cache_mb', 8192, 'size of the reader cache in MiB')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+DEPTH_MIN, DEPTH_MAX = 2., 6.
+
+def write_views(root, rng):
+    # 8-bit RGBA color and 16-bit depth, smooth content so that the PNGs
+    # compress like renders do
+    res = FLAGS.resolution
+    y, x = np.mgrid[:res, :res] / res
+    frames = []
+    for idx in range(FLAGS.num_views):
+        view_dir = os.path.join(root, 'train', f'r_{idx}')
+        os.makedirs(view_dir)
+        phase = rng.uniform(0, 2 * np.pi, size=4)
+        color = np.stack([np.sin(8 * x + phase[c]) * np.cos(6 * y + phase[c]) for c in range(4)], axis=-1)
+        Image.fromarray(((color * 0.5 + 0.5) * 255).astype(np.uint8), 'RGBA').save(os.path.join(view_dir, 'color.png'))
+        depth = (np.sin(4 * x + phase[0]) * 0.5 + 0.5) * 65535
+        Image.fromarray(depth.astype(np.uint16)).save(os.path.join(view_dir, 'depth.png'))
+        frames.append({'file_path': f'./train/r_{idx}', 'transform_matrix': np.eye(4).tolist()})
+    with open(os.path.join(root, 'transforms_train.json'), 'w') as f:
+        json.dump({'camera_angle_x': 0.69, 'frames': frames}, f, indent=4)
+
+def load_naive(root, order):
+    # the loop of a typical training script
+    with open(os.path.join(root, 'transforms_train.json'), 'r') as f:
+        frames = json.load(f)['frames']
+    total = 0.
+    for idx in order:
+        view_dir = os.path.join(root, frames[idx]['file_path'])
+        color = np.array(Image.open(os.path.join(view_dir, 'color.png'))).astype(np.float32) / 255.
+        depth = np.array(Image.open(os.path.join(view_dir, 'depth.png'))).astype(np.float32) / 65535.
+        depth = decode_depth(depth, 'png', DEPTH_MIN, DEPTH_MAX)
+        total += color[0, 0, 0] + depth[0, 0]
+    return total
+
+def load_dataset(dataset, shuffle):
+    total = 0.
+    for _, view in dataset.iterate(shuffle=shuffle):
+        total += view['color'][0, 0, 0] + view['depth'][0, 0]
+    return total
+
+def main(_):
+    rng = np.random.default_rng(0)
+    results = []
+
+    def timed(loader, epoch, run):
+        start = time.perf_counter()
+        value = run()
+        seconds = time.perf_counter() - start
+        results.append({'loader': loader, 'epoch': epoch, 'seconds': seconds, 'views_per_second': FLAGS.num_views / seconds})
+        return value
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_views(tmp_dir, rng)
+        order = rng.permutation(FLAGS.num_views)
+        # the files are in the page cache for every run
+        expected = timed('naive PIL', 'sequential', lambda: load_naive(tmp_dir, range(FLAGS.num_views)))
+        timed('naive PIL', 'shuffled', lambda: load_naive(tmp_dir, order))
+        for shuffle in [False, True]:
+            dataset = BdsDataset(tmp_dir, 'train', names=['color', 'depth'], depth_min=DEPTH_MIN, depth_max=DEPTH_MAX,
+                                 cache_bytes=FLAGS.cache_mb * 2 ** 20, num_threads=FLAGS.num_threads)
+            name = 'shuffled' if shuffle else 'sequential'
+            value = timed('BdsDataset', f'{name}, cold', lambda: load_dataset(dataset, shuffle))
+            assert np.isclose(value, expected, rtol=1e-4)
+            timed('BdsDataset', f'{name}, cached', lambda: load_dataset(dataset, shuffle))
+            results[-1]['hit_rate'] = dataset.cache.hits / max(dataset.cache.hits + dataset.cache.misses, 1)
+            dataset.close()
+
+    print(f'{"loader":<12} {"epoch":<20} {"seconds":>9} {"views/s":>9}')
+    for r in results:
+        print(f'{r["loader"]:<12} {r["epoch"]:<20} {r["seconds"]:>9.3f} {r["views_per_second"]:>9.1f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,76 @@
+# Runtime and peak memory of the scene bounds used by bds-to-idr.py on a
+# procedurally generated dense mesh: per-vertex mathutils products as the
+# script used to do it, bulk NumPy extraction, and the exact bounding sphere
+
+import sys
+import multiprocessing
+import time
+from absl import app, flags
+
+from common import save_results
+
+flags.DEFINE_list('subdivisions', ['6', '8', '9'], 'subdivision levels of the generated ico sphere')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def peak_rss_kb():
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+def build_scene(subdivisions):
+    import bpy
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=subdivisions, radius=1.0, location=(0.3, -0.2, 0.5))
+    obj = bpy.context.active_object
+    # a displaced, rotated surface so that the bounding box sphere is loose
+    obj.scale = (1.0, 0.6, 0.3)
+    obj.rotation_euler = (0.4, 0.2, 0.7)
+    bpy.context.view_layer.update()
+    return len(obj.data.vertices)
+
+def measure(method, subdivisions):
+    # runs in a fresh process so that the peak RSS belongs to this method only
+    import bpy
+    import numpy as np
+    from bds.bounds import scene_points, aabb_sphere, min_enclosing_sphere
+    num_vertices = build_scene(subdivisions)
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    if method == 'legacy':
+        points = []
+        for obj in bpy.context.scene.objects:
+            if obj.type == 'MESH':
+                points.extend([obj.matrix_world @ vertex.co for vertex in obj.data.vertices])
+        _, radius, _ = aabb_sphere(np.array(points))
+    else:
+        points = scene_points(bpy.context.evaluated_depsgraph_get())
+        if method == 'bulk':
+            _, radius, _ = aabb_sphere(points)
+        else:
+            _, radius = min_enclosing_sphere(points)
+    seconds = time.perf_counter() - start
+    return {'method': method, 'vertices': num_vertices, 'seconds': seconds, 'radius': radius,
+            'peak_rss_mb': (peak_rss_kb() - rss_before) / 1024.}
+
+def main(_):
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for subdivisions in map(int, FLAGS.subdivisions):
+        for method in ['legacy', 'bulk', 'exact']:
+            with ctx.Pool(1) as pool:
+                results.append(pool.apply(measure, (method, subdivisions)))
+
+    print(f'{"vertices":>9} {"method":<7} {"seconds":>9} {"RSS MB":>8} {"radius":>8}')
+    for r in results:
+        print(f'{r["vertices"]:>9} {r["method"]:<7} {r["seconds"]:>9.3f} {r["peak_rss_mb"]:>8.1f} {r["radius"]:>8.4f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,84 @@
+# Random-access read throughput of the directory-per-view layout and the packed shard layout
+
+import os, sys
+import tempfile
+import time
+import numpy as np
+from absl import app, flags
+
+from common import save_results
+from bds.camera import CameraSet, PathTable
+from bds.shards import ShardReader, pack_split
+
+flags.DEFINE_integer('num_views', 20000, 'number of synthetic views')
+flags.DEFINE_list('passes', ['color', 'depth'], 'outputs of every view')
+flags.DEFINE_integer('output_kb', 64, 'size of each output file in KiB')
+flags.DEFINE_integer('shard_size_mb', 1024, 'maximum size of a shard file in MiB')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def read_files(root, camera_set, order):
+    total = 0
+    for idx in order:
+        view_dir = os.path.join(root, camera_set.file_paths[idx])
+        for name in FLAGS.passes:
+            with open(os.path.join(view_dir, f'{name}.png'), 'rb') as f:
+                total += len(f.read())
+    return total
+
+def read_shards(root, split, order):
+    reader = ShardReader(root, split)
+    total = 0
+    for idx in order:
+        for name in FLAGS.passes:
+            total += len(reader.read(idx, name))
+    reader.close()
+    return total
+
+def main(_):
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files_root, shards_root = os.path.join(tmp_dir, 'files'), os.path.join(tmp_dir, 'shards')
+        camera_set = CameraSet(0.69, np.tile(np.eye(4, dtype=np.float32), [FLAGS.num_views, 1, 1]),
+                               PathTable.from_strings([f'./train/r_{i}' for i in range(FLAGS.num_views)]))
+        # synthetic outputs, the same bytes in both layouts
+        payload = rng.bytes(FLAGS.output_kb * 1024)
+        for root in [files_root, shards_root]:
+            for file_path in camera_set.file_paths:
+                view_dir = os.path.join(root, file_path)
+                os.makedirs(view_dir)
+                for name in FLAGS.passes:
+                    with open(os.path.join(view_dir, f'{name}.png'), 'wb') as f:
+                        f.write(payload)
+        pack_split(shards_root, 'train', camera_set, FLAGS.shard_size_mb * 2 ** 20, remove=True)
+
+        # listing the dataset
+        start = time.perf_counter()
+        num_dirs = len(os.listdir(os.path.join(files_root, 'train')))
+        results.append({'layout': 'files', 'op': 'list', 'seconds': time.perf_counter() - start, 'items': num_dirs})
+        start = time.perf_counter()
+        num_views = len(ShardReader(shards_root, 'train'))
+        results.append({'layout': 'shards', 'op': 'list', 'seconds': time.perf_counter() - start, 'items': num_views})
+
+        for access, order in [('sequential', np.arange(FLAGS.num_views)), ('shuffled', rng.permutation(FLAGS.num_views))]:
+            start = time.perf_counter()
+            total = read_files(files_root, camera_set, order)
+            results.append({'layout': 'files', 'op': access, 'seconds': time.perf_counter() - start, 'bytes': total})
+            start = time.perf_counter()
+            total = read_shards(shards_root, 'train', order)
+            results.append({'layout': 'shards', 'op': access, 'seconds': time.perf_counter() - start, 'bytes': total})
+
+    print(f'{"layout":<7} {"op":<11} {"seconds":>9} {"views/s":>10} {"MiB/s":>9}')
+    for r in results:
+        views_per_s = (r['items'] if r['op'] == 'list' else FLAGS.num_views) / r['seconds']
+        mib_per_s = r.get('bytes', 0) / 2 ** 20 / r['seconds']
+        print(f'{r["layout"]:<7} {r["op"]:<11} {r["seconds"]:>9.3f} {views_per_s:>10.0f} {mib_per_s:>9.0f}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
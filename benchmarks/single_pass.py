@@ -0,0 +1,40 @@
+# Compare the two-pass and the single-pass render paths of render.py
+
+import os, sys
+import logging
+import tempfile
+from absl import app, flags
+
+from common import REPO_ROOT, subset_cameras, run_render, save_results
+
+flags.DEFINE_string('config', os.path.join(REPO_ROOT, 'configs', 'lego.txt'), 'render.py flagfile to benchmark')
+flags.DEFINE_string('cam_dir', os.path.join(REPO_ROOT, 'cameras'), 'directory containing camera JSON files')
+flags.DEFINE_integer('num_frames', 10, 'number of frames rendered from each split')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def main(_):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cam_dir = os.path.join(tmp_dir, 'cameras')
+        num_views = subset_cameras(FLAGS.cam_dir, cam_dir, FLAGS.num_frames)
+        for name, extra_args in [('two-pass', []), ('single-pass', ['--single_pass'])]:
+            output_dir = os.path.join(tmp_dir, name)
+            seconds = run_render([f'--flagfile={FLAGS.config}', f'--cam_dir={cam_dir}',
+                                  f'--output_dir={output_dir}'] + extra_args)
+            results.append({'mode': name, 'views': num_views, 'seconds': seconds,
+                            'seconds_per_view': seconds / num_views})
+            logging.info(f'{name}: {seconds:.2f}s, {seconds / num_views:.3f}s/view')
+
+    print(f'{"mode":<12} {"views":>6} {"seconds":>10} {"s/view":>8}')
+    for r in results:
+        print(f'{r["mode"]:<12} {r["views"]:>6} {r["seconds"]:>10.2f} {r["seconds_per_view"]:>8.3f}')
+    print(f'speedup: {results[0]["seconds"] / results[1]["seconds"]:.2f}x')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
@@ -0,0 +1,44 @@
+# Measure render throughput of render.py for different --num_workers
+
+import os, sys
+import logging
+import tempfile
+from absl import app, flags
+
+from common import REPO_ROOT, subset_cameras, run_render, save_results
+
+flags.DEFINE_string('config', os.path.join(REPO_ROOT, 'configs', 'lego.txt'), 'render.py flagfile to benchmark')
+flags.DEFINE_string('cam_dir', os.path.join(REPO_ROOT, 'cameras'), 'directory containing camera JSON files')
+flags.DEFINE_integer('num_frames', 16, 'number of frames rendered from each split')
+flags.DEFINE_list('worker_counts', ['1', '2', '4', '8'], 'worker counts to benchmark')
+flags.DEFINE_string('results', '', 'optional path of a JSON file to store the results')
+
+FLAGS = flags.FLAGS
+
+def main(_):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cam_dir = os.path.join(tmp_dir, 'cameras')
+        num_views = subset_cameras(FLAGS.cam_dir, cam_dir, FLAGS.num_frames)
+        for num_workers in map(int, FLAGS.worker_counts):
+            output_dir = os.path.join(tmp_dir, f'workers_{num_workers}')
+            seconds = run_render([f'--flagfile={FLAGS.config}', f'--cam_dir={cam_dir}',
+                                  f'--output_dir={output_dir}', f'--num_workers={num_workers}'])
+            results.append({'num_workers': num_workers, 'views': num_views, 'seconds': seconds,
+                            'fps': num_views / seconds})
+            logging.info(f'{num_workers} workers: {num_views / seconds:.3f} frames/s')
+
+    # scaling efficiency relative to the smallest worker count
+    base = results[0]
+    for r in results:
+        r['efficiency'] = (r['fps'] / base['fps']) / (r['num_workers'] / base['num_workers'])
+    print(f'{"workers":>8} {"views":>6} {"seconds":>10} {"frames/s":>9} {"efficiency":>11}')
+    for r in results:
+        print(f'{r["num_workers"]:>8} {r["views"]:>6} {r["seconds"]:>10.2f} {r["fps"]:>9.3f} {r["efficiency"]:>11.1%}')
+    if FLAGS.results:
+        save_results(FLAGS.results, results)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
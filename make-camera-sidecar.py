@@ -0,0 +1,26 @@
+# Write the binary sidecar transforms_<split>.npz next to every camera JSON,
+# render.py and the converters load the sidecar instead of parsing the JSON
+
+import os, sys
+import logging
+from absl import app, flags
+
+from bds.camera import split_names, load_camera_json, camera_json_path, camera_sidecar_path, write_camera_sidecar
+
+flags.DEFINE_string('cam_dir', '', 'directory containing camera JSON files')
+
+FLAGS = flags.FLAGS
+
+def main(_):
+    for split in split_names(FLAGS.cam_dir):
+        json_file = camera_json_path(FLAGS.cam_dir, split)
+        if not os.path.exists(json_file):
+            continue
+        camera_set = load_camera_json(json_file)
+        write_camera_sidecar(camera_sidecar_path(FLAGS.cam_dir, split), camera_set)
+        logging.info(f'Split "{split}": {len(camera_set)} cameras written to {camera_sidecar_path(FLAGS.cam_dir, split)}')
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)
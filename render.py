@@ -1,13 +1,55 @@
 
 import sys, os, shutil
+import tempfile
 import numpy as np
 import logging
 import bpy
+import mathutils
 from absl import app, flags
-import json
 import math
+import json
 from tqdm import tqdm
-import re
+import time
+import queue
+import multiprocessing
+import subprocess
+
+from bds.camera import split_names, load_camera_set, camera_json_path, camera_sidecar_path, annotate_camera_json
+from bds.manifest import Manifest, output_key, output_digest
+from bds.shards import ShardReader, is_packed, pack_split
+from bds.timing import FrameTimes
+from bds.profiling import Profiler, SAMPLE_PATTERN
+from bds.pyramid import level_dir, build_pyramid, write_level_cameras, level_intrinsics
+from bds.bpy_image import load_image, save_image
+from bds.files import is_up_to_date
+from bds.pipeline import Pipeline, STREAM_TARGETS, nerf_dir, idr_dir
+from bds.idr import intrinsic_matrix, world_matrices, scale_matrix, save_cameras
+from bds.bounds import scene_sphere
+from bds.scene_meta import load_scene_meta, write_scene_meta, sphere_meta, meta_sphere
+from bds.jobqueue import JobQueue, worker_name
+
+# encodings of the outputs
+OUTPUT_PROFILES = {
+    # the encodings render.py always used: four channel 16-bit png and
+    # 32-bit exr maps
+    'full': {'exr_depth': '32', 'depth_exr_depth': '32', 'exr_codec': 'ZIP', 'png_compression': 15,
+             'alpha_bw': False, 'alpha_png_depth': '16', 'depth_bw': False},
+    # single channel 8-bit masks and depth maps, half float color and normals,
+    # depth keeps full float precision
+    'compact': {'exr_depth': '16', 'depth_exr_depth': '32', 'exr_codec': 'ZIP', 'png_compression': 15,
+                'alpha_bw': True, 'alpha_png_depth': '8', 'depth_bw': True},
+    # as compact with 16-bit masks
+    'compact16': {'exr_depth': '16', 'depth_exr_depth': '32', 'exr_codec': 'ZIP', 'png_compression': 15,
+                  'alpha_bw': True, 'alpha_png_depth': '16', 'depth_bw': True},
+}
+# job queue workers render into <output_dir>/.jobs/<worker> before renaming
+JOB_STAGING_DIR = '.jobs'
+JOB_POLL_SECONDS = 1.
+# exit code of an injected worker crash
+JOB_CRASH_CODE = 3
+# candidates tried by --autotune_frames
+AUTOTUNE_TILE_SIZES = [64, 256, 1024]
+AUTOTUNE_SPATIAL_SPLITS = [False, True]
 
 flags.DEFINE_string('scene_path', '', 'path to the Blender scene')
 flags.DEFINE_string('cam_dir', '', 'directory containing camera JSON files')
@@ -24,79 +66,927 @@ flags.DEFINE_string('depth_format', 'nil', 'output format for depth map(exr, png
 flags.DEFINE_float('depth_min', 2.0, 'minimum depth used in png format depth map')
 flags.DEFINE_float('depth_max', 6.0, 'maximum depth used in png format depth map')
 flags.DEFINE_string('normal_format', 'nil', 'output format for normal map(exr, png, nil)')
+flags.DEFINE_string('output_backend', 'files', 'layout of the outputs, a directory per view or packed '
+                                               'shards described in bds/shards.py(files, shards)')
+flags.DEFINE_integer('shard_size_mb', 1024, 'maximum size of a shard file in MiB')
+flags.DEFINE_string('output_profile', 'full', 'encoding of the output files, see OUTPUT_PROFILES(full, compact, '
+                                             'compact16)')
+flags.DEFINE_string('exr_codec', '', 'EXR compression overriding the output profile(NONE, ZIP, PIZ, DWAA, ...)')
+flags.DEFINE_integer('png_compression', -1, 'PNG compression level in percent overriding the output profile')
+flags.DEFINE_list('stream', [], 'export finished views while the next ones render, into <output_dir>_blender '
+                                '(nerf) and <output_dir>_idr (idr) as bds-to-b.py and bds-to-idr.py would')
+flags.DEFINE_integer('stream_consumers', 2, 'number of processes exporting streamed views')
+flags.DEFINE_integer('stream_queue', 64, 'maximum number of views waiting for export, rendering waits '
+                                         'when the queue is full')
+flags.DEFINE_integer('pyramid_levels', 0, 'number of half resolution levels derived from the full resolution '
+                                          'outputs, level k is written to <output_dir>/level_<k>')
+# render control
+flags.DEFINE_bool('exact_sphere', False, 'store the minimum enclosing sphere of the scene vertices in scene.json '
+                                         'instead of the sphere around their bounding box')
+flags.DEFINE_float('sphere_margin', 1.01, 'radius scale of the exact bounding sphere')
+flags.DEFINE_bool('single_pass', False, 'render all outputs in one pass, compositing the rgb image over '
+                                        'the world background instead of rendering it twice')
+flags.DEFINE_bool('incremental', False, 'keep the output directory and only render outputs that are missing '
+                                        'or were rendered with different cameras or output flags')
+flags.DEFINE_integer('num_workers', 0, 'number of render processes sharing the CPU cores, '
+                                       '0 renders in the current process')
+flags.DEFINE_string('job_queue', '', 'path of a SQLite job queue, the coordinator leases chunks of views to render '
+                                     'workers on this and other nodes, see bds/jobqueue.py')
+flags.DEFINE_string('job_role', 'coordinator', 'role of this process in the job queue(coordinator, worker)')
+flags.DEFINE_integer('job_chunk_size', 8, 'number of views of a split leased at once')
+flags.DEFINE_float('job_lease_seconds', 600., 'lease time of a chunk, renewed while rendering and after every '
+                                              'view')
+flags.DEFINE_integer('job_max_attempts', 3, 'number of leases of a chunk before it is given up')
+flags.DEFINE_integer('job_local_workers', 0, 'number of workers started, and restarted after crashes, by the '
+                                             'coordinator on its own node')
+flags.DEFINE_float('job_crash_rate', 0., 'probability of a worker exiting after rendering a view before committing '
+                                         'it, to test the recovery of the job queue')
+flags.DEFINE_bool('batched', False, 'render each split as one animation with a camera keyframe per view')
+# geometry pass
+flags.DEFINE_bool('fast_geometry', False, 'render alpha, depth and normal maps with their own cheap sampling '
+                                          'settings instead of the quality settings of the rgb pass')
+flags.DEFINE_integer('geometry_samples', 1, 'number of samples of the fast geometry pass')
+flags.DEFINE_string('geometry_engine', 'cycles', 'render engine of the fast geometry pass(cycles, eevee)')
+# sampling budget of the rgb render, 0 keeps the setting of the scene
+flags.DEFINE_float('noise_threshold', 0., 'adaptive sampling noise threshold, pixels stop sampling below it')
+flags.DEFINE_integer('min_samples', 0, 'minimum number of samples before adaptive sampling stops a pixel')
+flags.DEFINE_integer('max_samples', 0, 'maximum number of samples per pixel')
+flags.DEFINE_float('time_limit', 0., 'render time budget of a view in seconds, sampling stops when it is spent')
+# device and performance
+flags.DEFINE_string('device', 'gpu', 'cycles render device, gpu falls back to the CPU without a GPU(gpu, cpu)')
+flags.DEFINE_integer('cpu_threads', 0, 'number of CPU render threads, 0 uses all cores')
+flags.DEFINE_integer('tile_size', 0, 'cycles tile size in pixels, 0 keeps the scene setting')
+flags.DEFINE_bool('spatial_splits', False, 'build the BVH with spatial splits, slower to build and '
+                                           'faster to trace, final renders always use a static BVH')
+flags.DEFINE_bool('persistent_data', False, 'keep the synchronized scene, BVH, images and shaders between '
+                                            'renders, so they are built once per split instead of once per view')
+flags.DEFINE_integer('autotune_frames', 0, 'render this many views of the first split with each tile size and '
+                                           'spatial split setting and keep the fastest, 0 disables tuning')
+flags.DEFINE_string('frame_log', '', 'optional path of a JSONL file receiving the render time of every view')
+flags.DEFINE_string('profile', '', 'optional directory receiving per-frame phase timings as JSONL and as a Chrome '
+                                   'trace, a summary is logged after each split')
+
+flags.register_multi_flags_validator(['batched', 'num_workers'],
+                                     lambda f: not (f['batched'] and f['num_workers'] > 0),
+                                     message='--batched renders in the current process, it can not be used '
+                                             'with --num_workers')
+flags.register_multi_flags_validator(['fast_geometry', 'single_pass'],
+                                     lambda f: not (f['fast_geometry'] and f['single_pass']),
+                                     message='--fast_geometry requires a separate geometry pass, it can not be '
+                                             'used with --single_pass')
+flags.register_validator('output_backend', lambda v: v in ['files', 'shards'],
+                         message='--output_backend must be files or shards')
+flags.register_validator('geometry_engine', lambda v: v in ['cycles', 'eevee'],
+                         message='--geometry_engine must be cycles or eevee')
+flags.register_multi_flags_validator(['min_samples', 'max_samples'],
+                                     lambda f: f['max_samples'] == 0 or f['min_samples'] <= f['max_samples'],
+                                     message='--min_samples must not exceed --max_samples')
+flags.register_multi_flags_validator(['pyramid_levels', 'resx', 'resy'],
+                                     lambda f: f['pyramid_levels'] >= 0 and
+                                               f['resx'] % 2 ** f['pyramid_levels'] == 0 and
+                                               f['resy'] % 2 ** f['pyramid_levels'] == 0,
+                                     message='--resx and --resy must be divisible by 2^--pyramid_levels')
+flags.register_validator('output_profile', lambda v: v in OUTPUT_PROFILES,
+                         message=f'--output_profile must be one of {list(OUTPUT_PROFILES)}')
+flags.register_validator('exr_codec', lambda v: v in ['', 'NONE', 'PXR24', 'ZIP', 'PIZ', 'RLE', 'ZIPS', 'B44', 'B44A',
+                                                      'DWAA', 'DWAB'],
+                         message='--exr_codec must be a Blender EXR codec')
+flags.register_validator('png_compression', lambda v: -1 <= v <= 100,
+                         message='--png_compression must be -1 or in [0, 100]')
+flags.register_validator('stream', lambda v: all(target in STREAM_TARGETS for target in v),
+                         message=f'--stream targets must be in {STREAM_TARGETS}')
+flags.register_validator('job_role', lambda v: v in ['coordinator', 'worker'],
+                         message='--job_role must be coordinator or worker')
+flags.register_multi_flags_validator(['job_queue', 'num_workers', 'batched', 'autotune_frames'],
+                                     lambda f: not f['job_queue'] or not (f['num_workers'] > 0 or f['batched']
+                                                                          or f['autotune_frames'] > 0),
+                                     message='--job_queue can not be used with --num_workers, --batched or '
+                                             '--autotune_frames')
+flags.register_validator('device', lambda v: v in ['gpu', 'cpu'], message='--device must be gpu or cpu')
+flags.register_multi_flags_validator(['autotune_frames', 'num_workers'],
+                                     lambda f: not (f['autotune_frames'] > 0 and f['num_workers'] > 0),
+                                     message='--autotune_frames tunes the current process, it can not be used '
+                                             'with --num_workers')
 
 
 FLAGS = flags.FLAGS
 
-def set_node_output_format(node, flag):
+def is_bw(name):
+    # single channel masks and depth maps
+    profile = OUTPUT_PROFILES[FLAGS.output_profile]
+    return (name == 'alpha' and profile['alpha_bw']) or (name == 'depth' and profile['depth_bw'])
+
+def output_format(name, flag):
+    # image format settings of an output under the output profile
     assert flag in ['exr', 'png']
+    profile = OUTPUT_PROFILES[FLAGS.output_profile]
+    if name == 'color':
+        color_mode = 'RGBA' if FLAGS.rgba else 'RGB'
+    else:
+        color_mode = 'BW' if is_bw(name) else 'RGBA'
     if flag == 'exr':
-        node.format.file_format = 'OPEN_EXR'
-        node.format.color_depth = '32'
-    elif flag == 'png':
-        node.format.file_format = 'PNG'
-        node.format.color_depth = '16'
+        return {'file_format': 'OPEN_EXR', 'color_mode': color_mode,
+                'color_depth': profile['depth_exr_depth'] if name == 'depth' else profile['exr_depth'],
+                'exr_codec': FLAGS.exr_codec or profile['exr_codec']}
+    return {'file_format': 'PNG', 'color_mode': color_mode,
+            'color_depth': profile['alpha_png_depth'] if name == 'alpha' else '16',
+            'compression': FLAGS.png_compression if FLAGS.png_compression >= 0 else profile['png_compression']}
+
+def set_node_output_format(node, name, flag):
+    for k, v in output_format(name, flag).items():
+        setattr(node.format, k, v)
+
+def add_rgb_output(node_tree, render_layers, view_layer, over_background=False):
+    outnode = node_tree.nodes.new("CompositorNodeOutputFile")
+    outnode.label = 'RGB Output'
+    outnode.name = 'RGB Output'
+
+    set_node_output_format(outnode, 'color', FLAGS.rgb_format)
+
+    render_layers.outputs['Image'].enabled = True
+    if over_background:
+        # the film is transparent, put the image over the environment pass
+        # which holds the world background seen by camera rays
+        view_layer.use_pass_environment = True
+        render_layers.outputs['Env'].enabled = True
+        alpha_over = node_tree.nodes.new("CompositorNodeAlphaOver")
+        node_tree.links.new(render_layers.outputs['Env'], alpha_over.inputs[1])
+        node_tree.links.new(render_layers.outputs['Image'], alpha_over.inputs[2])
+        node_tree.links.new(alpha_over.outputs[0], outnode.inputs[0])
+    else:
+        node_tree.links.new(render_layers.outputs['Image'], outnode.inputs[0])
+    logging.info(f'RGB{"A" if FLAGS.rgba else ""} {FLAGS.rgb_format} output enabled.')
+    return {'node': outnode, 'name': 'color', 'ext': FLAGS.rgb_format}
+
+def add_geometry_outputs(node_tree, render_layers, view_layer):
+    # alpha, depth and normal outputs, all of them require a transparent film
+    outnodes = []
+    # foreground mask
+    # alpha
+    if FLAGS.alpha_format != 'nil':
+        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
+        outnode.label = 'Alpha Output'
+        outnode.name = 'Alpha Output'
+
+        set_node_output_format(outnode, 'alpha', FLAGS.alpha_format)
+
+        render_layers.outputs['Alpha'].enabled = True
+        if is_bw('alpha'):
+            # the single channel is written as it is
+            node_tree.links.new(render_layers.outputs['Alpha'], outnode.inputs[0])
+        else:
+            rgb_compositor = node_tree.nodes.new("CompositorNodeCombineColor")
+            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[0])
+            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[1])
+            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[2])
+            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[3])
+            node_tree.links.new(rgb_compositor.outputs[0], outnode.inputs[0])
+        outnodes.append({'node': outnode, 'name': 'alpha', 'ext': FLAGS.alpha_format})
+        logging.info(f'Alpha {FLAGS.alpha_format} output enabled.')
+    
+    # depth
+    if FLAGS.depth_format != 'nil':
+        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
+        outnode.label = 'Depth Output'
+        outnode.name = 'Depth Output'
+
+        set_node_output_format(outnode, 'depth', FLAGS.depth_format)
+
+        view_layer.use_pass_z = True
+        render_layers.outputs['Depth'].enabled = True
+        if FLAGS.depth_format == 'exr' and is_bw('depth'):
+            node_tree.links.new(render_layers.outputs['Depth'], outnode.inputs[0])
+        elif FLAGS.depth_format == 'exr':
+            # directly connect depth output with file node input with alpha channel
+            rgb_compositor = node_tree.nodes.new("CompositorNodeCombineColor")
+            node_tree.links.new(render_layers.outputs['Depth'], rgb_compositor.inputs[0])
+            node_tree.links.new(render_layers.outputs['Depth'], rgb_compositor.inputs[1])
+            node_tree.links.new(render_layers.outputs['Depth'], rgb_compositor.inputs[2])
+            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[3])
+            node_tree.links.new(rgb_compositor.outputs[0], outnode.inputs[0])
+        elif FLAGS.depth_format == 'png':
+            # requires some compression
+            depth_map = node_tree.nodes.new(type="CompositorNodeMapRange")
+            depth_map.inputs['From Min'].default_value = FLAGS.depth_min
+            depth_map.inputs['From Max'].default_value = FLAGS.depth_max
+            depth_map.inputs['To Min'].default_value = 0
+            depth_map.inputs['To Max'].default_value = 1
+            node_tree.links.new(render_layers.outputs['Depth'], depth_map.inputs[0])
+            if is_bw('depth'):
+                node_tree.links.new(depth_map.outputs[0], outnode.inputs[0])
+            else:
+                rgb_compositor = node_tree.nodes.new("CompositorNodeCombineColor")
+                node_tree.links.new(depth_map.outputs[0], rgb_compositor.inputs[0])
+                node_tree.links.new(depth_map.outputs[0], rgb_compositor.inputs[1])
+                node_tree.links.new(depth_map.outputs[0], rgb_compositor.inputs[2])
+                node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[3])
+                node_tree.links.new(rgb_compositor.outputs[0], outnode.inputs[0])
+
+        outnodes.append({'node': outnode, 'name': 'depth', 'ext': FLAGS.depth_format})
+        logging.info(f'Depth {FLAGS.depth_format} output enabled.')
+    
+    # normal
+    if FLAGS.normal_format != 'nil':
+        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
+        outnode.label = 'Normal Output'
+        outnode.name = 'Normal Output'
+
+        set_node_output_format(outnode, 'normal', FLAGS.normal_format)
 
-def render_splits(splits, cam_intrinsics, cam_extrinstics, file_dirs, outnodes):
+        view_layer.use_pass_normal = True
+        render_layers.outputs['Normal'].enabled = True
+        if FLAGS.normal_format == 'exr':
+            node_tree.links.new(render_layers.outputs['Normal'], outnode.inputs[0])
+        else:
+            # transform from [-1, 1] to [0, 1] on all channels for png
+            rgb_separator = node_tree.nodes.new("CompositorNodeSeparateColor")
+            muladds = [node_tree.nodes.new("CompositorNodeMath") for _ in range(3)]
+            rgb_combiner = node_tree.nodes.new("CompositorNodeCombineColor")
+            # connect normal output to rgb_seperator
+            node_tree.links.new(render_layers.outputs['Normal'], rgb_separator.inputs[0])
+            # connect muladd units
+            for idx, m in enumerate(muladds):
+                m.operation = 'MULTIPLY_ADD'    # operation
+                m.inputs[1].default_value = 0.5 # scale factor
+                m.inputs[2].default_value = 0.5 # bias
+                node_tree.links.new(rgb_separator.outputs[idx], m.inputs[0])
+                node_tree.links.new(m.outputs[0], rgb_combiner.inputs[idx])
+            # add alpha channel to normal map
+            node_tree.links.new(render_layers.outputs['Alpha'],rgb_combiner.inputs[3])
+            # connect to the final output
+            node_tree.links.new(rgb_combiner.outputs[0], outnode.inputs[0])
+
+        outnodes.append({'node': outnode, 'name': 'normal', 'ext': FLAGS.normal_format})
+        logging.info(f'Normal {FLAGS.alpha_format} output enabled.')
+
+    return outnodes
+
+def find_camera():
+    # find camera in the scene
+    for obj in bpy.data.objects:
+        if obj.type == 'CAMERA':
+            return obj
+    # if no camera in the scene, create one
+    bpy.ops.object.camera_add()
+    return bpy.context.active_object
+
+def set_camera_intrinsics(camera, cam_intrinsic):
+    # set render resolution before setting camera params
+    bpy.context.scene.render.resolution_x = FLAGS.resx
+    bpy.context.scene.render.resolution_y = FLAGS.resy
+    # set camera intrinsics
+    for k, v in cam_intrinsic.items():
+        setattr(camera.data, k, v)
+
+def render_view(camera, c2w, file_dir, outnodes):
+    # set camera extrinstic
+    # blender requires transposed c2w if using numpy matrix as input
+    camera.matrix_world = c2w.T
+    # set output file slot
+    for outnode in outnodes:
+        outnode['node'].base_path = os.path.abspath(FLAGS.output_dir)
+        outnode['node'].file_slots[0].path = os.path.join(file_dir, f'{outnode["name"]}')
+    bpy.ops.render.render(write_still=True)
+
+def select_outputs(outnodes, names):
+    # mute the outputs of a pass that are already rendered
+    selected = []
+    for outnode in outnodes:
+        outnode['node'].mute = outnode['name'] not in names
+        if outnode['name'] in names:
+            selected.append(outnode)
+    return selected
+
+def finalize_view(file_dir, outnodes):
+    # blender appends the frame number to the file output paths, remove it
+    frame = bpy.context.scene.frame_current
+    view_dir = os.path.join(FLAGS.output_dir, file_dir)
+    for outnode in outnodes:
+        os.replace(os.path.join(view_dir, f'{outnode["name"]}{frame:04d}.{outnode["ext"]}'),
+                   os.path.join(view_dir, f'{outnode["name"]}.{outnode["ext"]}'))
+
+def output_settings():
+    # flags changing the content of each output file
+    settings = {}
+    if FLAGS.rgb_format != 'nil':
+        settings['color'] = {'format': FLAGS.rgb_format, 'rgba': FLAGS.rgba,
+                             'film_transparent': FLAGS.film_transparent}
+        if sampling_settings():
+            settings['color']['sampling'] = sampling_settings()['cycles']
+    if FLAGS.alpha_format != 'nil':
+        settings['alpha'] = {'format': FLAGS.alpha_format}
+    if FLAGS.depth_format != 'nil':
+        settings['depth'] = {'format': FLAGS.depth_format}
+        if FLAGS.depth_format == 'png':
+            settings['depth'].update(depth_min=FLAGS.depth_min, depth_max=FLAGS.depth_max)
+    if FLAGS.normal_format != 'nil':
+        settings['normal'] = {'format': FLAGS.normal_format}
+    if FLAGS.single_pass and sampling_settings():
+        # the geometry maps come from the budgeted render as well
+        for name in ['alpha', 'depth', 'normal']:
+            if name in settings:
+                settings[name]['sampling'] = sampling_settings()['cycles']
+    if FLAGS.output_profile != 'full' or FLAGS.exr_codec or FLAGS.png_compression >= 0:
+        for name in settings:
+            settings[name]['encoding'] = output_format(name, settings[name]['format'])
+    if FLAGS.fast_geometry:
+        for name in ['alpha', 'depth', 'normal']:
+            if name in settings:
+                settings[name]['geometry'] = {'engine': FLAGS.geometry_engine, 'samples': FLAGS.geometry_samples}
+    return settings
+
+def output_digests(split, idx, cam_intrinsics, cam_extrinstics):
+    return {name: output_digest(cam_extrinstics[split][idx], cam_intrinsics[split], (FLAGS.resx, FLAGS.resy), settings)
+            for name, settings in output_settings().items()}
+
+def find_pending_outputs(splits, cam_intrinsics, cam_extrinstics, file_dirs, manifest):
+    # names of the outputs each view still needs
+    settings = output_settings()
+    pending = {}
+    for split in splits:
+        pending[split] = []
+        # outputs may already be packed into shards
+        shards = ShardReader(FLAGS.output_dir, split) if is_packed(FLAGS.output_dir, split) else None
+        for idx, file_dir in enumerate(file_dirs[split]):
+            digests = output_digests(split, idx, cam_intrinsics, cam_extrinstics)
+            names = set()
+            for name, digest in digests.items():
+                file_path = os.path.join(FLAGS.output_dir, file_dir, f'{name}.{settings[name]["format"]}')
+                exists = os.path.exists(file_path) or (shards is not None and len(shards) == len(file_dirs[split])
+                                                       and shards.has(idx, name))
+                if not manifest.is_done(output_key(split, file_dir, name), digest) or not exists:
+                    names.add(name)
+            pending[split].append(names)
+        if shards is not None:
+            shards.close()
+    return pending
+
+def record_outputs(manifest, split, idx, names, cam_intrinsics, cam_extrinstics, file_dirs, stats=None,
+                   pipeline=None):
+    # stats of the rgb render are kept with the color output
+    digests = output_digests(split, idx, cam_intrinsics, cam_extrinstics)
+    for name in names:
+        manifest.record(output_key(split, file_dirs[split][idx], name), digests[name],
+                        stats if name == 'color' else None)
+    # a view is exported once all of its outputs are written
+    if pipeline is not None:
+        pipeline.done(split, idx, file_dirs[split][idx], names)
+
+def write_render_stats(splits, file_dirs, manifest):
+    # achieved samples and render time of each rgb render in the output camera JSONs
+    for split in splits:
+        path = camera_json_path(FLAGS.output_dir, split)
+        values = {}
+        for file_dir in file_dirs[split]:
+            stats = manifest.info.get(output_key(split, file_dir, 'color'))
+            if stats is not None:
+                values[file_dir] = stats
+        if not values:
+            continue
+        if not os.path.exists(path):
+            logging.warning(f'Split "{split}" has no camera JSON, render stats are only kept in the manifest.')
+            continue
+        annotate_camera_json(path, values)
+        logging.info(f'Render stats of {len(values)} view{"s" if len(values) != 1 else ""} written to {path}.')
+
+def scene_bounds(previous=None):
+    # the sphere of the previous metadata is kept while the scene file is unchanged
+    scene_mtime = os.path.getmtime(FLAGS.scene_path)
+    if previous is not None and previous.get('scene_mtime') == scene_mtime and \
+            meta_sphere(previous, FLAGS.exact_sphere, FLAGS.sphere_margin) is not None:
+        return {'aabb': previous['aabb'], 'sphere': previous['sphere']}
+    # render workers leave the scene of the coordinator unloaded
+    if FLAGS.num_workers > 0 or not bpy.data.filepath:
+        bpy.ops.wm.open_mainfile(filepath=FLAGS.scene_path)
+    try:
+        center, radius, aabb = scene_sphere(bpy.context.scene, bpy.context.evaluated_depsgraph_get(),
+                                            FLAGS.exact_sphere, FLAGS.sphere_margin)
+    except ValueError as e:
+        # the renders are kept, only the bounds are missing
+        logging.warning(f'{e} scene.json is written without bounds.')
+        return {'aabb': None, 'sphere': None}
+    if aabb is None:
+        return sphere_meta(center, radius, aabb, 'object')
+    if FLAGS.exact_sphere:
+        return sphere_meta(center, radius, aabb, 'exact', FLAGS.sphere_margin)
+    return sphere_meta(center, radius, aabb, 'aabb')
+
+def scene_metadata(splits, cam_intrinsics, level=0):
+    # contents of scene.json, see bds/scene_meta.py
+    settings = output_settings()
+    for name in settings:
+        settings[name]['encoding'] = output_format(name, settings[name]['format'])
+    intrinsics = {}
+    for split in splits:
+        camera_angle_x = load_camera_set(FLAGS.output_dir, split).camera_angle_x
+        intrinsics[split] = {'camera_angle_x': camera_angle_x,
+                             **level_intrinsics(camera_angle_x, FLAGS.resx, FLAGS.resy, level),
+                             'clip_start': cam_intrinsics[split]['clip_start'],
+                             'clip_end': cam_intrinsics[split]['clip_end']}
+    return {'scene_path': os.path.abspath(FLAGS.scene_path), 'scene_mtime': os.path.getmtime(FLAGS.scene_path),
+            'resolution': [FLAGS.resx >> level, FLAGS.resy >> level], 'intrinsics': intrinsics, 'outputs': settings}
+
+def write_scene_metadata(splits, cam_intrinsics):
+    start = time.perf_counter()
+    meta = scene_metadata(splits, cam_intrinsics)
+    meta.update(scene_bounds(load_scene_meta(FLAGS.output_dir)))
+    write_scene_meta(FLAGS.output_dir, meta)
+    if meta['sphere'] is None:
+        logging.info(f'Scene metadata written in {time.perf_counter() - start:.2f}s.')
+    else:
+        logging.info(f'Scene metadata written in {time.perf_counter() - start:.2f}s, bounding sphere '
+                     f'c={meta["sphere"]["center"]}, r={meta["sphere"]["radius"]} ({meta["sphere"]["source"]}).')
+    return meta
+
+def write_pyramid(splits, cam_intrinsics, meta):
+    # lower resolution levels of every output newer than its level files
+    root = FLAGS.output_dir
+    levels = range(1, FLAGS.pyramid_levels + 1)
+    formats = {name: settings['format'] for name, settings in output_settings().items()}
+    for level in levels:
+        os.makedirs(level_dir(root, level), exist_ok=True)
+        write_scene_meta(level_dir(root, level), {**meta, **scene_metadata(splits, cam_intrinsics, level)})
+    for split in splits:
+        camera_set = load_camera_set(root, split)
+        # keep the per-frame render stats of the full resolution JSON
+        json_path = camera_json_path(root, split)
+        frames = None
+        if os.path.exists(json_path):
+            with open(json_path, 'r') as f:
+                frames = json.load(f)['frames']
+        for level in levels:
+            write_level_cameras(camera_json_path(level_dir(root, level), split), camera_set,
+                                FLAGS.resx, FLAGS.resy, level, frames)
+        written = 0
+        for file_dir in tqdm(camera_set.file_paths, f'Pyramid of split "{split}"', total=len(camera_set)):
+            for name, fmt in formats.items():
+                src = os.path.join(root, file_dir, f'{name}.{fmt}')
+                dsts = [os.path.join(level_dir(root, level), file_dir, f'{name}.{fmt}') for level in levels]
+                if not os.path.exists(src) or all(is_up_to_date(dst, [src]) for dst in dsts):
+                    continue
+                for dst, pixels in zip(dsts, build_pyramid(name, load_image(src), fmt, FLAGS.pyramid_levels)):
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    save_image(dst, pixels, output_format(name, fmt))
+                written += 1
+        logging.info(f'Split "{split}": {FLAGS.pyramid_levels} pyramid level{"s" if FLAGS.pyramid_levels > 1 else ""} '
+                     f'of {written} output{"s" if written != 1 else ""} written.')
+
+def finish_stream(pipeline, splits, file_dirs, pending, meta):
+    # views rendered by earlier runs follow the new ones
+    start = time.perf_counter()
+    for split in splits:
+        for idx, names in enumerate(pending[split]):
+            if not names:
+                pipeline.submit(split, idx, file_dirs[split][idx])
+    pipeline.close()
+    logging.info(f'Stream drained {time.perf_counter() - start:.2f}s after the last render.')
+    if 'nerf' in FLAGS.stream:
+        # camera JSONs with the render stats and their sidecars
+        for split in splits:
+            for path in [camera_json_path(FLAGS.output_dir, split), camera_sidecar_path(FLAGS.output_dir, split)]:
+                if os.path.exists(path):
+                    shutil.copy2(path, nerf_dir(FLAGS.output_dir))
+    if 'idr' in FLAGS.stream and meta['sphere'] is None:
+        logging.error(f'The scene has no bounds, {idr_dir(FLAGS.output_dir)}/cameras_sphere.npz is not written.')
+    elif 'idr' in FLAGS.stream:
+        sphere_center, sphere_radius = np.array(meta['sphere']['center']), meta['sphere']['radius']
+        world_mats = []
+        for split in splits:
+            camera_set = load_camera_set(FLAGS.output_dir, split)
+            world_mats.append(world_matrices(camera_set.transforms,
+                                             intrinsic_matrix(camera_set.camera_angle_x, FLAGS.resx, FLAGS.resy)))
+        save_cameras(os.path.join(idr_dir(FLAGS.output_dir), 'cameras_sphere.npz'), np.concatenate(world_mats, axis=0),
+                     scale_matrix(sphere_center, sphere_radius))
+
+def on_render_stats(stats):
+    # the last sample count reported by cycles is the achieved one
+    match = SAMPLE_PATTERN.search(stats)
+    if match:
+        render_samples[0] = int(match.group(1))
+
+# samples of the current render, updated by on_render_stats
+render_samples = [0]
+
+def add_profile_handlers(profiler):
+    # phase marks from the render handlers, see bds/profiling.py
+    bpy.app.handlers.render_pre.append(lambda *_: profiler.mark('sync'))
+    bpy.app.handlers.render_post.append(lambda *_: profiler.mark('finalize'))
+    bpy.app.handlers.render_stats.append(profiler.stats)
+
+def view_stats(render_pass, seconds):
+    # only the rgb render is budgeted
+    if render_pass['name'] not in ['rgb', 'all']:
+        return None
+    return {'samples': render_samples[0], 'render_time': round(seconds, 4)}
+
+def use_render_pass(render_pass, render_passes):
+    # only the output nodes of the current pass write files
+    for other_pass in render_passes:
+        for outnode in other_pass['outnodes']:
+            outnode['node'].mute = other_pass is not render_pass
+    bpy.context.scene.render.film_transparent = render_pass['film_transparent']
+    # engine and sampling settings of the pass
+    bpy.context.scene.render.engine = render_pass['engine']
+    for owner, values in render_pass['settings'].items():
+        for k, v in values.items():
+            setattr(getattr(bpy.context.scene, owner), k, v)
+
+def render_splits(splits, cam_intrinsics, cam_extrinstics, file_dirs, render_pass, pending, manifest, frame_times,
+                  profiler=None, pipeline=None):
+    outnodes = render_pass['outnodes']
+    names = {outnode['name'] for outnode in outnodes}
     for split in splits:
+        # views missing any output of this pass
+        indices = [idx for idx in range(len(file_dirs[split])) if names & pending[split][idx]]
+        if not indices:
+            logging.info(f'Split "{split}" is up to date.')
+            continue
         logging.info(f'Rendering split "{split}"...')
-        # find camera in the scene
-        camera = None
-        for obj in bpy.data.objects:
-            if obj.type == 'CAMERA':
-                camera = obj
-                break
-        # if no camera in the scene, create one
-        if camera is None:
-            bpy.ops.object.camera_add()
-            camera = bpy.context.active_object
-        # set render resolution before setting camera params
-        bpy.context.scene.render.resolution_x = FLAGS.resx
-        bpy.context.scene.render.resolution_y = FLAGS.resy
-        # set camera intrinsics
-        for k, v in cam_intrinsics[split].items():
-            setattr(camera.data, k, v)
+        camera = find_camera()
+        set_camera_intrinsics(camera, cam_intrinsics[split])
         logging.info(f'Camera intrinsics set: {cam_intrinsics[split]}')
 
+        if FLAGS.batched:
+            render_split_animation(camera, split, indices, cam_intrinsics, cam_extrinstics, file_dirs, render_pass,
+                                   pending, manifest, frame_times, profiler, pipeline)
+            continue
+
         # render samples
-        pbar = tqdm(range(len(file_dirs[split])))
+        pbar = tqdm(indices)
+        split_start = time.perf_counter()
 
         for idx in pbar:
             pbar.set_description(file_dirs[split][idx])
-            # set camera extrinstic
-            # blender requires transposed c2w if using numpy matrix as input
-            camera.matrix_world = cam_extrinstics[split][idx].T
-            # set output file slot
-            for outnode in outnodes:
-                outnode['node'].base_path = os.path.abspath(FLAGS.output_dir)
-                outnode['node'].file_slots[0].path = os.path.join(file_dirs[split][idx], f'{outnode["name"]}')
-            bpy.ops.render.render(write_still=True)
+            view_outnodes = select_outputs(outnodes, pending[split][idx])
+            if profiler is not None:
+                profiler.begin_frame(split, idx, render_pass['name'])
+            start = time.perf_counter()
+            render_samples[0] = 0
+            render_view(camera, cam_extrinstics[split][idx], file_dirs[split][idx], view_outnodes)
+            seconds = time.perf_counter() - start
+            finalize_view(file_dirs[split][idx], view_outnodes)
+            frame_times.record(split, idx, render_pass['name'], seconds)
+            record_outputs(manifest, split, idx, [outnode['name'] for outnode in view_outnodes],
+                           cam_intrinsics, cam_extrinstics, file_dirs, view_stats(render_pass, seconds), pipeline)
+            if profiler is not None:
+                profiler.end_frame()
+        if profiler is not None:
+            profiler.summarize(split, render_pass['name'], time.perf_counter() - split_start)
 
-def main(_):
-    # delete existing output directory
-    if os.path.exists(FLAGS.output_dir):
-        logging.warning(f'Output directory "{FLAGS.output_dir}" already exists, overwriting.')
-        shutil.rmtree(FLAGS.output_dir)
-    os.makedirs(FLAGS.output_dir)
-    
-    # load camera JSONs
-    splits = []
-    split_json_objs = {}
-    for split_json in os.listdir(FLAGS.cam_dir):
-        # the JSON file name starts with "transforms_" and has extension .json
-        if split_json.startswith('transforms_') and split_json.endswith('.json'):
-            # only get the split name part
-            split = split_json[len('transforms_'):-len('.json')]
-            splits.append(split)
-            # read json
-            json_path = os.path.join(FLAGS.cam_dir, split_json)
-            split_json_objs[split] = json.load(open(json_path, 'r'))
-            # copy camera JSONs to the output directory
-            shutil.copy(os.path.join(FLAGS.cam_dir, split_json), FLAGS.output_dir)
+def render_split_animation(camera, split, indices, cam_intrinsics, cam_extrinstics, file_dirs, render_pass,
+                           pending, manifest, frame_times, profiler=None, pipeline=None):
+    outnodes = render_pass['outnodes']
+    scene = bpy.context.scene
+    # frame f shows the view indices[f - 1]
+    scene.frame_start = 1
+    scene.frame_end = len(indices)
+    # the camera must not be sampled between keyframes
+    scene.render.use_motion_blur = False
+    # keep the synchronized scene and BVH between frames, the scene setting
+    # is restored after the split
+    persistent_data = scene.render.use_persistent_data
+    scene.render.use_persistent_data = True
+    # an animation render also writes every composited frame to the main
+    # output path, it goes to a directory removed after the split
+    filepath = scene.render.filepath
+    frame_dir = tempfile.mkdtemp(prefix='.frames_', dir=FLAGS.output_dir)
+    scene.render.filepath = os.path.join(frame_dir, '')
+
+    # write the camera poses as keyframes
+    camera.animation_data_clear()
+    camera.rotation_mode = 'QUATERNION'
+    channels = {'location': np.empty([len(indices), 3], dtype=np.float32),
+                'rotation_quaternion': np.empty([len(indices), 4], dtype=np.float32),
+                'scale': np.empty([len(indices), 3], dtype=np.float32)}
+    for frame, idx in enumerate(indices):
+        loc, rot, scale = mathutils.Matrix(cam_extrinstics[split][idx].tolist()).decompose()
+        channels['location'][frame] = loc
+        channels['rotation_quaternion'][frame] = rot
+        channels['scale'][frame] = scale
+    action = bpy.data.actions.new(f'bds_{split}')
+    camera.animation_data_create().action = action
+    frames = np.arange(1, len(indices) + 1, dtype=np.float32)
+    for data_path, values in channels.items():
+        for channel in range(values.shape[1]):
+            fcurve = action.fcurves.new(data_path, index=channel)
+            fcurve.keyframe_points.add(len(indices))
+            fcurve.keyframe_points.foreach_set('co', np.stack([frames, values[:, channel]], axis=1).ravel())
+            fcurve.update()
+
+    pbar = tqdm(total=len(indices))
+    split_start = time.perf_counter()
+    # a frame takes from the end of the previous one until its files are written
+    frame_start = [time.perf_counter()]
+
+    # output paths are set for each frame so files get their final names
+    def set_frame_outputs(scene, *_):
+        idx = indices[scene.frame_current - 1]
+        pbar.set_description(file_dirs[split][idx])
+        if profiler is not None:
+            profiler.begin_frame(split, idx, render_pass['name'])
+        for outnode in select_outputs(outnodes, pending[split][idx]):
+            outnode['node'].base_path = os.path.abspath(FLAGS.output_dir)
+            outnode['node'].file_slots[0].path = os.path.join(file_dirs[split][idx], f'{outnode["name"]}')
+
+    def finish_frame(scene, *_):
+        idx = indices[scene.frame_current - 1]
+        view_outnodes = [outnode for outnode in outnodes if outnode['name'] in pending[split][idx]]
+        seconds = time.perf_counter() - frame_start[0]
+        if profiler is not None:
+            profiler.mark('finalize')
+        finalize_view(file_dirs[split][idx], view_outnodes)
+        record_outputs(manifest, split, idx, [outnode['name'] for outnode in view_outnodes],
+                       cam_intrinsics, cam_extrinstics, file_dirs, view_stats(render_pass, seconds), pipeline)
+        frame_times.record(split, idx, render_pass['name'], seconds)
+        render_samples[0] = 0
+        if profiler is not None:
+            profiler.end_frame()
+        frame_start[0] = time.perf_counter()
+        pbar.update(1)
+
+    bpy.app.handlers.frame_change_pre.append(set_frame_outputs)
+    bpy.app.handlers.render_write.append(finish_frame)
+    try:
+        bpy.ops.render.render(animation=True)
+    finally:
+        bpy.app.handlers.frame_change_pre.remove(set_frame_outputs)
+        bpy.app.handlers.render_write.remove(finish_frame)
+        pbar.close()
+        camera.animation_data_clear()
+        bpy.data.actions.remove(action)
+        scene.render.use_persistent_data = persistent_data
+        scene.render.filepath = filepath
+        shutil.rmtree(frame_dir, ignore_errors=True)
+    if profiler is not None:
+        profiler.summarize(split, render_pass['name'], time.perf_counter() - split_start)
+
+def render_all_passes(camera, render_passes, split, idx, file_dir, c2w, names, profiler=None):
+    # all passes of a view are rendered by the same worker, returns the
+    # stats of the rgb render and the written file names
+    stats, files = None, []
+    for render_pass in render_passes:
+        use_render_pass(render_pass, render_passes)
+        view_outnodes = select_outputs(render_pass['outnodes'], names)
+        if view_outnodes:
+            if profiler is not None:
+                profiler.begin_frame(split, idx, render_pass['name'])
+            pass_start = time.perf_counter()
+            render_samples[0] = 0
+            render_view(camera, c2w, file_dir, view_outnodes)
+            stats = view_stats(render_pass, time.perf_counter() - pass_start) or stats
+            finalize_view(file_dir, view_outnodes)
+            files += [f'{outnode["name"]}.{outnode["ext"]}' for outnode in view_outnodes]
+            if profiler is not None:
+                profiler.end_frame()
+    return stats, files
+
+def render_worker(argv, worker_id, num_threads, cam_intrinsics, task_queue, result_queue):
+    # spawned processes do not inherit parsed flags
+    FLAGS(argv)
+    setup_scene(num_threads)
+    profiler = None
+    if FLAGS.profile:
+        # one log and trace per worker, the worker is the trace process
+        profiler = Profiler(FLAGS.profile, f'render_worker{worker_id}', pid=worker_id)
+        add_profile_handlers(profiler)
+    render_passes = setup_render_passes()
+    camera = find_camera()
+
+    current_split = None
+    while True:
+        task = task_queue.get()
+        if task is None:
+            if profiler is not None:
+                profiler.summarize_all()
+                profiler.close()
+            break
+        split, idx, file_dir, c2w, names = task
+        if split != current_split:
+            set_camera_intrinsics(camera, cam_intrinsics[split])
+            current_split = split
+        start = time.perf_counter()
+        stats, _ = render_all_passes(camera, render_passes, split, idx, file_dir, c2w, names, profiler)
+        result_queue.put((worker_id, split, idx, names, time.perf_counter() - start, stats))
+
+def render_parallel(splits, cam_intrinsics, cam_extrinstics, file_dirs, pending, manifest, frame_times,
+                    pipeline=None):
+    # a fresh interpreter for each worker, bpy can not be forked safely
+    ctx = multiprocessing.get_context('spawn')
+    task_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    # frames of all splits share one queue
+    num_views = 0
+    for split in splits:
+        for idx in range(len(file_dirs[split])):
+            if pending[split][idx]:
+                task_queue.put((split, idx, file_dirs[split][idx], np.array(cam_extrinstics[split][idx]),
+                                pending[split][idx]))
+                num_views += 1
+    for _ in range(FLAGS.num_workers):
+        task_queue.put(None)
+
+    # share the cores between workers
+    num_threads = max(1, (FLAGS.cpu_threads or os.cpu_count() or 1) // FLAGS.num_workers)
+    logging.info(f'Starting {FLAGS.num_workers} render workers with {num_threads} '
+                 f'thread{"s" if num_threads > 1 else ""} each...')
+    start = time.perf_counter()
+    workers = [ctx.Process(target=render_worker,
+                           args=(sys.argv, worker_id, num_threads, cam_intrinsics, task_queue, result_queue))
+               for worker_id in range(FLAGS.num_workers)]
+    for worker in workers:
+        worker.start()
+
+    # collect finished frames
+    worker_frames = [0] * FLAGS.num_workers
+    worker_seconds = [0.] * FLAGS.num_workers
+    pbar = tqdm(total=num_views)
+    while pbar.n < num_views:
+        try:
+            worker_id, split, idx, names, seconds, stats = result_queue.get(timeout=5)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                raise RuntimeError('All render workers exited before finishing the frames.')
+            continue
+        # only the coordinator writes the manifest
+        record_outputs(manifest, split, idx, names, cam_intrinsics, cam_extrinstics, file_dirs, stats, pipeline)
+        # workers render all passes of a view at once
+        frame_times.record(split, idx, 'all', seconds)
+        worker_frames[worker_id] += 1
+        worker_seconds[worker_id] += seconds
+        pbar.set_description(file_dirs[split][idx])
+        pbar.update(1)
+    pbar.close()
+    for worker in workers:
+        worker.join()
+    wall_time = time.perf_counter() - start
+
+    # throughput report
+    fps = num_views / wall_time
+    for worker_id in range(FLAGS.num_workers):
+        worker_fps = worker_frames[worker_id] / max(worker_seconds[worker_id], 1e-9)
+        logging.info(f'Worker {worker_id}: {worker_frames[worker_id]} frames, {worker_fps:.3f} frames/s '
+                     f'while busy, {worker_seconds[worker_id] / wall_time:.1%} utilization.')
+    # utilization against the workers' own busy frame rate, i.e. how much of
+    # the wall time is lost in startup, scene loading and load imbalance. The
+    # scaling over worker counts is measured by benchmarks/workers.py.
+    busy_fps = sum(worker_frames[i] / max(worker_seconds[i], 1e-9) for i in range(FLAGS.num_workers))
+    logging.info(f'{FLAGS.num_workers} workers: {fps:.3f} frames/s aggregate, '
+                 f'worker utilization {fps / busy_fps:.1%}.')
+
+def commit_staged(staged_dir, file_dir, files):
+    # renames within the output directory are atomic, the outputs of a view
+    # never appear partially written
+    src_dir, dst_dir = os.path.join(FLAGS.output_dir, staged_dir), os.path.join(FLAGS.output_dir, file_dir)
+    os.makedirs(dst_dir, exist_ok=True)
+    for file in files:
+        os.replace(os.path.join(src_dir, file), os.path.join(dst_dir, file))
+
+def job_worker():
+    # leases chunks until the coordinator finishes the queue, the manifest
+    # is only written by the coordinator
+    worker = worker_name()
+    job_queue = JobQueue(FLAGS.job_queue)
+    splits, cam_intrinsics, cam_extrinstics, file_dirs = load_cameras()
+    setup_scene()
+    profiler = None
+    if FLAGS.profile:
+        profiler = Profiler(FLAGS.profile, f'job_{worker}')
+        add_profile_handlers(profiler)
+    render_passes = setup_render_passes()
+    camera = find_camera()
+    staging = os.path.join(JOB_STAGING_DIR, worker)
+    rng = np.random.default_rng(os.getpid())
+    # the lease of the current chunk is renewed while a view renders, cycles
+    # reports render stats as the samples progress
+    lease_held = [None, 0.]
+    def renew_lease(*_):
+        if lease_held[0] is not None and time.time() - lease_held[1] > FLAGS.job_lease_seconds / 4:
+            lease_held[1] = time.time()
+            if not job_queue.heartbeat(worker, lease_held[0]):
+                lease_held[0] = None
+    bpy.app.handlers.render_stats.append(renew_lease)
+    logging.info(f'Job worker {worker} started.')
+
+    current_split = None
+    while True:
+        is_open = job_queue.is_open()
+        if is_open is False:
+            break
+        lease = job_queue.lease(worker) if is_open else None
+        if lease is None:
+            # the queue is not created yet or all chunks are leased
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+        chunk_id, split, views, previous = lease
+        if previous is not None:
+            logging.warning(f'Chunk {chunk_id} of split "{split}" taken over from {previous}, '
+                            f'{len(views)} view{"s" if len(views) != 1 else ""} left.')
+        if split != current_split:
+            set_camera_intrinsics(camera, cam_intrinsics[split])
+            current_split = split
+        lease_held[:] = [chunk_id, time.time()]
+        for idx, names in tqdm(views, f'Chunk {chunk_id}'):
+            start = time.perf_counter()
+            staged_dir = os.path.join(staging, file_dirs[split][idx])
+            stats, files = render_all_passes(camera, render_passes, split, idx, staged_dir,
+                                             np.array(cam_extrinstics[split][idx]), names, profiler)
+            if FLAGS.job_crash_rate > 0 and rng.random() < FLAGS.job_crash_rate:
+                logging.error(f'Injected crash of {worker} before committing view {idx} of split "{split}".')
+                os._exit(JOB_CRASH_CODE)
+            commit_staged(staged_dir, file_dirs[split][idx], files)
+            if not job_queue.commit_view(worker, chunk_id, split, idx, names, time.perf_counter() - start, stats):
+                logging.warning(f'Lease of chunk {chunk_id} expired, it is rendered by another worker.')
+                break
+        else:
+            job_queue.complete(worker, chunk_id)
+        lease_held[0] = None
+    shutil.rmtree(os.path.join(FLAGS.output_dir, staging), ignore_errors=True)
+    if profiler is not None:
+        profiler.summarize_all()
+        profiler.close()
+    job_queue.close()
+    logging.info(f'Job worker {worker} finished.')
+
+def render_job_queue(splits, cam_intrinsics, cam_extrinstics, file_dirs, pending, manifest, frame_times,
+                     pipeline=None):
+    # chunks of consecutive pending views of one split
+    chunks = []
+    for split in splits:
+        views = [(idx, sorted(names)) for idx, names in enumerate(pending[split]) if names]
+        chunks += [(split, views[i:i + FLAGS.job_chunk_size]) for i in range(0, len(views), FLAGS.job_chunk_size)]
+    num_views = sum(len(views) for _, views in chunks)
+    job_queue = JobQueue(FLAGS.job_queue)
+    job_queue.create(chunks, FLAGS.job_lease_seconds, FLAGS.job_max_attempts)
+    logging.info(f'Job queue {FLAGS.job_queue}: {len(chunks)} chunk{"s" if len(chunks) != 1 else ""} '
+                 f'of {num_views} view{"s" if num_views != 1 else ""}.')
+
+    # local workers share the cores, the flags of the coordinator are passed on
+    num_threads = max(1, (FLAGS.cpu_threads or os.cpu_count() or 1) // max(FLAGS.job_local_workers, 1))
+    worker_args = [sys.executable, os.path.abspath(sys.argv[0])] + sys.argv[1:] + \
+        ['--job_role=worker', f'--cpu_threads={num_threads}']
+    local_workers = [subprocess.Popen(worker_args) for _ in range(FLAGS.job_local_workers if chunks else 0)]
+    restarts = 0
+
+    start = time.perf_counter()
+    last_commit = 0
+    pbar = tqdm(total=num_views)
+    while True:
+        job_queue.expire()
+        counts = job_queue.counts()
+        # commits are read after the counts, the last ones are not missed
+        for commit in job_queue.commits(last_commit):
+            last_commit = commit['id']
+            split, idx = commit['split'], commit['idx']
+            record_outputs(manifest, split, idx, commit['names'], cam_intrinsics, cam_extrinstics, file_dirs,
+                           commit['stats'], pipeline)
+            frame_times.record(split, idx, 'all', commit['seconds'])
+            pbar.set_description(file_dirs[split][idx])
+            pbar.update(1)
+        if counts.get('pending', 0) + counts.get('leased', 0) == 0:
+            break
+        for i, worker in enumerate(local_workers):
+            if worker.poll() is not None and worker.returncode != 0:
+                if not any(stat['worker'] == worker_name(worker.pid) for stat in job_queue.worker_stats()):
+                    # it failed before its first lease, on the scene or the
+                    # flags, a restarted worker would fail the same way
+                    job_queue.finish()
+                    for other in local_workers:
+                        if other.poll() is None:
+                            other.terminate()
+                    raise RuntimeError(f'Local worker {worker.pid} exited with code {worker.returncode} before '
+                                       f'leasing a chunk.')
+                released = job_queue.release(worker_name(worker.pid))
+                logging.warning(f'Local worker {worker.pid} exited with code {worker.returncode}, restarting it, '
+                                f'{released} lease{"s" if released != 1 else ""} released.')
+                local_workers[i] = subprocess.Popen(worker_args)
+                restarts += 1
+        time.sleep(JOB_POLL_SECONDS)
+    pbar.close()
+    job_queue.finish()
+    for worker in local_workers:
+        worker.wait()
+    wall_time = time.perf_counter() - start
+    shutil.rmtree(os.path.join(FLAGS.output_dir, JOB_STAGING_DIR), ignore_errors=True)
+
+    # throughput report
+    for stat in job_queue.worker_stats():
+        logging.info(f'Worker {stat["worker"]}: {stat["views"]} views in {stat["chunks"]} chunks, '
+                     f'{stat["views"] / max(stat["seconds"], 1e-9):.3f} views/s while busy, '
+                     f'{stat["views"] / wall_time * 3600:.1f} views/hour, {stat["lost"]} lost leases.')
+    logging.info(f'Job queue: {pbar.n} views in {wall_time:.2f}s ({pbar.n / max(wall_time, 1e-9):.3f} views/s), '
+                 f'{job_queue.reassigned()} reassigned leases, {restarts} local worker restarts.')
+    for chunk_id, split, views in job_queue.failed():
+        logging.error(f'Chunk {chunk_id} of split "{split}" failed after {FLAGS.job_max_attempts} attempts, '
+                      f'views {[idx for idx, _ in views]} are rendered by the next --incremental run.')
+    job_queue.close()
+
+def load_cameras():
+    # splits with a "transforms_<split>.json" camera JSON or its .npz sidecar
+    splits = split_names(FLAGS.cam_dir)
 
     logging.info(f'Found split{"s" if len(splits) > 1 else ""} in {FLAGS.cam_dir}: {splits}')
 
-    # load JSON data
+    # load camera sets
     # camera intrinsics for each split
     cam_intrinsics = {}
     # filename and camera to world matrices
@@ -118,8 +1008,9 @@ def main(_):
 
     for split in splits:
         logging.info(f'Loading split "{split}"...')
+        camera_set = load_camera_set(FLAGS.cam_dir, split)
         # load camera intrinsics
-        cam_fovx = split_json_objs[split]['camera_angle_x']
+        cam_fovx = camera_set.camera_angle_x
         cam_intrinsic = {'sensor_width': FLAGS.resx,                           # width
                           'sensor_height': FLAGS.resy,                          # height
                           'sensor_fit': 'AUTO',                                 # width or height to which to fit the sensor size 
@@ -130,18 +1021,18 @@ def main(_):
         cam_intrinsics[split] = cam_intrinsic
         logging.info(f'Camera intrinsic: {cam_intrinsic}')
 
-        # load output filename and c2w matrices
-        file_paths = []
-        c2ws = []
-        for frame in split_json_objs[split]['frames']:
-            file_paths.append(frame['file_path'])
-            c2ws.append(np.array(frame['transform_matrix']))
-        file_dirs[split] = file_paths
-        cam_extrinstics[split] = c2ws
-        logging.info(f'{len(file_paths)} sample{"s" if len(file_paths) > 1 else ""}.')
+        # output filenames and an [N, 4, 4] array of c2w matrices
+        file_dirs[split] = camera_set.file_paths
+        cam_extrinstics[split] = camera_set.transforms
+        logging.info(f'{len(camera_set)} sample{"s" if len(camera_set) > 1 else ""}.')
 
+    return splits, cam_intrinsics, cam_extrinstics, file_dirs
+
+def setup_scene(num_threads=0):
     # load blender scene
     bpy.ops.wm.open_mainfile(filepath=FLAGS.scene_path)
+    # handlers are cleared when a file is opened
+    bpy.app.handlers.render_stats.append(on_render_stats)
 
     # set up Cycles as rendering engine
     bpy.context.scene.render.engine = 'CYCLES'
@@ -150,6 +1041,25 @@ def main(_):
     else:
         bpy.context.scene.render.film_transparent = False
 
+    if FLAGS.device == 'cpu':
+        setup_cpu()
+    else:
+        setup_gpu()
+    # also for the gpu device, which falls back to the CPU without a GPU,
+    # workers sharing a node keep to their share of the cores
+    set_threads(num_threads or FLAGS.cpu_threads)
+    bpy.context.scene.cycles.feature_set = 'SUPPORTED'
+    logging.info('Cycles set up as rendering engine')
+
+    set_performance(FLAGS.tile_size, FLAGS.spatial_splits)
+    # scene data is synchronized once and only updated when it changes,
+    # between views only the camera moves
+    bpy.context.scene.render.use_persistent_data = FLAGS.persistent_data
+
+    # raw output
+    bpy.context.scene.view_settings.view_transform = 'Raw'
+
+def setup_gpu():
     # use GPU
     cycle_preferences = bpy.context.preferences.addons['cycles'].preferences
     cycle_preferences.refresh_devices()
@@ -170,12 +1080,86 @@ def main(_):
             device.use = True
         
     bpy.context.scene.cycles.device = 'GPU'
-    bpy.context.scene.cycles.feature_set = 'SUPPORTED'
-    logging.info('Cycles set up as rendering engine')
 
-    # raw output
-    bpy.context.scene.view_settings.view_transform = 'Raw'
+def setup_cpu():
+    bpy.context.scene.cycles.device = 'CPU'
+    logging.info('Compute device type: CPU')
+
+def set_threads(num_threads):
+    if num_threads > 0:
+        bpy.context.scene.render.threads_mode = 'FIXED'
+        bpy.context.scene.render.threads = num_threads
+    else:
+        bpy.context.scene.render.threads_mode = 'AUTO'
+    logging.info(f'Render threads: {num_threads if num_threads > 0 else "all"}')
+
+def set_performance(tile_size, spatial_splits):
+    cycles = bpy.context.scene.cycles
+    if tile_size > 0:
+        cycles.use_auto_tile = True
+        cycles.tile_size = tile_size
+    cycles.debug_use_spatial_splits = spatial_splits
+
+def autotune(render_passes, split, cam_intrinsics, cam_extrinstics):
+    # time the first views of a split with each candidate, nothing is written
+    camera = find_camera()
+    set_camera_intrinsics(camera, cam_intrinsics[split])
+    views = cam_extrinstics[split][:FLAGS.autotune_frames]
+    candidates = [(tile_size, spatial_splits) for tile_size in AUTOTUNE_TILE_SIZES
+                  for spatial_splits in AUTOTUNE_SPATIAL_SPLITS]
+    timings = []
+    for render_pass in render_passes:
+        use_render_pass(render_pass, render_passes)
+        select_outputs(render_pass['outnodes'], set())
+        for candidate_idx, (tile_size, spatial_splits) in enumerate(candidates):
+            set_performance(tile_size, spatial_splits)
+            times = []
+            for c2w in views:
+                camera.matrix_world = c2w.T
+                start = time.perf_counter()
+                bpy.ops.render.render(write_still=False)
+                times.append(time.perf_counter() - start)
+            # with persistent data the first view rebuilds the BVH, the
+            # remaining views show the steady state
+            seconds = float(np.median(times[1:] if len(times) > 1 else times))
+            if len(timings) <= candidate_idx:
+                timings.append(0.)
+            timings[candidate_idx] += seconds
+            logging.info(f'Autotune {render_pass["name"]} pass, tile size {tile_size}, spatial splits '
+                         f'{"on" if spatial_splits else "off"}: '
+                         f'{seconds:.3f}s/view')
+    # fastest over all passes of a view
+    tile_size, spatial_splits = candidates[int(np.argmin(timings))]
+    set_performance(tile_size, spatial_splits)
+    logging.info(f'Autotune selected tile size {tile_size}, spatial splits {"on" if spatial_splits else "off"}, '
+                 f'{min(timings):.3f}s/view.')
+
+def sampling_settings():
+    # cycles settings of the rgb render from the sampling budget flags
+    settings = {}
+    if FLAGS.noise_threshold > 0:
+        settings.update(use_adaptive_sampling=True, adaptive_threshold=FLAGS.noise_threshold)
+    if FLAGS.min_samples > 0:
+        settings['adaptive_min_samples'] = FLAGS.min_samples
+    if FLAGS.max_samples > 0:
+        settings['samples'] = FLAGS.max_samples
+    if FLAGS.time_limit > 0:
+        settings['time_limit'] = FLAGS.time_limit
+    return {'cycles': settings} if settings else {}
 
+def geometry_pass_settings():
+    # alpha, depth and normal are deterministic, one sample through the pixel
+    # center without light bounces or denoising is enough
+    if FLAGS.geometry_engine == 'eevee':
+        return 'BLENDER_EEVEE', {'eevee': {'taa_render_samples': FLAGS.geometry_samples}}
+    return 'CYCLES', {'cycles': {'samples': FLAGS.geometry_samples,
+                                 'use_adaptive_sampling': False,
+                                 'pixel_filter_type': 'BOX',
+                                 'filter_width': 0.01,
+                                 'max_bounces': 0,
+                                 'use_denoising': False}}
+
+def setup_render_passes():
     # set output composition
     bpy.context.scene.use_nodes = True
     node_tree = bpy.context.scene.node_tree
@@ -189,136 +1173,135 @@ def main(_):
         render_layers = node_tree.nodes.new("CompositorNodeRLayers")
     # get scene view layer
     view_layer = bpy.context.scene.view_layers[0]
-    # file output nodes
-    outnodes = []
-    # set composition
-    # RGB(A)
-    if FLAGS.rgb_format != 'nil':
-        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
-        outnode.label = 'RGB Output'
-        outnode.name = 'RGB Output'
 
-        set_node_output_format(outnode, FLAGS.rgb_format)
-        outnode.format.color_mode = 'RGBA' if FLAGS.rgba else 'RGB'
-
-        render_layers.outputs['Image'].enabled = True
-        node_tree.links.new(render_layers.outputs['Image'], outnode.inputs[0])
-        outnodes.append({'node': outnode, 'name': 'color', 'ext': FLAGS.rgb_format})
-        logging.info(f'RGB{"A" if FLAGS.rgba else ""} {FLAGS.rgb_format} output enabled.')
-
-    # render splits
-    render_splits(splits, cam_intrinsics, cam_extrinstics, file_dirs, outnodes)
-
-    # clear output nodes
-    for outnode in outnodes:
-        node_tree.nodes.remove(outnode['node'])
-    outnodes = []
-
-    # requires mask for other maps
-    bpy.context.scene.render.film_transparent = True
-
-    # foreground mask
-    # alpha
-    if FLAGS.alpha_format != 'nil':
-        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
-        outnode.label = 'Alpha Output'
-        outnode.name = 'Alpha Output'
+    # each render pass is one render per view writing its file output nodes
+    render_passes = []
+    if FLAGS.single_pass:
+        # all maps are composited from one transparent render, the rgb image is
+        # put back onto the world background unless a transparent film is wanted
+        outnodes = []
+        if FLAGS.rgb_format != 'nil':
+            outnodes.append(add_rgb_output(node_tree, render_layers, view_layer,
+                                           over_background=not FLAGS.film_transparent))
+        outnodes.extend(add_geometry_outputs(node_tree, render_layers, view_layer))
+        render_passes.append({'name': 'all', 'film_transparent': True, 'outnodes': outnodes,
+                              'engine': 'CYCLES', 'settings': sampling_settings()})
+    else:
+        geometry_engine, geometry_settings = 'CYCLES', {}
+        rgb_settings = {}
+        if FLAGS.fast_geometry:
+            geometry_engine, geometry_settings = geometry_pass_settings()
+            # the rgb pass restores the quality settings of the scene
+            rgb_settings = {owner: {k: getattr(getattr(bpy.context.scene, owner), k) for k in values}
+                            for owner, values in geometry_settings.items()}
+            logging.info(f'Fast geometry pass: {geometry_engine} {geometry_settings}')
+        # the sampling budget replaces the quality settings of the scene for
+        # the rgb pass only, the geometry pass restores those it does not set
+        for owner, values in sampling_settings().items():
+            for k, v in values.items():
+                geometry_settings.setdefault(owner, {}).setdefault(k, getattr(getattr(bpy.context.scene, owner), k))
+                rgb_settings.setdefault(owner, {})[k] = v
+        # RGB(A)
+        if FLAGS.rgb_format != 'nil':
+            render_passes.append({'name': 'rgb', 'film_transparent': FLAGS.film_transparent,
+                                  'outnodes': [add_rgb_output(node_tree, render_layers, view_layer)],
+                                  'engine': 'CYCLES', 'settings': rgb_settings})
+        # requires mask for other maps
+        outnodes = add_geometry_outputs(node_tree, render_layers, view_layer)
+        if outnodes:
+            render_passes.append({'name': 'geometry', 'film_transparent': True, 'outnodes': outnodes,
+                                  'engine': geometry_engine, 'settings': geometry_settings})
+    return render_passes
 
-        set_node_output_format(outnode, FLAGS.alpha_format)
-        #outnode.format.color_mode = 'BW' if FLAGS.alpha_format == 'png' else 'RGBA'
+def main(_):
+    if FLAGS.job_queue and FLAGS.job_role == 'worker':
+        # the coordinator owns the output directory
+        job_worker()
+        return
 
-        render_layers.outputs['Alpha'].enabled = True
-        rgb_compositor = node_tree.nodes.new("CompositorNodeCombineColor")
-        node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[0])
-        node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[1])
-        node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[2])
-        node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[3])
-        node_tree.links.new(rgb_compositor.outputs[0], outnode.inputs[0])
-        outnodes.append({'node': outnode, 'name': 'alpha', 'ext': FLAGS.alpha_format})
-        logging.info(f'Alpha {FLAGS.alpha_format} output enabled.')
-    
-    # depth
-    if FLAGS.depth_format != 'nil':
-        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
-        outnode.label = 'Depth Output'
-        outnode.name = 'Depth Output'
+    if FLAGS.incremental:
+        # keep what is already rendered
+        os.makedirs(FLAGS.output_dir, exist_ok=True)
+    else:
+        # delete existing output directory
+        if os.path.exists(FLAGS.output_dir):
+            logging.warning(f'Output directory "{FLAGS.output_dir}" already exists, overwriting.')
+            shutil.rmtree(FLAGS.output_dir)
+        os.makedirs(FLAGS.output_dir)
 
-        set_node_output_format(outnode, FLAGS.depth_format)
+    splits, cam_intrinsics, cam_extrinstics, file_dirs = load_cameras()
+    # copy camera JSONs and sidecars to the output directory, keeping their
+    # modification times which decide whether the sidecar is up to date
+    for split in splits:
+        for path in [camera_json_path(FLAGS.cam_dir, split), camera_sidecar_path(FLAGS.cam_dir, split)]:
+            if os.path.exists(path):
+                shutil.copy2(path, FLAGS.output_dir)
 
-        view_layer.use_pass_z = True
-        render_layers.outputs['Depth'].enabled = True
-        if FLAGS.depth_format == 'exr':
-            # directly connect depth output with file node input with alpha channel
-            rgb_compositor = node_tree.nodes.new("CompositorNodeCombineColor")
-            node_tree.links.new(render_layers.outputs['Depth'], rgb_compositor.inputs[0])
-            node_tree.links.new(render_layers.outputs['Depth'], rgb_compositor.inputs[1])
-            node_tree.links.new(render_layers.outputs['Depth'], rgb_compositor.inputs[2])
-            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[3])
-            node_tree.links.new(rgb_compositor.outputs[0], outnode.inputs[0])
-        elif FLAGS.depth_format == 'png':
-            # requires some compression
-            depth_map = node_tree.nodes.new(type="CompositorNodeMapRange")
-            depth_map.inputs['From Min'].default_value = FLAGS.depth_min
-            depth_map.inputs['From Max'].default_value = FLAGS.depth_max
-            depth_map.inputs['To Min'].default_value = 0
-            depth_map.inputs['To Max'].default_value = 1
-            node_tree.links.new(render_layers.outputs['Depth'], depth_map.inputs[0])
-            rgb_compositor = node_tree.nodes.new("CompositorNodeCombineColor")
-            node_tree.links.new(depth_map.outputs[0], rgb_compositor.inputs[0])
-            node_tree.links.new(depth_map.outputs[0], rgb_compositor.inputs[1])
-            node_tree.links.new(depth_map.outputs[0], rgb_compositor.inputs[2])
-            node_tree.links.new(render_layers.outputs['Alpha'], rgb_compositor.inputs[3])
-            node_tree.links.new(rgb_compositor.outputs[0], outnode.inputs[0])
+    # find outputs which are missing or stale
+    manifest = Manifest(FLAGS.output_dir)
+    pending = find_pending_outputs(splits, cam_intrinsics, cam_extrinstics, file_dirs, manifest)
+    num_views = sum(1 for split in splits for names in pending[split] if names)
+    num_outputs = sum(len(names) for split in splits for names in pending[split])
+    logging.info(f'{num_outputs} output{"s" if num_outputs != 1 else ""} of {num_views} '
+                 f'view{"s" if num_views != 1 else ""} to render.')
 
-        outnodes.append({'node': outnode, 'name': 'depth', 'ext': FLAGS.depth_format})
-        logging.info(f'Depth {FLAGS.depth_format} output enabled.')
-    
-    # normal
-    if FLAGS.normal_format != 'nil':
-        outnode = node_tree.nodes.new("CompositorNodeOutputFile")
-        outnode.label = 'Normal Output'
-        outnode.name = 'Normal Output'
+    frame_times = FrameTimes(FLAGS.frame_log, device=FLAGS.device, persistent_data=FLAGS.persistent_data)
+    pipeline = None
+    if FLAGS.stream:
+        # consumers start before the scene is loaded
+        pipeline = Pipeline(FLAGS.output_dir, FLAGS.stream, pending, {split: len(file_dirs[split]) for split in splits},
+                            FLAGS.stream_consumers, FLAGS.stream_queue)
+    render_start = time.perf_counter()
+    if FLAGS.job_queue:
+        # also run without pending views, waiting workers are released
+        render_job_queue(splits, cam_intrinsics, cam_extrinstics, file_dirs, pending, manifest, frame_times, pipeline)
+    elif num_views == 0:
+        logging.info('All outputs are up to date.')
+    elif FLAGS.num_workers > 0:
+        # the workers load the scene themselves
+        render_parallel(splits, cam_intrinsics, cam_extrinstics, file_dirs, pending, manifest, frame_times, pipeline)
+    else:
+        setup_scene()
+        render_passes = setup_render_passes()
+        if FLAGS.autotune_frames > 0:
+            autotune(render_passes, splits[0], cam_intrinsics, cam_extrinstics)
+        profiler = None
+        if FLAGS.profile:
+            profiler = Profiler(FLAGS.profile)
+            add_profile_handlers(profiler)
+        for render_pass in render_passes:
+            use_render_pass(render_pass, render_passes)
+            render_splits(splits, cam_intrinsics, cam_extrinstics, file_dirs, render_pass,
+                          pending, manifest, frame_times, profiler, pipeline)
+        if profiler is not None:
+            profiler.close()
+    manifest.compact()
+    write_render_stats(splits, file_dirs, manifest)
+    frame_times.summarize()
+    frame_times.close()
+    render_time = time.perf_counter() - render_start
+    logging.info(f'Rendered {num_views} view{"s" if num_views != 1 else ""} in {render_time:.2f}s '
+                 f'({render_time / max(num_views, 1):.3f}s/view, {"single" if FLAGS.single_pass else "two"}-pass).')
 
-        set_node_output_format(outnode, FLAGS.normal_format)
-        outnode.format.color_mode = 'RGBA'
+    # converters read the scene bounds from scene.json instead of loading the scene
+    meta = write_scene_metadata(splits, cam_intrinsics)
 
-        view_layer.use_pass_normal = True
-        render_layers.outputs['Normal'].enabled = True
-        if FLAGS.normal_format == 'exr':
-            node_tree.links.new(render_layers.outputs['Normal'], outnode.inputs[0])
-        else:
-            # transform from [-1, 1] to [0, 1] on all channels for png
-            rgb_separator = node_tree.nodes.new("CompositorNodeSeparateColor")
-            muladds = [node_tree.nodes.new("CompositorNodeMath") for _ in range(3)]
-            rgb_combiner = node_tree.nodes.new("CompositorNodeCombineColor")
-            # connect normal output to rgb_seperator
-            node_tree.links.new(render_layers.outputs['Normal'], rgb_separator.inputs[0])
-            # connect muladd units
-            for idx, m in enumerate(muladds):
-                m.operation = 'MULTIPLY_ADD'    # operation
-                m.inputs[1].default_value = 0.5 # scale factor
-                m.inputs[2].default_value = 0.5 # bias
-                node_tree.links.new(rgb_separator.outputs[idx], m.inputs[0])
-                node_tree.links.new(m.outputs[0], rgb_combiner.inputs[idx])
-            # add alpha channel to normal map
-            node_tree.links.new(render_layers.outputs['Alpha'],rgb_combiner.inputs[3])
-            # connect to the final output
-            node_tree.links.new(rgb_combiner.outputs[0], outnode.inputs[0])
+    if pipeline is not None:
+        finish_stream(pipeline, splits, file_dirs, pending, meta)
 
-        outnodes.append({'node': outnode, 'name': 'normal', 'ext': FLAGS.normal_format})
-        logging.info(f'Normal {FLAGS.alpha_format} output enabled.')
+    if FLAGS.pyramid_levels > 0:
+        write_pyramid(splits, cam_intrinsics, meta)
 
-    # render splits
-    render_splits(splits, cam_intrinsics, cam_extrinstics, file_dirs, outnodes)
-
-    # remove all frame indices
-    for root, _, files in os.walk(FLAGS.output_dir):
-        for file in files:
-            if (file.endswith('.png') or file.endswith('.exr')):
-                # remove all digits
-                new_file = re.sub(r'[0-9]+', '', file)
-                os.rename(os.path.join(root, file), os.path.join(root, new_file))
-    logging.info('Frame index removed.')
+    if FLAGS.output_backend == 'shards':
+        # move the rendered files into the shards of their split, each
+        # pyramid level is packed as a root of its own
+        roots = [FLAGS.output_dir] + [level_dir(FLAGS.output_dir, level) for level in range(1, FLAGS.pyramid_levels + 1)]
+        for root in roots:
+            for split in splits:
+                num_outputs = pack_split(root, split, load_camera_set(root, split), FLAGS.shard_size_mb * 2 ** 20,
+                                         remove=True)
+                logging.info(f'Split "{split}" of {root}: {num_outputs} output{"s" if num_outputs != 1 else ""} '
+                             f'packed into shards.')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,46 @@
+import time
+
+from bds.jobqueue import JobQueue
+
+def test_expired_chunk_skips_committed_views(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'queue.db'))
+    views = [(idx, ['color']) for idx in range(4)]
+    job_queue.create([('train', views)], lease_seconds=0.2, max_attempts=2)
+    chunk_id, split, leased, previous = job_queue.lease('a')
+    assert (split, [idx for idx, _ in leased], previous) == ('train', [0, 1, 2, 3], None)
+    assert job_queue.commit_view('a', chunk_id, split, 0, ['color'], 1.)
+    assert job_queue.commit_view('a', chunk_id, split, 1, ['color'], 1.)
+    # a is gone, b takes the chunk over after the lease expired
+    assert job_queue.lease('b') is None
+    time.sleep(0.3)
+    chunk_id_b, _, leased, previous = job_queue.lease('b')
+    assert (chunk_id_b, [idx for idx, _ in leased], previous) == (chunk_id, [2, 3], 'a')
+    # a lost its lease
+    assert not job_queue.commit_view('a', chunk_id, split, 2, ['color'], 1.)
+    assert not job_queue.complete('a', chunk_id)
+    assert job_queue.commit_view('b', chunk_id, split, 2, ['color'], 1.)
+    # b dies as well, the chunk has no attempts left
+    time.sleep(0.3)
+    job_queue.expire()
+    assert job_queue.counts() == {'failed': 1}
+    assert job_queue.failed() == [(chunk_id, 'train', [(3, ['color'])])]
+    assert [commit['idx'] for commit in job_queue.commits()] == [0, 1, 2]
+    job_queue.close()
+
+def test_complete_and_finish(tmp_path):
+    job_queue = JobQueue(str(tmp_path / 'queue.db'))
+    assert job_queue.is_open() is None
+    job_queue.create([('train', [(0, ['color'])]), ('test', [(0, ['depth'])])], lease_seconds=60, max_attempts=3)
+    for worker in ['a', 'b']:
+        chunk_id, split, leased, _ = job_queue.lease(worker)
+        for idx, names in leased:
+            assert job_queue.commit_view(worker, chunk_id, split, idx, names, 2.)
+        assert job_queue.complete(worker, chunk_id)
+    assert job_queue.lease('a') is None
+    assert job_queue.counts() == {'done': 2}
+    assert job_queue.reassigned() == 0
+    job_queue.finish()
+    assert job_queue.is_open() is False
+    stats = {stat['worker']: stat for stat in job_queue.worker_stats()}
+    assert stats['a']['views'] == 1 and stats['a']['chunks'] == 1 and stats['a']['seconds'] == 2.
+    job_queue.close()
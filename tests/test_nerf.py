@@ -0,0 +1,30 @@
+import os
+import numpy as np
+from PIL import Image
+
+from bds.nerf import convert_view
+
+def test_alpha_after_linked_conversion_keeps_source(tmp_path):
+    src_split_dir, dst_split_dir = tmp_path / 'src', tmp_path / 'dst'
+    view_dir = src_split_dir / 'r_0'
+    os.makedirs(view_dir)
+    os.makedirs(dst_split_dir)
+    color = np.full([4, 4, 3], 200, dtype=np.uint8)
+    Image.fromarray(color).save(view_dir / 'color.png')
+    # without alpha the color is linked
+    assert convert_view(str(src_split_dir), str(dst_split_dir), 'r_0', link=True) == 1
+
+    alpha = np.full([4, 4], 128, dtype=np.uint8)
+    Image.fromarray(alpha).save(view_dir / 'alpha.png')
+    # alpha newer than the converted color
+    os.utime(view_dir / 'alpha.png', (os.path.getmtime(view_dir / 'color.png') + 10,) * 2)
+    written = convert_view(str(src_split_dir), str(dst_split_dir), 'r_0', link=True)
+    assert written == 2
+
+    source = Image.open(view_dir / 'color.png')
+    assert source.mode == 'RGB'
+    assert np.array_equal(np.array(source), color)
+    assert os.stat(view_dir / 'color.png').st_nlink == 1
+    merged = np.array(Image.open(dst_split_dir / 'r_0.png'))
+    assert merged.shape == (4, 4, 4)
+    assert np.all(merged[..., 3] == 128)
@@ -0,0 +1,24 @@
+import os
+from PIL import Image
+
+from bds.pipeline import Pipeline, nerf_dir, idr_dir
+
+def test_stream_exports_all_views(tmp_path):
+    root = str(tmp_path / 'out')
+    num_views = 8
+    for idx in range(num_views):
+        view_dir = os.path.join(root, 'train', f'r_{idx}')
+        os.makedirs(view_dir)
+        Image.new('RGB', (8, 8)).save(os.path.join(view_dir, 'color.png'))
+        Image.new('L', (8, 8)).save(os.path.join(view_dir, 'alpha.png'))
+    pending = {'train': [{'color', 'alpha'} for _ in range(num_views)]}
+    # a queue smaller than the number of views makes submit() wait for results
+    pipeline = Pipeline(root, ['nerf', 'idr'], pending, {'train': num_views}, num_consumers=2, queue_size=3)
+    for idx in range(num_views):
+        pipeline.done('train', idx, f'./train/r_{idx}', ['color'])
+        pipeline.done('train', idx, f'./train/r_{idx}', ['alpha'])
+    pipeline.close()
+    assert (pipeline.finished, pipeline.written, pipeline.errors) == (num_views, 4 * num_views, 0)
+    assert len(os.listdir(os.path.join(nerf_dir(root), 'train'))) == 2 * num_views
+    assert sorted(os.listdir(os.path.join(idr_dir(root), 'image'))) == sorted(f'{i}.png' for i in range(num_views))
+    assert Image.open(os.path.join(nerf_dir(root), 'train', 'r_0.png')).mode == 'RGBA'
@@ -0,0 +1,81 @@
+import os
+import json
+import threading
+import numpy as np
+import pytest
+from PIL import Image
+
+from bds.reader import BdsDataset, ArrayCache, decode_image
+
+def write_dataset(root, num_views, res=8):
+    frames = []
+    for idx in range(num_views):
+        view_dir = os.path.join(root, 'train', f'r_{idx}')
+        os.makedirs(view_dir)
+        Image.fromarray(np.full([res, res, 3], idx, dtype=np.uint8)).save(os.path.join(view_dir, 'color.png'))
+        # 16-bit depth at the middle of the default range
+        Image.fromarray(np.full([res, res], 32768, dtype=np.uint16)).save(os.path.join(view_dir, 'depth.png'))
+        c2w = np.eye(4)
+        c2w[0, 3] = idx
+        frames.append({'file_path': f'./train/r_{idx}', 'transform_matrix': c2w.tolist()})
+    with open(os.path.join(root, 'transforms_train.json'), 'w') as f:
+        json.dump({'camera_angle_x': 0.69, 'frames': frames}, f)
+
+def run_with_timeout(fn, seconds=30):
+    # a deadlock fails the test instead of hanging it
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', fn()), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), 'reader deadlocked'
+    return result['value']
+
+def test_iterate(tmp_path):
+    write_dataset(str(tmp_path), 5)
+    dataset = BdsDataset(str(tmp_path), 'train', names=['color', 'depth'], num_threads=2)
+    views = run_with_timeout(lambda: [(idx, view['color'], view['depth'], view.c2w) for idx, view in
+                                      dataset.iterate(lookahead=2)])
+    assert [idx for idx, *_ in views] == list(range(5))
+    for idx, color, depth, c2w in views:
+        assert color.shape == (8, 8, 3)
+        assert np.allclose(color, idx / 255.)
+        assert depth.shape == (8, 8)
+        assert np.allclose(depth, 2. + 4. * 32768 / 65535)
+        assert c2w[0, 3] == idx
+    order = [idx for idx, _ in dataset.iterate(shuffle=True, seed=1)]
+    assert sorted(order) == list(range(5))
+    dataset.close()
+
+def test_prefetch_many(tmp_path):
+    write_dataset(str(tmp_path), 50, res=2)
+    dataset = BdsDataset(str(tmp_path), 'train', names=['color'], num_threads=4)
+    for _ in range(20):
+        futures = run_with_timeout(lambda: dataset.prefetch(range(50)))
+        for future in futures:
+            future.result(timeout=30)
+    # everything is cached, prefetching again submits nothing
+    assert dataset.prefetch(range(50)) == []
+    batch = dataset.batch([3, 1], 'color')
+    assert batch.shape == (2, 2, 2, 3)
+    assert np.allclose(batch[:, 0, 0, 0], [3 / 255., 1 / 255.])
+    dataset.close()
+
+def test_array_cache_evicts_least_recent():
+    cache = ArrayCache(max_bytes=2 * 8)
+    cache.put('a', np.zeros(1))
+    cache.put('b', np.zeros(1))
+    cache.get('a')
+    cache.put('c', np.zeros(1))
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+
+def test_decode_exr_channels(tmp_path):
+    OpenEXR = pytest.importorskip('OpenEXR')
+    rgba = np.random.default_rng(0).random([5, 6, 4], dtype=np.float32)
+    for channels, pixels in [('RGBA', rgba), ('RGB', rgba[..., :3].copy()), ('V', rgba[..., 0].copy())]:
+        path = str(tmp_path / f'{channels}.exr')
+        OpenEXR.File({'compression': OpenEXR.ZIP_COMPRESSION, 'type': OpenEXR.scanlineimage},
+                     {channels: pixels}).write(path)
+        with open(path, 'rb') as f:
+            decoded = decode_image(f.read(), 'exr')
+        assert decoded.shape == (5, 6, len(channels) if channels != 'V' else 1)
+        assert np.allclose(decoded.reshape(pixels.shape), pixels)
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+
+from bds.camera import CameraSet, PathTable
+from bds.shards import ShardReader, pack_split, unpack_split, shard_dir
+
+def make_split(root, num_views, size=1000):
+    camera_set = CameraSet(0.69, np.tile(np.eye(4, dtype=np.float32), [num_views, 1, 1]),
+                           PathTable.from_strings([f'./train/r_{i}' for i in range(num_views)]))
+    for idx, file_path in enumerate(camera_set.file_paths):
+        os.makedirs(os.path.join(root, file_path))
+        for name in ['color', 'depth']:
+            with open(os.path.join(root, file_path, f'{name}.png'), 'wb') as f:
+                f.write(bytes([idx]) * size)
+    return camera_set
+
+def shard_bytes(root):
+    directory = shard_dir(root, 'train')
+    return sum(os.path.getsize(os.path.join(directory, file)) for file in os.listdir(directory)
+               if file.startswith('shard_'))
+
+def test_repack_does_not_grow(tmp_path):
+    root = str(tmp_path)
+    camera_set = make_split(root, 12)
+    pack_split(root, 'train', camera_set, shard_size=4000, remove=True)
+    size = shard_bytes(root)
+    assert size == 12 * 2 * 1000
+    for _ in range(3):
+        unpack_split(root, 'train', camera_set)
+        pack_split(root, 'train', camera_set, shard_size=4000, remove=True)
+        assert shard_bytes(root) == size
+    reader = ShardReader(root, 'train')
+    for idx in range(12):
+        assert reader.read(idx, 'depth') == bytes([idx]) * 1000
+    reader.close()
+
+def test_rerendered_output_replaces_old_copy(tmp_path):
+    root = str(tmp_path)
+    camera_set = make_split(root, 4)
+    pack_split(root, 'train', camera_set, shard_size=10 ** 6, remove=True)
+    # view 2 re-rendered with an exr color
+    os.makedirs(os.path.join(root, 'train', 'r_2'))
+    with open(os.path.join(root, 'train', 'r_2', 'color.exr'), 'wb') as f:
+        f.write(b'exr' * 10)
+    pack_split(root, 'train', camera_set, shard_size=10 ** 6, remove=True)
+    assert shard_bytes(root) == 4 * 2 * 1000 - 1000 + 30
+    reader = ShardReader(root, 'train')
+    assert [reader.ext(idx, 'color') for idx in range(4)] == ['png', 'png', 'exr', 'png']
+    assert reader.read(2, 'color') == b'exr' * 10
+    assert reader.read(1, 'color') == bytes([1]) * 1000
+    reader.close()
+    unpack_split(root, 'train', camera_set)
+    assert os.path.exists(os.path.join(root, 'train', 'r_2', 'color.exr'))
+    assert not os.path.exists(os.path.join(root, 'train', 'r_2', 'color.png'))
@@ -0,0 +1,126 @@
+# Compare the alpha, depth and normal maps of two bds renders of the same cameras,
+# e.g. a --fast_geometry render against a full-quality reference
+
+import os, sys, glob
+import logging
+from absl import app, flags
+import numpy as np
+import json
+from tqdm import tqdm
+
+from bds.bpy_image import load_image
+from bds.encoding import decode_depth, decode_normal
+from bds.scene_meta import load_scene_meta, depth_range
+
+flags.DEFINE_string('reference_dir', '', 'root directory of the reference bds dataset')
+flags.DEFINE_string('test_dir', '', 'root directory of the bds dataset to validate')
+flags.DEFINE_float('depth_min', 2.0, 'minimum depth used in png format depth map, '
+                                       'defaults to the range in scene.json of each dataset')
+flags.DEFINE_float('depth_max', 6.0, 'maximum depth used in png format depth map, '
+                                       'defaults to the range in scene.json of each dataset')
+flags.DEFINE_float('alpha_threshold', 0.5, 'pixels with both alphas above the threshold are compared '
+                                           'for depth and normal')
+flags.DEFINE_float('alpha_tolerance', 1. / 255, 'absolute alpha error counted as a mismatch')
+flags.DEFINE_float('depth_tolerance', 1e-3, 'absolute depth error counted as a mismatch')
+flags.DEFINE_float('normal_tolerance', 1.0, 'normal angle error in degrees counted as a mismatch')
+flags.DEFINE_string('report', '', 'optional path of a JSON report')
+
+FLAGS = flags.FLAGS
+
+def find_output(view_dir, name):
+    for ext in ['png', 'exr']:
+        path = os.path.join(view_dir, f'{name}.{ext}')
+        if os.path.exists(path):
+            return path, ext
+    return None, None
+
+def dataset_depth_range(root):
+    # the flags override the depth range of the dataset
+    meta_min, meta_max = depth_range(load_scene_meta(root), (FLAGS.depth_min, FLAGS.depth_max))
+    return (FLAGS.depth_min if FLAGS['depth_min'].present else meta_min,
+            FLAGS.depth_max if FLAGS['depth_max'].present else meta_max)
+
+def pixel_errors(name, ref, ref_ext, test, test_ext, mask, depth_ranges):
+    # per-pixel errors of one map, depth and normal are compared on the foreground
+    if name == 'alpha':
+        return np.abs(ref[..., 0] - test[..., 0]).ravel()
+    if mask is None:
+        # png maps carry the alpha in their last channel
+        mask = (ref[..., -1] > FLAGS.alpha_threshold) & (test[..., -1] > FLAGS.alpha_threshold)
+    if name == 'depth':
+        ref_depth = decode_depth(ref, ref_ext, *depth_ranges[0])
+        test_depth = decode_depth(test, test_ext, *depth_ranges[1])
+        errors = np.abs(ref_depth - test_depth)[mask]
+        # single channel exr depth maps have no alpha, skip background at infinity
+        return errors[np.isfinite(errors)]
+    ref_normal = decode_normal(ref, ref_ext)[mask]
+    test_normal = decode_normal(test, test_ext)[mask]
+    ref_normal /= np.maximum(np.linalg.norm(ref_normal, axis=-1, keepdims=True), 1e-8)
+    test_normal /= np.maximum(np.linalg.norm(test_normal, axis=-1, keepdims=True), 1e-8)
+    cos = np.clip(np.sum(ref_normal * test_normal, axis=-1), -1., 1.)
+    return np.degrees(np.arccos(cos))
+
+def main(_):
+    depth_ranges = [dataset_depth_range(FLAGS.reference_dir), dataset_depth_range(FLAGS.test_dir)]
+    tolerances = {'alpha': FLAGS.alpha_tolerance, 'depth': FLAGS.depth_tolerance, 'normal': FLAGS.normal_tolerance}
+    # running sums of every map
+    stats = {name: {'views': 0, 'pixels': 0, 'sum': 0., 'sum_sq': 0., 'max': 0., 'mismatches': 0,
+                    'view_means': [], 'worst_view': None} for name in tolerances}
+
+    for split in glob.glob(pathname='transforms_*.json', root_dir=FLAGS.reference_dir):
+        split_name = split[len('transforms_'):-len('.json')]
+        split_json = json.load(open(os.path.join(FLAGS.reference_dir, split)))
+        for frame in tqdm(split_json['frames'], f'Validating split {split_name}'):
+            ref_dir = os.path.join(FLAGS.reference_dir, frame['file_path'])
+            test_dir = os.path.join(FLAGS.test_dir, frame['file_path'])
+            # foreground mask from the alpha maps if both datasets have them
+            mask = None
+            for name, stat in stats.items():
+                ref_path, ref_ext = find_output(ref_dir, name)
+                test_path, test_ext = find_output(test_dir, name)
+                if ref_path is None or test_path is None:
+                    continue
+                ref, test = load_image(ref_path), load_image(test_path)
+                if name == 'alpha':
+                    mask = (ref[..., 0] > FLAGS.alpha_threshold) & (test[..., 0] > FLAGS.alpha_threshold)
+                errors = pixel_errors(name, ref, ref_ext, test, test_ext, mask, depth_ranges)
+                if errors.size == 0:
+                    continue
+                view_mean = float(errors.mean())
+                stat['views'] += 1
+                stat['pixels'] += errors.size
+                stat['sum'] += float(errors.sum())
+                stat['sum_sq'] += float(np.square(errors, dtype=np.float64).sum())
+                stat['max'] = max(stat['max'], float(errors.max()))
+                stat['mismatches'] += int(np.count_nonzero(errors > tolerances[name]))
+                stat['view_means'].append(view_mean)
+                if stat['worst_view'] is None or view_mean > stat['worst_view'][1]:
+                    stat['worst_view'] = (frame['file_path'], view_mean)
+
+    # summary
+    report = {}
+    logging.info(f'{"map":<8} {"views":>6} {"mean":>10} {"rmse":>10} {"max":>10} {"p95 view":>10} {"mismatch":>9}')
+    for name, stat in stats.items():
+        if stat['views'] == 0:
+            logging.warning(f'No {name} maps found in both datasets.')
+            continue
+        report[name] = {'views': stat['views'],
+                        'pixels': stat['pixels'],
+                        'mean': stat['sum'] / stat['pixels'],
+                        'rmse': float(np.sqrt(stat['sum_sq'] / stat['pixels'])),
+                        'max': stat['max'],
+                        'p95_view_mean': float(np.percentile(stat['view_means'], 95)),
+                        'mismatch_fraction': stat['mismatches'] / stat['pixels'],
+                        'tolerance': tolerances[name],
+                        'worst_view': stat['worst_view'][0]}
+        r = report[name]
+        logging.info(f'{name:<8} {r["views"]:>6} {r["mean"]:>10.5f} {r["rmse"]:>10.5f} {r["max"]:>10.5f} '
+                     f'{r["p95_view_mean"]:>10.5f} {r["mismatch_fraction"]:>9.2%}')
+    if FLAGS.report:
+        with open(FLAGS.report, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == '__main__':
+    argv = sys.argv
+    app.run(main=main, argv=argv)